@@ -0,0 +1,315 @@
+"""
+Description
+--
+Offline batch mode. Finds, reads and looks up the license plates in
+archived footage - video files, image globs or directories - with no
+UI, as fast as the cores allow, and writes the results as JSON lines or
+CSV.
+
+Videos are split in segments of frames, which are processed in parallel
+along with the other files, one process per core.
+
+>>> python app_batch.py videos/ 'captures/*.png' -o results.jsonl
+"""
+
+# System imports
+import argparse
+import csv
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+# 3rd party imports
+import cv2
+
+# Local imports
+from workers import classifier as of
+from workers import ocr as ocr
+from workers import platelookup as pl
+
+image_extensions = ('.bmp', '.jpeg', '.jpg', '.png', '.tif', '.tiff')
+csv_columns = ['file', 'frame', 'timestamp_s', 'x', 'y', 'w', 'h', 'text', 'info']
+
+# The workers of the process, used directly, not started
+_pipeline = None  # type: Dict[str, Any]
+
+
+def work_units(inputs: List[str], segment_frames: int) -> Iterator[Tuple]:
+    """
+    Description
+    --
+    Splits the inputs in units of work - video segments and groups of
+    images.
+
+    Parameters
+    --
+    - inputs - video files, image files or globs, directories.
+    - segment_frames - the number of frames per unit.
+
+    Returns
+    --
+    Tuples of ('video', path, first frame, end frame) and
+    ('images', paths).
+    """
+
+    paths = []
+
+    for path in inputs:
+        if os.path.isdir(path):
+            paths.extend(sorted(os.path.join(path, name) for name in os.listdir(path)))
+        elif glob.has_magic(path):
+            paths.extend(sorted(glob.glob(path)))
+        elif os.path.isfile(path):
+            paths.append(path)
+        else:
+            raise ValueError("File not found {}".format(path))
+
+    images = []
+
+    for path in paths:
+        if path.lower().endswith(image_extensions):
+            images.append(path)
+            continue
+
+        stream = cv2.VideoCapture(path)
+        frames = int(stream.get(cv2.CAP_PROP_FRAME_COUNT))
+        stream.release()
+
+        if frames <= 0:
+            # Unknown length (or not a video), in one piece
+            yield ('video', path, 0, None)
+            continue
+
+        for start in range(0, frames, segment_frames):
+            yield ('video', path, start, min(start + segment_frames, frames))
+
+    for start in range(0, len(images), segment_frames):
+        yield ('images', images[start:start + segment_frames])
+
+
+def init_pipeline(options: Dict[str, Any]) -> None:
+    """
+    Description
+    --
+    Creates the workers of the process.
+    """
+
+    global _pipeline
+
+    if options['processes'] > 1:
+        # The cores are shared by the processes already
+        cv2.setNumThreads(1)
+
+    logging.basicConfig(stream=sys.stderr, level=options['log_level'])
+
+    object_finder = of.ObjectFinder(options['classifier'])
+    object_finder.y_crop_ratio = 0.25
+    object_finder.scale = options['scale']
+    object_finder.min_neighbors = options['min_neighbors']
+    object_finder.downscale = options['downscale']
+
+    plate_lookup = pl.PlateLookup(cache_file=options['cache_file'], hotlist_file=options['hotlist_file'])
+    if plate_lookup.hotlist:
+        plate_lookup.hotlist.load()
+
+    _pipeline = {
+        'object_finder': object_finder,
+        'ocr': ocr.Ocr(engine=ocr.KnnEngine() if options['ocr_engine'] == 'knn' else None),
+        'plate_lookup': plate_lookup,
+        'batch_size': options['batch_size'],
+        'frame_step': options['frame_step']
+    }
+
+
+def frames_of(unit: Tuple, frame_step: int) -> Iterator[Tuple[str, int, float, Any]]:
+    """
+    Description
+    --
+    Reads the frames of a unit of work.
+
+    Returns
+    --
+    Tuples of file, frame index, timestamp in seconds (None for images)
+    and frame.
+    """
+
+    if unit[0] == 'images':
+        for path in unit[1]:
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield (path, 0, None, frame)
+
+        return
+
+    _, path, start, end = unit
+    stream = cv2.VideoCapture(path)
+
+    try:
+        fps = stream.get(cv2.CAP_PROP_FPS)
+        if start:
+            stream.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+        index = start
+        while end is None or index < end:
+            if (index - start) % frame_step:
+                # Skipped, not decoded
+                grabbed, frame = stream.grab(), None
+            else:
+                grabbed, frame = stream.read()
+
+            if not grabbed:
+                break
+
+            if frame is not None:
+                yield (path, index, index / fps if fps else None, frame)
+
+            index += 1
+    finally:
+        stream.release()
+
+
+def process_unit(unit: Tuple) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Description
+    --
+    Finds, reads and looks up the plates in a unit of work.
+
+    Returns
+    --
+    Tuple of the records of the plates read and the number of frames
+    processed.
+    """
+
+    object_finder = _pipeline['object_finder']
+    ocr_service = _pipeline['ocr']
+    plate_lookup = _pipeline['plate_lookup']
+    batch_size = _pipeline['batch_size']
+
+    records = []
+    frames_count = 0
+    frames = frames_of(unit, _pipeline['frame_step'])
+
+    while True:
+        batch = [f for _, f in zip(range(batch_size), frames)]
+        if not batch:
+            break
+
+        frames_count += len(batch)
+
+        # As the live pipeline does, one detection per object
+        detections = object_finder.suppress(object_finder.detect_batch([frame for _, _, _, frame in batch]))
+
+        if not len(detections):
+            continue
+
+        crops = [object_finder.crop(batch[d['frame']][3], d)[0] for d in detections]
+        texts = ocr_service.read_texts(crops)
+
+        for detection, text in zip(detections, texts):
+            if not text:
+                continue
+
+            path, index, timestamp_s, _ = batch[detection['frame']]
+
+            records.append({
+                'file': path,
+                'frame': index,
+                'timestamp_s': timestamp_s,
+                'rect': (int(detection['x']), int(detection['y']), int(detection['w']), int(detection['h'])),
+                'text': text,
+                'info': plate_lookup.lookup(text)
+            })
+
+    return (records, frames_count)
+
+
+def write_records(output, output_format: str, records: List[Dict[str, Any]]) -> None:
+    if output_format == 'csv':
+        writer = csv.writer(output)
+
+        for record in records:
+            writer.writerow([record['file'], record['frame'], record['timestamp_s']] + list(record['rect']) + [record['text'], json.dumps(record['info'])])
+    else:
+        for record in records:
+            output.write(json.dumps(record) + '\n')
+
+    output.flush()
+
+
+def main(args: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('--')[1].strip().split('\n\n')[0])
+    parser.add_argument('inputs', nargs='+', help="video files, image files or globs, directories")
+    parser.add_argument('-o', '--output', default='-', help="results file, - for stdout (default)")
+    parser.add_argument('-f', '--format', choices=('jsonl', 'csv'), help="results format (default by the output extension, else jsonl)")
+    parser.add_argument('-c', '--classifier', default=os.path.join('classifiers', 'mn_license_plates.xml'), help="cascade classifier file")
+    parser.add_argument('-p', '--processes', type=int, default=os.cpu_count(), help="number of processes (default one per core)")
+    parser.add_argument('--segment-frames', type=int, default=300, help="frames per unit of work")
+    parser.add_argument('--batch-size', type=int, default=4, help="frames detected at once")
+    parser.add_argument('--frame-step', type=int, default=1, help="process every Nth frame of the videos")
+    parser.add_argument('--scale', type=float, default=1.4, help="classifier scale factor")
+    parser.add_argument('--min-neighbors', type=int, default=5, help="classifier minimum neighbors")
+    parser.add_argument('--downscale', type=float, default=1, help="frame scale the classifier runs at, e.g. 0.5 for half")
+    parser.add_argument('--ocr-engine', choices=('default', 'knn'), default='default', help="OCR engine, see workers/ocr.py")
+    parser.add_argument('--cache-file', help="SQLite plate cache file")
+    parser.add_argument('--hotlist-file', help="hotlist CSV file")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log the plates read")
+    options = parser.parse_args(args)
+
+    output_format = options.format or ('csv' if options.output.lower().endswith('.csv') else 'jsonl')
+    pipeline_options = {
+        'processes': max(1, options.processes),
+        'log_level': logging.INFO if options.verbose else logging.WARNING,
+        'classifier': options.classifier,
+        'scale': options.scale,
+        'min_neighbors': options.min_neighbors,
+        'downscale': options.downscale,
+        'ocr_engine': options.ocr_engine,
+        'cache_file': options.cache_file,
+        'hotlist_file': options.hotlist_file,
+        'batch_size': max(1, options.batch_size),
+        'frame_step': max(1, options.frame_step)
+    }
+
+    output = sys.stdout if options.output == '-' else open(options.output, 'w', newline='')
+    if output_format == 'csv':
+        csv.writer(output).writerow(csv_columns)
+
+    units = work_units(options.inputs, max(1, options.segment_frames))
+    frames_count = 0
+    plates_count = 0
+    start = time.perf_counter()
+
+    try:
+        if pipeline_options['processes'] == 1:
+            init_pipeline(pipeline_options)
+            results = map(process_unit, units)
+            pool = None
+        else:
+            pool = multiprocessing.get_context('spawn').Pool(pipeline_options['processes'], init_pipeline, (pipeline_options,))
+            results = pool.imap(process_unit, units)
+
+        # In order, as the units are done
+        for records, count in results:
+            write_records(output, output_format, records)
+            frames_count += count
+            plates_count += len(records)
+
+        if pool:
+            pool.close()
+            pool.join()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed_s = time.perf_counter() - start
+    print("{} frames, {} plates read in {:.1f}s ({:.1f} fps)".format(frames_count, plates_count, elapsed_s, frames_count / elapsed_s if elapsed_s else 0), file=sys.stderr)
+
+
+""" Entry point """
+if __name__ == '__main__':
+    main()
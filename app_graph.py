@@ -0,0 +1,26 @@
+"""
+Description
+--
+Runs a pipeline described as a graph, in a YAML or JSON file (see
+`PipelineGraph`), until one of its workers stops or it's interrupted.
+
+>>> python app_graph.py pipelines/plates.yaml
+"""
+
+# System imports
+import sys
+
+# Local imports
+from workers import graph as gr
+from logger import log
+
+
+""" Entry point """
+if __name__ == '__main__':
+    # Load logging configuration
+    log.config()
+
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python app_graph.py pipeline.yaml")
+
+    gr.PipelineGraph(sys.argv[1]).run()
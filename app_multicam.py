@@ -0,0 +1,35 @@
+"""
+Description
+--
+Headless plate pipeline of many cameras, on shared object finder and
+OCR pools (see `MultiCameraPipeline`). Runs until interrupted.
+
+>>> python app_multicam.py cameras.json
+"""
+
+# System imports
+import sys
+import time
+
+# Local imports
+from workers import multicam as mc
+from logger import log
+
+
+""" Entry point """
+if __name__ == '__main__':
+    # Load logging configuration
+    log.config()
+
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python app_multicam.py cameras.json")
+
+    pipeline = mc.MultiCameraPipeline(sys.argv[1]).start()
+
+    try:
+        while any(feed._thread.is_alive() for feed in pipeline.feeds.values()):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+    pipeline.stop()
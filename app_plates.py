@@ -8,9 +8,11 @@ Minnesota license plates.
 # Local imports
 from workers import feed as fp
 from workers import classifier as of
+from workers import consensus as cs
 from workers import platelookup as pl
 from workers import ocr as ocr
 from workers import interface as ui
+from workers.worker import QueuePolicy
 from logger import log
 
 
@@ -23,31 +25,38 @@ if __name__ == '__main__':
     interface = ui.Cv2UserInterface(jobs_limit=30)
     # frame_feed = fp.FrameFeed(fp.VideoFrameProvider('videos\\mn_video1.mp4'), jobs_limit=60)
     frame_feed = fp.FrameFeed(fp.CameraFrameProvider(), jobs_limit=60)
+    frame_feed.ring_slots = 'auto'      # Recycle preallocated frames, as many as the subscribers hold
     object_finder = of.ObjectFinder('classifiers\\mn_license_plates.xml', jobs_limit=1)
     plate_lookup = pl.PlateLookup(jobs_limit=5)
     ocr_service = ocr.Ocr(jobs_limit=5)
+    # ocr_service.processes = 4         # OCR in 4 processes, outside of the GIL
+    plate_consensus = cs.PlateConsensus(jobs_limit=20)
 
     # Video feed -> Object Finder | UI
     frame_feed\
-        .link_to(object_finder, frame_feed.channel_raw)\
-        .link_to(interface, frame_feed.channel_processed)
+        .link_to(object_finder, frame_feed.channel_raw, QueuePolicy.latest_only)\
+        .link_to(interface, frame_feed.channel_processed, QueuePolicy.drop_oldest)
 
     # Object Finder -> Video feed | OCR
     object_finder\
-        .link_to(frame_feed, object_finder.channel_object_rectangle)\
-        .link_to(ocr_service, object_finder.channel_object_crop)\
+        .link_to(frame_feed, object_finder.channel_object_rectangles, QueuePolicy.latest_only)\
+        .link_to(ocr_service, object_finder.channel_object_crops)\
         .y_crop_ratio = 0.25            # Crop upper and lower 1/4th of the images
     object_finder.scale = 1.4           # Fast processing
     object_finder.min_neighbors = 5     # High confidence
+    # object_finder.downscale = 0.5   # Detect at half resolution, 4x faster
+    # object_finder.full_scan_every = 30  # Fixed camera, scan where plates were seen, fully every 30 frames
 
-    # OCR -> Plate Lookup
-    ocr_service.link_to(plate_lookup, ocr_service.channel_text)
+    # OCR -> Consensus -> Plate Lookup
+    ocr_service.link_to(plate_consensus, ocr_service.channel_track_text)
+    plate_consensus.link_to(plate_lookup, plate_consensus.channel_plate)
 
     # Plate lookup -> Frame feed
     # plate_lookup.link_to(frame_feed, plate_lookup.channel_plate_info)
 
     # Start the workers
     plate_lookup.start()
+    plate_consensus.start()
     ocr_service.start()
     object_finder.start()
     frame_feed.start()
@@ -57,4 +66,5 @@ if __name__ == '__main__':
     frame_feed.stop()
     object_finder.stop()
     ocr_service.stop()
+    plate_consensus.stop()
     plate_lookup.stop()
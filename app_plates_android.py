@@ -2,8 +2,9 @@
 Description
 --
 A version of plates lookup, to test on Android with Termux, that
-doesn't try to OCR, since can't install pytesseract on it and
-uses IP-based webcam running on the Android as an app.
+OCRs with the built-in character classifier, since can't install
+pytesseract on it and uses IP-based webcam running on the Android
+as an app.
 
 **Does not work**
 """
@@ -12,6 +13,8 @@ uses IP-based webcam running on the Android as an app.
 from workers import feed as fp
 from workers import classifier as of
 from workers import interface as ui
+from workers import ocr as ocr
+from workers.worker import QueuePolicy
 from logger import log
 
 
@@ -24,20 +27,23 @@ if __name__ == '__main__':
     interface = ui.Cv2UserInterface(jobs_limit=30)
     frame_feed = fp.FrameFeed(fp.IPCameraFrameProvider("http://127.0.0.1:8080"), jobs_limit=60)
     object_finder = of.ObjectFinder('classifiers\\mn_license_plates.xml', jobs_limit=1)
+    ocr_service = ocr.Ocr(jobs_limit=5, engine=ocr.KnnEngine())
 
     # Video feed -> Object Finder | UI
     frame_feed\
-        .link_to(object_finder, frame_feed.channel_raw)\
-        .link_to(interface, frame_feed.channel_processed)
+        .link_to(object_finder, frame_feed.channel_raw, QueuePolicy.latest_only)\
+        .link_to(interface, frame_feed.channel_processed, QueuePolicy.drop_oldest)
 
     # Object Finder -> Video feed | OCR
     object_finder\
-        .link_to(frame_feed, object_finder.channel_object_rectangle)\
+        .link_to(frame_feed, object_finder.channel_object_rectangles, QueuePolicy.latest_only)\
+        .link_to(ocr_service, object_finder.channel_object_crop)\
         .y_crop_ratio = 0.25            # Crop upper and lower 1/4th of the images
     object_finder.scale = 1.4           # Fast processing
     object_finder.min_neighbors = 5     # High confidence
 
     # Start the workers
+    ocr_service.start()
     object_finder.start()
     frame_feed.start()
     interface.start(True)
@@ -45,3 +51,4 @@ if __name__ == '__main__':
     # Interface stopped, stop the workers ...
     frame_feed.stop()
     object_finder.stop()
+    ocr_service.stop()
@@ -12,6 +12,7 @@ from workers import feed as fp
 from workers import classifier as of
 from workers import ocr as ocr
 from workers import interface as ui
+from workers.worker import QueuePolicy
 from logger import log
 
 
@@ -29,12 +30,12 @@ if __name__ == '__main__':
 
     # Video feed -> Object Finder | UI
     frame_feed\
-        .link_to(object_finder, frame_feed.channel_raw)\
-        .link_to(interface, frame_feed.channel_processed)
+        .link_to(object_finder, frame_feed.channel_raw, QueuePolicy.latest_only)\
+        .link_to(interface, frame_feed.channel_processed, QueuePolicy.drop_oldest)
 
     # Object Finder -> Video feed | OCR
     object_finder\
-        .link_to(frame_feed, object_finder.channel_object_rectangle)\
+        .link_to(frame_feed, object_finder.channel_object_rectangles, QueuePolicy.latest_only)\
         .link_to(ocr_service, object_finder.channel_object_crop)
     object_finder.scale = 1.4           # Fast processing
     object_finder.min_neighbors = 5     # High confidence
@@ -0,0 +1,356 @@
+"""
+Description
+--
+Tunes the `ObjectFinder` parameters - scale, min neighbors, object sizes,
+crop ratio and input downscale - over labelled clips. Measures the
+detection recall and time of every combination on this machine, and
+reports the Pareto front of recall against frames per second, and the
+combination with the best recall at a target frame rate.
+
+Clips are videos, each labelled by a CSV file of the same name, of the
+plate rectangles by frame index. Frames with no row have no plate:
+
+>>> frame,x,y,w,h
+>>> 12,640,410,180,90
+
+With no clips, synthetic ones are generated (see `benchmarks.synthetic`).
+
+Run from the repository root:
+
+>>> python -m benchmarks.autotune clips/ --target-fps 15 -o tuning.json
+"""
+
+# System imports
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+# 3rd party imports
+import cv2
+import numpy as np
+
+# Local imports
+from benchmarks import synthetic
+from workers import classifier as of
+from workers.geometry import iou
+
+# The grouping of detectMultiScale, see `group`
+group_eps = 0.2
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    """
+    Description
+    --
+    Parses a size, 'WxH' or 'none'.
+    """
+
+    if value.lower() == 'none':
+        return None
+
+    width, _, height = value.lower().partition('x')
+
+    try:
+        return (int(width), int(height))
+    except ValueError:
+        raise argparse.ArgumentTypeError("size must be WxH or none, not {}".format(value))
+
+
+def read_labels(file_path: str) -> Dict[int, List[Tuple[int, int, int, int]]]:
+    """
+    Description
+    --
+    Reads the plate rectangles of a clip, by frame index. The header is
+    optional.
+    """
+
+    labels = {}
+
+    with open(file_path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip().isdigit():
+                # Header or blank
+                continue
+
+            frame, x, y, w, h = (int(float(v)) for v in row[:5])
+            labels.setdefault(frame, []).append((x, y, w, h))
+
+    return labels
+
+
+def load_clips(inputs: List[str], frame_step: int, max_frames: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Description
+    --
+    Loads the frames of labelled clips.
+
+    Parameters
+    --
+    - inputs - video files, or directories of them, each with its CSV
+    labels file.
+    - frame_step - use every Nth frame.
+    - max_frames - the maximum number of frames per clip.
+
+    Returns
+    --
+    Tuples of frame and Nx4 array of its plate rectangles.
+    """
+
+    paths = []
+
+    for path in inputs:
+        if os.path.isdir(path):
+            paths.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if not name.lower().endswith('.csv') and os.path.isfile(os.path.join(path, os.path.splitext(name)[0] + '.csv'))))
+        elif os.path.isfile(path):
+            paths.append(path)
+        else:
+            raise ValueError("File not found {}".format(path))
+
+    frames = []
+
+    for path in paths:
+        labels_path = os.path.splitext(path)[0] + '.csv'
+        if not os.path.isfile(labels_path):
+            raise ValueError("No labels {} for {}".format(labels_path, path))
+
+        labels = read_labels(labels_path)
+        stream = cv2.VideoCapture(path)
+        index = 0
+        loaded = 0
+
+        try:
+            while loaded < max_frames:
+                grabbed, frame = stream.read()
+                if not grabbed:
+                    break
+
+                if index % frame_step == 0:
+                    frames.append((frame, np.asarray(labels.get(index, []), dtype=np.int32).reshape(-1, 4)))
+                    loaded += 1
+
+                index += 1
+        finally:
+            stream.release()
+
+    return frames
+
+
+def synthetic_clips(count: int, frames: int, resolution: Tuple[int, int], seed: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    return [
+        (frame, np.asarray([rectangle], dtype=np.int32))
+        for clip in range(count)
+        for frame, rectangle, _ in synthetic.plate_clip(frames, resolution, seed + clip)]
+
+
+def group(rectangles: np.ndarray, min_neighbors: int) -> np.ndarray:
+    """
+    Description
+    --
+    Groups raw cascade candidates (found with no minimum of neighbors) as
+    `detectMultiScale` does with `min_neighbors`, so a single cascade run
+    serves all the values of `min_neighbors`.
+    """
+
+    if not len(rectangles):
+        return np.empty((0, 4), dtype=np.int32)
+
+    grouped, _ = cv2.groupRectangles(rectangles.tolist(), min_neighbors, group_eps)
+
+    return np.asarray(grouped, dtype=np.int32).reshape(-1, 4)
+
+
+def score(detections: List[np.ndarray], frames: List[Tuple[np.ndarray, np.ndarray]], iou_threshold: float) -> Dict[str, Any]:
+    """
+    Description
+    --
+    Scores detections against the labels.
+
+    Returns
+    --
+    The recall of the plates, and the false detections per frame.
+    """
+
+    plates = found = false_positives = 0
+
+    for rectangles, (_, labels) in zip(detections, frames):
+        overlaps = iou(labels, rectangles) >= iou_threshold if len(labels) and len(rectangles) else np.zeros((len(labels), len(rectangles)), dtype=bool)
+
+        plates += len(labels)
+        found += int(overlaps.any(axis=1).sum())
+        false_positives += int((~overlaps.any(axis=0)).sum())
+
+    return {
+        'recall': round(found / plates, 4) if plates else None,
+        'false_per_frame': round(false_positives / len(frames), 4)
+    }
+
+
+def sweep(frames: List[Tuple[np.ndarray, np.ndarray]], options: argparse.Namespace) -> List[Dict[str, Any]]:
+    """
+    Description
+    --
+    Detects the plates with every combination of parameters.
+
+    Returns
+    --
+    The parameters, recall, false detections and detection time of each
+    combination.
+    """
+
+    object_finder = of.ObjectFinder(options.classifier)
+    object_finder.min_neighbors = 0
+
+    combinations = list(itertools.product(options.scales, options.crop_ratios, options.downscales, options.min_sizes, options.max_sizes))
+    results = []
+
+    for n, (scale, crop_ratio, downscale, min_size, max_size) in enumerate(combinations):
+        object_finder.scale = scale
+        object_finder.y_crop_ratio = crop_ratio
+        object_finder.downscale = downscale
+        object_finder.min_object_size = min_size
+        object_finder.max_object_size = max_size
+
+        def detect(frame):
+            detections = object_finder.detect_batch([frame])
+
+            return np.stack([detections['x'], detections['y'], detections['w'], detections['h']], axis=1)
+
+        # Buffers allocated, not timed
+        detect(frames[0][0])
+
+        candidates = []
+        start = time.perf_counter()
+
+        for frame, _ in frames:
+            candidates.append(detect(frame))
+
+        detect_s = time.perf_counter() - start
+
+        for min_neighbors in options.min_neighbors:
+            start = time.perf_counter()
+            detections = [group(c, min_neighbors) for c in candidates]
+            frame_ms = 1000 * (detect_s + time.perf_counter() - start) / len(frames)
+
+            results.append(dict(
+                score(detections, frames, options.iou),
+                scale=scale,
+                min_neighbors=min_neighbors,
+                y_crop_ratio=crop_ratio,
+                downscale=downscale,
+                min_object_size=min_size,
+                max_object_size=max_size,
+                frame_ms=round(frame_ms, 3),
+                fps=round(1000 / frame_ms, 2)))
+
+        print("{}/{} scale {}, crop {}, downscale {}, sizes {}-{}: {:.1f}ms".format(
+            n + 1, len(combinations), scale, crop_ratio, downscale, min_size, max_size, 1000 * detect_s / len(frames)), file=sys.stderr)
+
+    return results
+
+
+def pareto_front(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Description
+    --
+    The combinations no other one beats at both recall and frame rate,
+    fastest first.
+    """
+
+    front = []
+    best_recall = -1
+
+    for result in sorted(results, key=lambda r: (-r['fps'], -(r['recall'] or 0), r['false_per_frame'])):
+        if (result['recall'] or 0) > best_recall:
+            front.append(result)
+            best_recall = result['recall'] or 0
+
+    return front
+
+
+def recommend(results: List[Dict[str, Any]], target_fps: float) -> Dict[str, Any]:
+    """
+    Description
+    --
+    The combination with the best recall at the target frame rate, then
+    with the fewest false detections. If none is fast enough, the fastest.
+    """
+
+    fast_enough = [r for r in results if r['fps'] >= target_fps]
+
+    if not fast_enough:
+        return max(results, key=lambda r: r['fps'])
+
+    return max(fast_enough, key=lambda r: (r['recall'] or 0, -r['false_per_frame'], r['fps']))
+
+
+def main(args: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('--')[1].split('Clips')[0].strip())
+    parser.add_argument('inputs', nargs='*', help="labelled video files, or directories of them. None for synthetic clips")
+    parser.add_argument('-o', '--output', help="results JSON file")
+    parser.add_argument('-t', '--target-fps', type=float, default=15, help="frame rate the recommendation must keep up with")
+    parser.add_argument('-c', '--classifier', default=os.path.join('classifiers', 'mn_license_plates.xml'), help="cascade classifier file")
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.05, 1.1, 1.2, 1.3, 1.4], help="classifier scale factors")
+    parser.add_argument('--min-neighbors', type=int, nargs='+', default=[2, 3, 4, 5, 6], help="classifier minimum neighbors")
+    parser.add_argument('--crop-ratios', type=float, nargs='+', default=[0, 0.25], help="ratios cropped off the top and bottom")
+    parser.add_argument('--downscales', type=float, nargs='+', default=[1, 0.75, 0.5], help="frame scales the detection runs at")
+    parser.add_argument('--min-sizes', type=parse_size, nargs='+', default=[None], help="minimum plate sizes, WxH or none")
+    parser.add_argument('--max-sizes', type=parse_size, nargs='+', default=[None], help="maximum plate sizes, WxH or none")
+    parser.add_argument('--iou', type=float, default=0.3, help="overlap of a detection with a plate to count as found")
+    parser.add_argument('--frame-step', type=int, default=1, help="use every Nth frame of the clips")
+    parser.add_argument('--max-frames', type=int, default=300, help="frames per clip")
+    parser.add_argument('--synthetic', type=int, default=3, help="synthetic clips, with no inputs")
+    parser.add_argument('--synthetic-frames', type=int, default=20, help="frames per synthetic clip")
+    parser.add_argument('--resolution', choices=sorted(synthetic.resolutions), default='720p', help="resolution of the synthetic clips")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic clips")
+    options = parser.parse_args(args)
+
+    if options.inputs:
+        frames = load_clips(options.inputs, max(1, options.frame_step), options.max_frames)
+    else:
+        frames = synthetic_clips(options.synthetic, options.synthetic_frames, synthetic.resolutions[options.resolution], options.seed)
+
+    if not frames:
+        sys.exit("No frames")
+
+    print("{} frames, {} plates".format(len(frames), sum(len(labels) for _, labels in frames)), file=sys.stderr)
+
+    results = sweep(frames, options)
+    front = pareto_front(results)
+    best = recommend(results, options.target_fps)
+
+    columns = ('fps', 'recall', 'false_per_frame', 'scale', 'min_neighbors', 'y_crop_ratio', 'downscale', 'min_object_size', 'max_object_size')
+    print("Pareto front:")
+    print("  ".join("{:>15}".format(c) for c in columns))
+    for result in front:
+        print("  ".join("{:>15}".format(str(result[c])) for c in columns))
+
+    if best['fps'] < options.target_fps:
+        print("Nothing reaches {} fps, the fastest:".format(options.target_fps))
+    else:
+        print("Best recall at {} fps:".format(options.target_fps))
+
+    settings = {name: best[name] for name in columns[3:]}
+    print(json.dumps(dict(settings, fps=best['fps'], recall=best['recall']), indent=2))
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({
+                'frames': len(frames),
+                'cpus': os.cpu_count(),
+                'opencv': cv2.__version__,
+                'target_fps': options.target_fps,
+                'recommended': best,
+                'pareto_front': front,
+                'results': results
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Description
+--
+Micro-benchmark of the OCR pre-processing. Compares the per-crop time
+of the original pipeline (upscale, blur and threshold in color, a new
+array per step) to the current one (grayscale first, reusable buffers),
+crop by crop and in batches.
+
+Run from the repository root:
+
+>>> python -m benchmarks.ocr_preprocessing
+"""
+
+# System imports
+import argparse
+import time
+
+# 3rd party imports
+import cv2
+import numpy as np
+
+# Local imports
+from workers.ocr import KnnEngine, Ocr
+
+
+def legacy_pre_process(img, blur=5, threshold_block=11, threshold_val=8):
+    """
+    Description
+    --
+    The pre-processing as it was before the buffers.
+    """
+
+    pre_processed_image = cv2.resize(img, None, fx=2, fy=2, interpolation=cv2.INTER_LINEAR)
+
+    if blur:
+        pre_processed_image = cv2.medianBlur(pre_processed_image, blur)
+
+    return cv2.adaptiveThreshold(
+        cv2.cvtColor(pre_processed_image, cv2.COLOR_RGB2GRAY),
+        255,
+        cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY,
+        threshold_block,
+        threshold_val)
+
+
+def time_per_crop(function, crops, repeat):
+    """
+    Description
+    --
+    Best per-crop time of `repeat` runs, in microseconds.
+    """
+
+    best = float('inf')
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(crops)
+        best = min(best, time.perf_counter() - start)
+
+    return best / len(crops) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('--')[1].split('Run')[0].strip())
+    parser.add_argument('--width', type=int, default=140, help='crop width')
+    parser.add_argument('--height', type=int, default=70, help='crop height')
+    parser.add_argument('--crops', type=int, default=64, help='number of crops')
+    parser.add_argument('--batch', type=int, default=8, help='crops per batch')
+    parser.add_argument('--repeat', type=int, default=20, help='runs, the best one counts')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    crops = rng.integers(0, 256, (args.crops, args.height, args.width, 3), dtype=np.uint8)
+
+    ocr = Ocr(engine=KnnEngine())
+
+    # As the legacy one does
+    ocr.height = None
+    ocr.threshold_block = 11
+
+    def batched(images):
+        for i in range(0, len(images), args.batch):
+            ocr._pre_process_batch(list(images[i:i + args.batch]))
+
+    results = [
+        ('legacy', time_per_crop(lambda images: [legacy_pre_process(i) for i in images], crops, args.repeat)),
+        ('buffers', time_per_crop(lambda images: [ocr._pre_process_image(i) for i in images], crops, args.repeat)),
+        ('batch of {}'.format(args.batch), time_per_crop(batched, crops, args.repeat))
+    ]
+
+    print("{}x{} crops, per crop:".format(args.width, args.height))
+    for name, us in results:
+        print("  {:<12} {:8.1f} us  ({:.2f}x)".format(name, us, results[0][1] / us))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,418 @@
+"""
+Description
+--
+End-to-end benchmark of the plate pipeline, headless, on synthetic plate
+frames (see `benchmarks.synthetic`) at several resolutions. Measures the
+throughput and latency percentiles of each stage - `FrameFeed`,
+`ObjectFinder`, `Ocr` and `PlateLookup` called directly, one job at a
+time - and of the threaded pipeline, from the feed to each worker. Writes
+the results as JSON, to compare between commits.
+
+Run from the repository root:
+
+>>> python -m benchmarks.pipeline -o before.json
+>>> python -m benchmarks.pipeline -o after.json --compare before.json
+"""
+
+# System imports
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+# 3rd party imports
+import cv2
+import numpy as np
+
+# Local imports
+from benchmarks import synthetic
+from workers import classifier as of
+from workers import consensus as cs
+from workers import feed as fp
+from workers import metrics
+from workers import ocr as ocr
+from workers import platelookup as pl
+from workers.geometry import iou
+from workers.worker import QueuePolicy
+
+# Stage keys of the results, compared between runs
+_key_fields = ('stage', 'resolution')
+
+
+class SyntheticFrameProvider(fp.FrameProvider):
+    """
+    Provides frames from memory, in a loop, up to a count.
+    """
+
+    def __init__(self, frames: List[np.ndarray], count: int) -> None:
+        self._frames = frames
+        self._count = count
+        self._served = 0
+
+    def start(self) -> None:
+        self._served = 0
+
+    def get(self):
+        if self._served >= self._count:
+            return (False, None)
+
+        frame = self._frames[self._served % len(self._frames)]
+        self._served += 1
+
+        return (True, frame)
+
+
+class SampledHistogram(metrics.Histogram):
+    """
+    A histogram which keeps the observed values too, for exact
+    percentiles.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.values = []  # type: List[float]
+
+    def observe(self, value_s: float) -> None:
+        super().observe(value_s)
+        self.values.append(value_s)
+
+
+def git_commit() -> Dict[str, Any]:
+    """
+    Description
+    --
+    The commit benchmarked, and whether the tree has changes.
+    """
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], stderr=subprocess.DEVNULL, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+    return {'commit': commit, 'dirty': dirty}
+
+
+def latency_stats(latencies_s: List[float]) -> Dict[str, Any]:
+    """
+    Description
+    --
+    Summarizes latencies - count and percentiles in ms.
+    """
+
+    if not latencies_s:
+        return {'count': 0}
+
+    latencies_ms = 1000 * np.asarray(latencies_s)
+    p50, p90, p99 = np.percentile(latencies_ms, (50, 90, 99))
+
+    return {
+        'count': len(latencies_s),
+        'mean_ms': round(float(latencies_ms.mean()), 3),
+        'p50_ms': round(float(p50), 3),
+        'p90_ms': round(float(p90), 3),
+        'p99_ms': round(float(p99), 3),
+        'max_ms': round(float(latencies_ms.max()), 3)
+    }
+
+
+def measure(function: Callable[[Any], Any], jobs: List[Any], warmup: int, repeat: int) -> Dict[str, Any]:
+    """
+    Description
+    --
+    Measures a function called on each job, one by one.
+
+    Parameters
+    --
+    - function - processes a job.
+    - jobs - the jobs.
+    - warmup - the number of jobs processed first, not measured.
+    - repeat - the number of runs over the jobs. The throughput is of
+    the fastest run, the least disturbed by the rest of the machine.
+    """
+
+    for job in jobs[:warmup]:
+        function(job)
+
+    latencies_s = []
+    best_s = float('inf')
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+
+        for job in jobs:
+            job_start = time.perf_counter()
+            function(job)
+            latencies_s.append(time.perf_counter() - job_start)
+
+        best_s = min(best_s, time.perf_counter() - start)
+
+    return dict(latency_stats(latencies_s), per_s=round(len(jobs) / best_s, 2))
+
+
+def create_object_finder(options: argparse.Namespace) -> of.ObjectFinder:
+    object_finder = of.ObjectFinder(options.classifier, jobs_limit=1)
+    object_finder.y_crop_ratio = 0.25
+    object_finder.scale = options.scale
+    object_finder.min_neighbors = options.min_neighbors
+    object_finder.downscale = options.downscale
+
+    return object_finder
+
+
+def create_ocr(options: argparse.Namespace) -> ocr.Ocr:
+    ocr_service = ocr.Ocr(jobs_limit=5, engine=ocr.KnnEngine() if options.ocr_engine == 'knn' else None)
+    ocr_service.blur = options.blur
+
+    return ocr_service
+
+
+def benchmark_stages(options: argparse.Namespace, resolution: str, frames: List[tuple]) -> List[Dict[str, Any]]:
+    """
+    Description
+    --
+    Measures each stage on its own, in this thread.
+
+    Returns
+    --
+    The results of each stage.
+    """
+
+    images = [frame for frame, _, _ in frames]
+    rectangles = [rectangle for _, rectangle, _ in frames]
+    texts = [text for _, _, text in frames]
+    results = []
+
+    # Frame feed - a frame grabbed into the ring and highlighted
+    feed = fp.FrameFeed(SyntheticFrameProvider(images, options.warmup + options.repeat * len(images)))
+    feed.ring_slots = 16
+    feed._on_starting()
+
+    highlights = [((x, y), (x + w, y + h)) for x, y, w, h in rectangles]
+    results.append(dict(measure(lambda job: feed._publish_results(feed._process_input_job(job)), highlights, options.warmup, options.repeat), stage='feed'))
+
+    # Object finder, with its recall of the plates
+    object_finder = create_object_finder(options)
+    found = []
+
+    def find(frame):
+        detections = object_finder.detect_batch([frame])
+        found.append(detections)
+        object_finder._results(frame, detections)
+
+    stats = measure(find, images, options.warmup, options.repeat)
+    found = found[options.warmup:options.warmup + len(images)]
+    stats['recall'] = round(sum(
+        bool(len(d)) and bool((iou([(int(e['x']), int(e['y']), int(e['w']), int(e['h'])) for e in d], [r]) >= 0.3).any())
+        for d, r in zip(found, rectangles)) / len(images), 3)
+    results.append(dict(stats, stage='object_finder'))
+
+    # OCR of the plates, with its accuracy
+    ocr_service = create_ocr(options)
+    crops = [frame[y:y + h, x:x + w].copy() for frame, (x, y, w, h) in zip(images, rectangles)]
+    read = []
+
+    stats = measure(lambda crop: read.append(ocr_service.read_text(crop)), crops, options.warmup, options.repeat)
+    read = read[options.warmup:options.warmup + len(crops)]
+    stats['accuracy'] = round(sum((r or '').replace(' ', '') == t.replace(' ', '') for r, t in zip(read, texts)) / len(crops), 3)
+    ocr_service._on_stopped()
+    results.append(dict(stats, stage='ocr'))
+
+    # Plate lookup - a plate is seen many times, most lookups are cached
+    plate_lookup = pl.PlateLookup()
+    plate_lookup.cache_log_every = 0
+    lookups = [texts[i] for i in np.random.default_rng(options.seed).integers(0, len(texts), 100 * len(texts))]
+    results.append(dict(measure(plate_lookup._process_input_job, lookups, options.warmup, options.repeat), stage='plate_lookup'))
+
+    for result in results:
+        result['resolution'] = resolution
+
+    return results
+
+
+def benchmark_pipeline(options: argparse.Namespace, resolution: str, frames: List[tuple]) -> Dict[str, Any]:
+    """
+    Description
+    --
+    Runs the threaded pipeline over the frames, as fast as it goes, and
+    measures its throughput and the latency from the feed to each worker
+    (see `workers.metrics`).
+
+    Returns
+    --
+    The results of the pipeline.
+    """
+
+    metrics.enable()
+
+    try:
+        feed = fp.FrameFeed(SyntheticFrameProvider([frame for frame, _, _ in frames], options.pipeline_frames), jobs_limit=60)
+        feed.ring_slots = 'auto'
+        object_finder = create_object_finder(options)
+        ocr_service = create_ocr(options)
+        plate_consensus = cs.PlateConsensus(jobs_limit=20)
+        plate_lookup = pl.PlateLookup(jobs_limit=5)
+        plate_lookup.cache_log_every = 0
+    finally:
+        # Only for these workers
+        metrics.disable()
+
+    workers = [plate_lookup, plate_consensus, ocr_service, object_finder, feed]
+
+    for worker in workers:
+        worker.metrics.latency_s = SampledHistogram()
+
+    # Every frame is processed, unless real-time dropping is asked for
+    policy = QueuePolicy.latest_only if options.drop_frames else QueuePolicy.block
+
+    feed.link_to(object_finder, feed.channel_raw, policy)
+    object_finder\
+        .link_to(feed, object_finder.channel_object_rectangles, QueuePolicy.latest_only)\
+        .link_to(ocr_service, object_finder.channel_object_crops)
+    ocr_service.link_to(plate_consensus, ocr_service.channel_track_text)
+    plate_consensus.link_to(plate_lookup, plate_consensus.channel_plate)
+
+    start = time.perf_counter()
+
+    for worker in workers:
+        worker.start()
+
+    feed.join()
+
+    # Until the jobs in the queues and in the works are done
+    deadline = time.perf_counter() + 60
+    while time.perf_counter() < deadline and any(
+            w.queue.qsize() or w.metrics.processing_s.count + w.jobs_dropped < w.metrics.jobs_in for w in workers[:-1]):
+        time.sleep(0.001)
+
+    elapsed_s = time.perf_counter() - start
+
+    for worker in workers:
+        worker.stop()
+
+    for worker in workers:
+        worker.join()
+
+    return {
+        'stage': 'pipeline',
+        'resolution': resolution,
+        'policy': policy,
+        'frames': feed.metrics.jobs_out,
+        'per_s': round(feed.metrics.jobs_out / elapsed_s, 2),
+        'frames_dropped': object_finder.jobs_dropped,
+        'plates_read': ocr_service.metrics.jobs_out,
+        'latency': {
+            worker.__class__.__name__: latency_stats(worker.metrics.latency_s.values)
+            for worker in workers[:-1]
+        }
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """
+    Description
+    --
+    Compares the throughput of each stage to a baseline.
+
+    Parameters
+    --
+    - results - the results.
+    - baseline - the results to compare to.
+    - tolerance - the slowdown tolerated, e.g. 0.1 for 10%.
+
+    Returns
+    --
+    The stages slower than tolerated.
+    """
+
+    baseline = {tuple(r[f] for f in _key_fields): r for r in baseline}
+    regressions = []
+
+    print("{:<16} {:<8} {:>12} {:>12} {:>8}".format('stage', 'res', 'baseline/s', 'now/s', 'ratio'))
+
+    for result in results:
+        key = tuple(result[f] for f in _key_fields)
+        before = baseline.get(key, {}).get('per_s')
+        now = result.get('per_s')
+
+        if not before or not now:
+            continue
+
+        ratio = now / before
+        print("{:<16} {:<8} {:>12.1f} {:>12.1f} {:>7.2f}x".format(key[0], key[1], before, now, ratio))
+
+        if ratio < 1 - tolerance:
+            regressions.append("{} {}: {:.1f}/s, was {:.1f}/s".format(key[0], key[1], now, before))
+
+    return regressions
+
+
+def main(args: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('--')[1].split('Run')[0].strip())
+    parser.add_argument('-o', '--output', help="results JSON file")
+    parser.add_argument('-r', '--resolutions', nargs='+', choices=sorted(synthetic.resolutions), default=['480p', '720p', '1080p'], help="frame resolutions")
+    parser.add_argument('--frames', type=int, default=50, help="distinct synthetic frames per resolution")
+    parser.add_argument('--warmup', type=int, default=5, help="jobs processed before measuring")
+    parser.add_argument('--repeat', type=int, default=3, help="runs over the frames per stage, the fastest counts")
+    parser.add_argument('--pipeline-frames', type=int, default=300, help="frames through the threaded pipeline, 0 to skip it")
+    parser.add_argument('--drop-frames', action='store_true', help="drop frames the object finder can't keep up with, as live")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic frames")
+    parser.add_argument('-c', '--classifier', default=os.path.join('classifiers', 'mn_license_plates.xml'), help="cascade classifier file")
+    parser.add_argument('--scale', type=float, default=1.1, help="classifier scale factor (1.4 misses most synthetic plates)")
+    parser.add_argument('--min-neighbors', type=int, default=5, help="classifier minimum neighbors")
+    parser.add_argument('--downscale', type=float, default=1, help="frame scale the classifier runs at, e.g. 0.5 for half")
+    parser.add_argument('--blur', type=int, default=5, help="OCR median blur, 0 for none")
+    parser.add_argument('--ocr-engine', choices=('default', 'knn'), default='default', help="OCR engine, see workers/ocr.py")
+    parser.add_argument('--compare', help="results JSON file to compare the throughput to")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="slowdown tolerated by --compare, exits with 1 beyond")
+    options = parser.parse_args(args)
+
+    results = []
+
+    for resolution in options.resolutions:
+        frames = synthetic.plate_frames(options.frames, synthetic.resolutions[resolution], options.seed)
+        print("{}: {} frames".format(resolution, len(frames)), file=sys.stderr)
+
+        results += benchmark_stages(options, resolution, frames)
+
+        if options.pipeline_frames:
+            results.append(benchmark_pipeline(options, resolution, frames))
+
+    report = dict(
+        git_commit(),
+        timestamp=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        platform=platform.platform(),
+        python=platform.python_version(),
+        opencv=cv2.__version__,
+        numpy=np.__version__,
+        cpus=os.cpu_count(),
+        settings={name: value for name, value in vars(options).items() if name not in ('output', 'compare', 'tolerance')},
+        results=results)
+
+    print("{:<16} {:<8} {:>10} {:>10} {:>10} {:>10}".format('stage', 'res', 'per_s', 'p50_ms', 'p90_ms', 'p99_ms'))
+    for result in results:
+        print("{:<16} {:<8} {:>10} {:>10} {:>10} {:>10}".format(
+            result['stage'], result['resolution'], result.get('per_s', '-'),
+            result.get('p50_ms', '-'), result.get('p90_ms', '-'), result.get('p99_ms', '-')))
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if options.compare:
+        with open(options.compare) as f:
+            regressions = compare(results, json.load(f)['results'], options.tolerance)
+
+        if regressions:
+            print("Slower than {}:\n{}".format(options.compare, "\n".join(regressions)), file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Description
+--
+Synthetic license plate frames, for benchmarks - Minnesota-like plates
+rendered with OpenCV on a textured background, at a known rectangle and
+with a known text. Reproducible, by the seed.
+"""
+
+# System imports
+from typing import Iterator, List, Tuple
+
+# 3rd party imports
+import cv2
+import numpy as np
+
+# Common resolutions, width and height
+resolutions = {
+    '480p': (640, 480),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080)
+}
+
+_letters = 'ABCDEFGHJKLMNPRSTVWXYZ'
+_digits = '0123456789'
+
+
+def plate_text(rng: np.random.Generator) -> str:
+    """
+    Description
+    --
+    A random plate number, e.g. 'ABC 123' or '123 ABC'.
+    """
+
+    letters = ''.join(rng.choice(list(_letters), 3))
+    digits = ''.join(rng.choice(list(_digits), 3))
+
+    return '{} {}'.format(letters, digits) if rng.random() < 0.5 else '{} {}'.format(digits, letters)
+
+
+def plate_image(text: str, width: int) -> np.ndarray:
+    """
+    Description
+    --
+    Renders a plate, twice as wide as high.
+
+    Parameters
+    --
+    - text - the plate number.
+    - width - the width of the plate, in pixels.
+
+    Returns
+    --
+    The BGR image of the plate.
+    """
+
+    height = width // 2
+    s = width / 240
+    plate = np.full((height, width, 3), 225, dtype=np.uint8)
+
+    # Lighter lower half, state name above the number and slogan below
+    plate[height // 2:] = (235, 215, 200)
+    cv2.putText(plate, "Minnesota", (int(width * 0.3), int(height * 0.2)), cv2.FONT_HERSHEY_SCRIPT_SIMPLEX, 0.7 * s, (120, 60, 20), max(1, int(1.5 * s)), cv2.LINE_AA)
+
+    # The number within the frame, as wide as it fits
+    font_scale = 1.8 * s
+    (text_width, text_height), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_DUPLEX, font_scale, max(1, int(4 * s)))
+    font_scale *= min(1, 0.88 * width / text_width)
+    (text_width, text_height), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_DUPLEX, font_scale, max(1, int(4 * s)))
+    cv2.putText(plate, text, ((width - text_width) // 2, (height + text_height) // 2 + int(height * 0.05)), cv2.FONT_HERSHEY_DUPLEX, font_scale, (110, 40, 20), max(1, int(4 * s)), cv2.LINE_AA)
+
+    cv2.putText(plate, "10,000 lakes", (int(width * 0.32), int(height * 0.93)), cv2.FONT_HERSHEY_SIMPLEX, 0.5 * s, (120, 60, 20), max(1, int(s)), cv2.LINE_AA)
+    cv2.rectangle(plate, (0, 0), (width - 1, height - 1), (60, 60, 60), max(1, int(2 * s)))
+
+    # Not as sharp as rendered
+    return cv2.GaussianBlur(plate, (3, 3), 0)
+
+
+def background(rng: np.random.Generator, resolution: Tuple[int, int]) -> np.ndarray:
+    """
+    Description
+    --
+    A textured background - smooth blotches and fine noise.
+    """
+
+    width, height = resolution
+    blotches = rng.integers(40, 200, (height // 40 + 1, width // 40 + 1, 3), dtype=np.uint8)
+
+    return cv2.add(
+        cv2.resize(blotches, (width, height), interpolation=cv2.INTER_CUBIC),
+        rng.integers(0, 30, (height, width, 3), dtype=np.uint8))
+
+
+def plate_frame(rng: np.random.Generator, resolution: Tuple[int, int], text: str = None) -> Tuple[np.ndarray, Tuple[int, int, int, int], str]:
+    """
+    Description
+    --
+    A frame with a plate, 10 to 16% as wide as the frame, in its middle
+    half vertically.
+
+    Parameters
+    --
+    - rng - the random generator.
+    - resolution - the width and height of the frame.
+    - text - the plate number. If none specified, a random one.
+
+    Returns
+    --
+    Tuple of the frame, the rectangle of the plate (X, Y, W, H) and its
+    number.
+    """
+
+    width, height = resolution
+    text = text or plate_text(rng)
+
+    frame = background(rng, resolution)
+
+    plate_width = int(width * rng.uniform(0.1, 0.16))
+    plate = plate_image(text, plate_width)
+    plate_height = plate.shape[0]
+
+    x = int(rng.integers(0, width - plate_width))
+    y = int(rng.integers(height // 4, 3 * height // 4 - plate_height))
+    frame[y:y + plate_height, x:x + plate_width] = plate
+
+    return (frame, (x, y, plate_width, plate_height), text)
+
+
+def plate_frames(count: int, resolution: Tuple[int, int], seed: int = 0) -> List[Tuple[np.ndarray, Tuple[int, int, int, int], str]]:
+    """
+    Description
+    --
+    Frames with plates, see `plate_frame`. The same for the same seed.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    return [plate_frame(rng, resolution) for _ in range(count)]
+
+
+def plate_clip(count: int, resolution: Tuple[int, int], seed: int = 0) -> Iterator[Tuple[np.ndarray, Tuple[int, int, int, int], str]]:
+    """
+    Description
+    --
+    Frames of a plate driving by - the same plate, growing and moving
+    across the same background. The same for the same seed.
+
+    Returns
+    --
+    Tuples of frame, plate rectangle (X, Y, W, H) and plate number.
+    """
+
+    rng = np.random.default_rng(seed)
+    width, height = resolution
+    text = plate_text(rng)
+    scene = background(rng, resolution)
+
+    start_x, end_x = rng.uniform(0.05, 0.45) * width, rng.uniform(0.3, 0.7) * width
+    start_y = rng.uniform(0.3, 0.45) * height
+
+    for i in range(count):
+        progress = i / max(1, count - 1)
+
+        plate = plate_image(text, int(width * (0.08 + 0.1 * progress)))
+        plate_height, plate_width = plate.shape[:2]
+
+        x = int(start_x + (end_x - start_x) * progress)
+        y = min(int(start_y + 0.15 * height * progress), height - plate_height)
+
+        frame = scene.copy()
+        frame[y:y + plate_height, x:x + plate_width] = plate
+
+        yield (frame, (x, y, plate_width, plate_height), text)
@@ -109,5 +109,13 @@ setup(
         'pytesseract',
         'imutils',
         'urllib3'
-    ]
+    ],
+
+    # Optional dependencies, installed with:
+    #
+    # $ pip install -e .[tesserocr]
+    extras_require={
+        'tesserocr': ['tesserocr'],  # In-process OCR, see workers/ocr.py
+        'yaml': ['PyYAML']  # YAML pipeline graphs, see workers/graph.py
+    }
 )
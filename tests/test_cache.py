@@ -0,0 +1,71 @@
+"""
+Description
+--
+Tests of the caches, notably the expiry of the entries promoted from the
+persistent cache to the in-memory one.
+
+Run from the repository root:
+
+>>> python -m pytest tests
+"""
+
+# System imports
+import os
+import tempfile
+import time
+import unittest
+
+# Local imports
+from workers.cache import SqliteCache, TieredCache, TtlCache
+
+
+class TieredCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        descriptor, self.file_path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(descriptor)
+
+        self.slow = SqliteCache(self.file_path, ttl_s=0.5, negative_ttl_s=0.5)
+        self.cache = TieredCache(TtlCache(ttl_s=60, negative_ttl_s=60), self.slow)
+
+    def tearDown(self) -> None:
+        self.cache.close()
+
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.file_path + suffix):
+                os.remove(self.file_path + suffix)
+
+    def test_promoted_expires_with_slow(self) -> None:
+        # Cached by another process, say
+        self.slow.put('KAB123', {'Plate': 'KAB123'})
+        self.slow.put('KAB124', None)
+
+        self.assertEqual(self.cache.get('KAB123'), (True, {'Plate': 'KAB123'}))
+        self.assertEqual(self.cache.get('KAB124'), (True, None))
+
+        time.sleep(0.6)
+
+        self.assertEqual(self.cache.get('KAB123'), (False, None))
+        self.assertEqual(self.cache.get('KAB124'), (False, None))
+
+    def test_promoted_for_fast_ttl_at_most(self) -> None:
+        self.cache.fast.ttl_s = 0.1
+        self.slow.ttl_s = 60
+        self.slow.put('KAB123', {'Plate': 'KAB123'})
+
+        self.cache.get('KAB123')
+        time.sleep(0.2)
+
+        self.assertEqual(self.cache.fast.get('KAB123'), (False, None))
+
+    def test_remaining_ttl(self) -> None:
+        self.slow.put('KAB123', {'Plate': 'KAB123'})
+
+        cached, value, ttl_s = self.slow.get_with_ttl('KAB123')
+
+        self.assertTrue(cached)
+        self.assertTrue(0 < ttl_s <= 0.5)
+        self.assertEqual(self.slow.get_with_ttl('XYZ789'), (False, None, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Description
+--
+Tests of the object finder, on synthetic plate frames.
+
+Run from the repository root:
+
+>>> python -m pytest tests
+"""
+
+# System imports
+import unittest
+
+# 3rd party imports
+import numpy as np
+
+# Local imports
+from benchmarks import synthetic
+from workers.classifier import ObjectFinder
+
+
+class DetectBatchTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.frames = [frame for frame, _, _ in synthetic.plate_clip(12, synthetic.resolutions['480p'])]
+
+    def setUp(self) -> None:
+        self.object_finder = ObjectFinder('classifiers/mn_license_plates.xml')
+        self.object_finder.y_crop_ratio = 0.25
+        self.object_finder.scale = 1.1
+        self.object_finder.min_neighbors = 3
+
+    def _assert_batched_as_single(self, batch_size: int) -> None:
+        single = []
+        for i, frame in enumerate(self.frames):
+            detections = self.object_finder.detect_batch([frame])
+            detections['frame'] = i
+            single.append(detections)
+
+        batched = []
+        for start in range(0, len(self.frames), batch_size):
+            detections = self.object_finder.detect_batch(self.frames[start: start + batch_size])
+            detections['frame'] += start
+            batched.append(detections)
+
+        single = np.concatenate(single)
+        self.assertGreater(len(single), 0)
+        self.assertEqual(np.concatenate(batched).tolist(), single.tolist())
+
+    def test_batched_as_single(self) -> None:
+        for batch_size in (2, 5, 12):
+            with self.subTest(batch_size=batch_size):
+                self._assert_batched_as_single(batch_size)
+
+    def test_batched_as_single_downscaled(self) -> None:
+        self.object_finder.downscale = 0.75
+
+        self._assert_batched_as_single(4)
+
+    def test_batched_as_single_ungrouped(self) -> None:
+        self.object_finder.min_neighbors = 0
+
+        self._assert_batched_as_single(4)
+
+
+if __name__ == '__main__':
+    unittest.main()
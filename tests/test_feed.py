@@ -0,0 +1,181 @@
+"""
+Description
+--
+Tests of the streaming frame providers, against a stub MJPEG camera on
+localhost.
+
+Run from the repository root:
+
+>>> python -m pytest tests
+"""
+
+# System imports
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+import time
+import unittest
+
+# 3rd party imports
+import cv2
+import numpy as np
+
+# Local imports
+from workers.feed import IPCameraFrameProvider, RtspFrameProvider
+
+_boundary = 'frame'
+
+
+def _jpeg(value: int) -> bytes:
+    # A plain gray frame, its value survives the compression
+    return cv2.imencode('.jpg', np.full((48, 64, 3), value, dtype=np.uint8))[1].tobytes()
+
+
+class _StubCamera(BaseHTTPRequestHandler):
+    """
+    /stream - MJPEG stream of the server's frames, with the length of
+    each part if the server's `lengths`, then ends.
+    /snapshot - a JPEG per request.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self) -> None:
+        server = self.server
+        server.requests += 1
+
+        if self.path == '/snapshot':
+            jpeg = _jpeg(server.values[0])
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(jpeg)))
+            self.end_headers()
+            self.wfile.write(jpeg)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary={}'.format(_boundary))
+        self.end_headers()
+
+        self.wfile.write('Preamble\r\n--{}\r\n'.format(_boundary).encode('latin-1'))
+
+        for i, value in enumerate(server.values):
+            jpeg = _jpeg(value)
+            headers = 'Content-Type: image/jpeg\r\n'
+
+            if server.lengths:
+                headers += 'Content-Length: {}\r\n'.format(len(jpeg))
+
+            # Without a length, a part ends at the next delimiter
+            delimiter = '--{}{}\r\n'.format(_boundary, '--' if i == len(server.values) - 1 else '')
+
+            self.wfile.write('{}\r\n'.format(headers).encode('latin-1') + jpeg + '\r\n{}'.format(delimiter).encode('latin-1'))
+            self.wfile.flush()
+
+            # One by one, so none is superseded before it's decoded
+            server.sent.wait(1)
+            server.sent.clear()
+
+        self.close_connection = True
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class IPCameraFrameProviderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubCamera)
+        self.server.daemon_threads = True
+        self.server.values = [40, 120, 200]
+        self.server.lengths = True
+        self.server.requests = 0
+        self.server.sent = threading.Event()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.provider = None
+
+    def tearDown(self) -> None:
+        if self.provider is not None:
+            self.provider.stop()
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _start(self, path: str) -> IPCameraFrameProvider:
+        self.provider = IPCameraFrameProvider('http://127.0.0.1:{}{}'.format(self.server.server_address[1], path), timeout_s=2)
+        self.provider.reconnect_delay_s = 0.05
+        self.provider.start()
+
+        return self.provider
+
+    def _values(self, count: int):
+        values = []
+
+        for _ in range(count):
+            grabbed, frame = self.provider.get()
+
+            self.assertTrue(grabbed)
+            self.assertEqual(frame.shape, (48, 64, 3))
+            values.append(int(round(frame.mean())))
+
+            # Next one
+            self.server.sent.set()
+
+        return values
+
+    def _assert_values(self, values, expected) -> None:
+        for value, e in zip(values, expected):
+            self.assertLessEqual(abs(value - e), 2)
+
+    def test_stream(self) -> None:
+        self._start('/stream')
+
+        self._assert_values(self._values(3), self.server.values)
+
+    def test_stream_without_lengths(self) -> None:
+        self.server.lengths = False
+        self._start('/stream')
+
+        self._assert_values(self._values(3), self.server.values)
+
+    def test_reconnect(self) -> None:
+        self._start('/stream')
+
+        # The stream ends after 3 frames, the next ones are of a new one
+        self._assert_values(self._values(5), self.server.values + self.server.values[:2])
+        self.assertGreaterEqual(self.server.requests, 2)
+
+    def test_snapshots(self) -> None:
+        self._start('/snapshot')
+
+        self._assert_values(self._values(2), [40, 40])
+
+    def test_interrupt(self) -> None:
+        self.server.values = []
+        self._start('/stream')
+
+        threading.Timer(0.2, self.provider.interrupt).start()
+        started = time.monotonic()
+
+        self.assertEqual(self.provider.get(), (False, None))
+        self.assertLess(time.monotonic() - started, 2)
+
+
+class RtspFrameProviderTest(unittest.TestCase):
+    def test_options_restored(self) -> None:
+        os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = 'probesize;32'
+
+        try:
+            # Nothing listens there, the stream just doesn't open
+            provider = RtspFrameProvider('rtsp://127.0.0.1:9/stream', transport='udp')
+            provider.start()
+            provider.stop()
+
+            self.assertEqual(os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'], 'probesize;32')
+        finally:
+            del os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS']
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Description
+--
+Tests of the hotlist index, notably its incremental reload.
+
+Run from the repository root:
+
+>>> python -m pytest tests
+"""
+
+# System imports
+import os
+import tempfile
+import unittest
+
+# Local imports
+from workers.platelookup import Hotlist
+
+# Plates no test plate is one edit from, so a reload is incremental
+_padding = ['PAD{:03d}'.format(i) for i in range(20)]
+
+
+class HotlistReloadTest(unittest.TestCase):
+    def setUp(self) -> None:
+        descriptor, self.file_path = tempfile.mkstemp(suffix='.csv')
+        os.close(descriptor)
+        self._mtime_ns = 0
+
+    def tearDown(self) -> None:
+        os.remove(self.file_path)
+
+    def _write(self, plates) -> None:
+        with open(self.file_path, 'w', newline='') as f:
+            f.write('\n'.join(plates) + '\n')
+
+        # A different modification time each write, however fast
+        self._mtime_ns += 1000000000
+        os.utime(self.file_path, ns=(self._mtime_ns, self._mtime_ns))
+
+    def _reloaded(self, before, after) -> Hotlist:
+        self._write(before + _padding)
+        hotlist = Hotlist(self.file_path)
+        self.assertTrue(hotlist.load())
+
+        self._write(after + _padding)
+        self.assertTrue(hotlist.load())
+
+        return hotlist
+
+    def _fresh(self, plates) -> Hotlist:
+        self._write(plates + _padding)
+        hotlist = Hotlist(self.file_path)
+        hotlist.load()
+
+        return hotlist
+
+    def test_keys_unique(self) -> None:
+        keys = Hotlist._keys('AAB123')
+
+        self.assertEqual(len(keys), len(set(keys)))
+        self.assertEqual(keys[0], Hotlist.canonical('AAB123'))
+
+    def test_remove_repeated_characters(self) -> None:
+        hotlist = self._reloaded(['AAB123', 'XAB123'], ['XAB123'])
+
+        self.assertEqual(hotlist.match('YAB123')[0], 'XAB123')
+        self.assertIsNone(hotlist.match('AAB123X'))
+        self.assertEqual(hotlist._index.variants, self._fresh(['XAB123'])._index.variants)
+
+    def test_remove_repeated_characters_shared_variants(self) -> None:
+        # Deleting any of the A's of AAAB12 gives a variant of XAAB12 too
+        hotlist = self._reloaded(['AAAB12', 'XAAB12'], ['XAAB12'])
+
+        self.assertEqual(hotlist.match('YAAB12')[0], 'XAAB12')
+        self.assertEqual(hotlist._index.variants, self._fresh(['XAAB12'])._index.variants)
+
+    def test_no_empty_entries(self) -> None:
+        hotlist = self._reloaded(['AAB123', 'AB1234'], ['PAD999'])
+
+        self.assertNotIn((), hotlist._index.variants.values())
+        self.assertEqual(hotlist._index.variants, self._fresh(['PAD999'])._index.variants)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Description
+--
+Tests of the metrics of the workers.
+
+Run from the repository root:
+
+>>> python -m pytest tests
+"""
+
+# System imports
+import unittest
+
+# Local imports
+from workers import metrics
+from workers.worker import Worker
+
+
+class _CollectedMetrics(metrics.WorkerMetrics):
+    """
+    Metrics of a worker collected right after it's first resolved.
+    """
+
+    @property
+    def worker(self):
+        worker, self._worker = self._worker(), lambda: None
+
+        return worker
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.worker = Worker()
+        self.collected = Worker()
+        self.metrics = [metrics.WorkerMetrics(self.worker, 'Worker'), _CollectedMetrics(self.collected, 'Collected')]
+        metrics._registry.extend(self.metrics)
+
+    def tearDown(self) -> None:
+        for m in self.metrics:
+            metrics._registry.remove(m)
+
+    def test_render(self) -> None:
+        self.worker.jobs_dropped = 3
+
+        rendered = metrics.render()
+
+        self.assertIn('anpr_jobs_dropped_total{worker="Worker"} 3', rendered)
+        self.assertIn('anpr_queue_depth{worker="Collected"} 0', rendered)
+
+    def test_summary(self) -> None:
+        self.assertEqual(len(metrics.summary()), 2)
+
+    def test_snapshot(self) -> None:
+        self.assertEqual(set(metrics.snapshot()), {'Worker', 'Collected'})
+
+
+if __name__ == '__main__':
+    unittest.main()
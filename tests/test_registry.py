@@ -0,0 +1,167 @@
+"""
+Description
+--
+Tests of the registry client, and of the plate lookup through it, against
+a stub registry on localhost.
+
+Run from the repository root:
+
+>>> python -m pytest tests
+"""
+
+# System imports
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import queue
+import threading
+import unittest
+
+# Local imports
+from workers.platelookup import PlateLookup
+from workers.registry import RegistryLookup
+from workers.worker import Worker
+
+
+class _StubRegistry(BaseHTTPRequestHandler):
+    """
+    Knows the plates starting with 'K'. Records the plates of every
+    request and the client port it came from (one per connection).
+    """
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def do_POST(self) -> None:
+        plates = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['plates']
+
+        server = self.server
+        with server.lock:
+            server.requests.append((self.client_address[1], plates))
+
+        body = json.dumps({p: {'Plate': p} if p.startswith('K') else None for p in plates}).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        if server.drop_connections:
+            # As a server timing idle connections out, with no notice
+            self.close_connection = True
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def _serve() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubRegistry)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    server.drop_connections = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+class _Subscriber(Worker):
+    def __init__(self) -> None:
+        super().__init__()
+        self.received = queue.Queue()
+
+    def _process_input_job(self, input_job):
+        self.received.put(input_job)
+
+
+class RegistryLookupTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = _serve()
+
+        self.registry = RegistryLookup('http://127.0.0.1:{}/plates'.format(self.server.server_address[1]), batch_window_s=0.05)
+        self.registry.start()
+
+    def tearDown(self) -> None:
+        self.registry.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _lookup(self, plates):
+        return [f.result(5) for f in [self.registry.lookup(p) for p in plates]]
+
+    def test_lookup(self) -> None:
+        self.assertEqual(self._lookup(['KAB123', 'XYZ789']), [{'Plate': 'KAB123'}, None])
+
+    def test_coalescing(self) -> None:
+        infos = self._lookup(['KAB123'] * 10)
+
+        self.assertEqual(infos, [{'Plate': 'KAB123'}] * 10)
+        self.assertEqual([plates for _, plates in self.server.requests], [['KAB123']])
+
+    def test_batching(self) -> None:
+        self.registry.batch_size = 4
+        plates = ['K{:05d}'.format(i) for i in range(10)]
+
+        infos = self._lookup(plates)
+
+        self.assertEqual(infos, [{'Plate': p} for p in plates])
+        self.assertEqual([len(p) for _, p in self.server.requests], [4, 4, 2])
+        self.assertEqual(sorted(sum((p for _, p in self.server.requests), [])), plates)
+
+    def test_keep_alive(self) -> None:
+        self._lookup(['KAB123'])
+        self._lookup(['KAB124'])
+
+        ports = [port for port, _ in self.server.requests]
+        self.assertEqual(len(ports), 2)
+        self.assertEqual(ports[0], ports[1])
+
+    def test_retry_stale_connection(self) -> None:
+        self.server.drop_connections = True
+
+        # The second request is tried on the connection the server closed,
+        # then on a new one
+        self.assertEqual(self._lookup(['KAB123']), [{'Plate': 'KAB123'}])
+        self.assertEqual(self._lookup(['KAB124']), [{'Plate': 'KAB124'}])
+
+        ports = [port for port, _ in self.server.requests]
+        self.assertEqual(len(ports), 2)
+        self.assertNotEqual(ports[0], ports[1])
+
+
+class PlateLookupTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = _serve()
+
+        self.subscriber = _Subscriber()
+        self.plate_lookup = PlateLookup(registry_url='http://127.0.0.1:{}/plates'.format(self.server.server_address[1]))
+        self.plate_lookup.link_to(self.subscriber, PlateLookup.channel_plate_info)
+        self.subscriber.start()
+        self.plate_lookup.start()
+
+    def tearDown(self) -> None:
+        for worker in (self.plate_lookup, self.subscriber):
+            worker.stop()
+            worker.join(5)
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _looked_up(self, job):
+        self.plate_lookup.receive(job)
+
+        return self.subscriber.received.get(timeout=5)
+
+    def test_list_job(self) -> None:
+        # From the registry, then from the cache - a list either way
+        self.assertEqual(self._looked_up(['KAB123']), [{'Plate': 'KAB123'}])
+        self.assertEqual(self._looked_up(['KAB123']), [{'Plate': 'KAB123'}])
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_plate_job(self) -> None:
+        self.assertEqual(self._looked_up('KAB123'), {'Plate': 'KAB123'})
+        self.assertEqual(self._looked_up('KAB123'), {'Plate': 'KAB123'})
+        self.assertEqual(len(self.server.requests), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
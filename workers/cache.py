@@ -0,0 +1,350 @@
+"""
+Description
+--
+Caches for looked up data.
+"""
+
+# System imports
+from collections import OrderedDict
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Tuple
+
+
+class TtlCache:
+    """
+    A size-bounded, least recently used cache, whose entries expire.
+    None values are cached too (negative caching), for a shorter time.
+    """
+
+    def __init__(self, size: int = 10000, ttl_s: float = 3600, negative_ttl_s: float = 300) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - size - the maximum number of entries.
+        - ttl_s - for how long an entry is valid.
+        - negative_ttl_s - for how long a None entry is valid.
+        """
+
+        if size < 1:
+            raise ValueError("size must be positive")
+
+        self.size = size
+        self.ttl_s = ttl_s
+        self.negative_ttl_s = negative_ttl_s
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()  # type: OrderedDict[Any, Tuple[float, Any]]
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Tuple[bool, Any]:
+        """
+        Description
+        --
+        Gets an entry.
+
+        Parameters
+        --
+        - key - the key of the entry.
+
+        Returns
+        --
+        Tuple of whether the entry was found and its value.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                expires_at, value = entry
+
+                if expires_at > time.monotonic():
+                    # Most recently used last
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+
+                    return (True, value)
+
+                del self._entries[key]
+
+            self.misses += 1
+
+            return (False, None)
+
+    def put(self, key: Any, value: Any, max_ttl_s: float = None) -> None:
+        """
+        Description
+        --
+        Puts an entry, the least recently used one is let go if the
+        cache is full.
+
+        Parameters
+        --
+        - key - the key of the entry.
+        - value - the value, None for negative caching.
+        - max_ttl_s - for how long the entry is valid at most, e.g. the
+        time it has left in another cache. None for `ttl_s` (or
+        `negative_ttl_s`).
+        """
+
+        ttl_s = self.negative_ttl_s if value is None else self.ttl_s
+        if max_ttl_s is not None:
+            ttl_s = min(ttl_s, max_ttl_s)
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_s, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteCache:
+    """
+    A persistent cache in an SQLite file, shared across restarts and by
+    the processes of the host. Same semantics as `TtlCache` - bounded
+    size with least recently used eviction, expiring entries and
+    negative caching. Values have to be JSON-serializable.
+    """
+
+    def __init__(self, file_path: str, size: int = 1000000, ttl_s: float = 7 * 24 * 3600, negative_ttl_s: float = 3600) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - file_path - the SQLite file.
+        - size - the maximum number of entries.
+        - ttl_s - for how long an entry is valid.
+        - negative_ttl_s - for how long a None entry is valid.
+        """
+
+        if not file_path:
+            raise ValueError("file_path is required")
+
+        if size < 1:
+            raise ValueError("size must be positive")
+
+        self.file_path = file_path
+        self.size = size
+        self.ttl_s = ttl_s
+        self.negative_ttl_s = negative_ttl_s
+
+        # How often (in puts) the size is checked
+        self.evict_every = 100
+
+        # Recently used entries are not marked as used again for that long,
+        # to spare writes
+        self.touch_after_s = 60
+
+        self.hits = 0
+        self.misses = 0
+
+        self._local = threading.local()  # A connection per thread
+        self._connections = []  # All of them, to close
+        self._lock = threading.Lock()
+        self._puts = 0
+
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT, expires_at REAL, used_at REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+            # Closed by whichever thread closes the cache
+            connection = sqlite3.connect(self.file_path, timeout=5, check_same_thread=False)
+
+            # Readers don't block the writer, and the other way around
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+
+            with self._lock:
+                self._connections.append(connection)
+
+        return connection
+
+    def get(self, key: Any) -> Tuple[bool, Any]:
+        """
+        Description
+        --
+        Gets an entry.
+
+        Parameters
+        --
+        - key - the key of the entry.
+
+        Returns
+        --
+        Tuple of whether the entry was found and its value.
+        """
+
+        cached, value, _ = self.get_with_ttl(key)
+
+        return (cached, value)
+
+    def get_with_ttl(self, key: Any) -> Tuple[bool, Any, float]:
+        """
+        Description
+        --
+        Gets an entry, with the time it has left.
+
+        Parameters
+        --
+        - key - the key of the entry.
+
+        Returns
+        --
+        Tuple of whether the entry was found, its value and for how long
+        it's still valid, in seconds.
+        """
+
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute("SELECT value, expires_at, used_at FROM entries WHERE key = ?", (str(key),)).fetchone()
+
+        if row is None or row[1] <= now:
+            if row is not None:
+                with connection:
+                    connection.execute("DELETE FROM entries WHERE key = ? AND expires_at <= ?", (str(key), now))
+
+            self.misses += 1
+
+            return (False, None, 0)
+
+        if now - row[2] > self.touch_after_s:
+            with connection:
+                connection.execute("UPDATE entries SET used_at = ? WHERE key = ?", (now, str(key)))
+
+        self.hits += 1
+
+        return (True, json.loads(row[0]), row[1] - now)
+
+    def put(self, key: Any, value: Any) -> None:
+        """
+        Description
+        --
+        Puts an entry, the least recently used ones are let go if the
+        cache is full.
+
+        Parameters
+        --
+        - key - the key of the entry.
+        - value - the value, None for negative caching.
+        """
+
+        now = time.time()
+        ttl_s = self.negative_ttl_s if value is None else self.ttl_s
+        connection = self._connection()
+
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                (str(key), json.dumps(value), now + ttl_s, now))
+
+        self._puts += 1
+
+        if self._puts % self.evict_every == 0:
+            self._evict()
+
+    def _evict(self) -> None:
+        connection = self._connection()
+
+        with connection:
+            connection.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+
+            excess = len(self) - self.size
+            if excess > 0:
+                connection.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY used_at LIMIT ?)",
+                    (excess,))
+
+    def close(self) -> None:
+        """
+        Description
+        --
+        Closes the connections. The cache can still be used, new
+        connections are opened then.
+        """
+
+        with self._lock:
+            connections, self._connections = self._connections, []
+
+        for connection in connections:
+            connection.close()
+
+        self._local = threading.local()
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class TieredCache:
+    """
+    A fast cache in front of a slower, larger one (e.g. in memory in
+    front of on disk).
+    """
+
+    def __init__(self, fast: Any, slow: Any) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - fast - the cache looked in first, e.g. `TtlCache`.
+        - slow - the cache looked in on a miss, e.g. `SqliteCache`. Its
+        entries are promoted to the fast cache for no longer than they
+        have left.
+        """
+
+        self.fast = fast
+        self.slow = slow
+
+    @property
+    def hits(self) -> int:
+        return self.fast.hits + self.slow.hits
+
+    @property
+    def misses(self) -> int:
+        return self.slow.misses
+
+    def get(self, key: Any) -> Tuple[bool, Any]:
+        cached, value = self.fast.get(key)
+
+        if not cached:
+            cached, value, ttl_s = self.slow.get_with_ttl(key)
+
+            if cached:
+                # Promoted, for no longer than it has left
+                self.fast.put(key, value, max_ttl_s=ttl_s)
+
+        return (cached, value)
+
+    def put(self, key: Any, value: Any) -> None:
+        self.fast.put(key, value)
+        self.slow.put(key, value)
+
+    def close(self) -> None:
+        self.slow.close()
+
+    def __len__(self) -> int:
+        return len(self.slow)
@@ -5,19 +5,34 @@ Finds objects on the frame.
 """
 
 # System imports
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Tuple
 
 # 3rd party imports
 import cv2
+import numpy as np
 from numpy import ndarray
 
 # Local imports
+from .geometry import nms
 from .worker import Worker
 
 
+# Detections in a batch of frames
+detection_dtype = np.dtype([
+    ('frame', np.int32),    # Index of the frame in the batch
+    ('x', np.int32),
+    ('y', np.int32),
+    ('w', np.int32),
+    ('h', np.int32),
+    ('score', np.float32)])  # Confidence, the weight of the last stage of the cascade
+
+
 class ObjectFinder(Worker):
     channel_object_crop = 'channel_object_crop'
     channel_object_rectangle = 'channel_object_rectangle'
+    channel_detections = 'channel_detections'
+    channel_object_crops = 'channel_object_crops'
+    channel_object_rectangles = 'channel_object_rectangles'
 
     def __init__(self, cascade_file: str, jobs_limit=0) -> None:
         """
@@ -42,13 +57,64 @@ class ObjectFinder(Worker):
         self.scale = 1.25               # 1.05 to 1.4
         self.min_neighbors = 5          # 3 to 6
 
+        # Detections scoring less are dropped, None to keep all. Around 1.6
+        # for a sure detection with the plates cascade, 0.3 for a doubtful one.
+        self.min_score = None
+
+        # Detections overlapping more are of the same object, the highest
+        # scoring one is kept
+        self.nms_threshold = 0.3
+
         # A crop ratio of 1/4 (0.25) means the image is split in 4 and the
         # upper and bottom 1/4 parts are cropped out. 0 for no-cropping
         self.y_crop_ratio = 0
 
+        # The cascade runs on a downscaled copy of the frame, e.g. 0.5 for half
+        # the width and height - 4x cheaper. Detections are in frame
+        # coordinates, crops are cut from the full resolution frame. 1 for
+        # the full resolution.
+        self.downscale = 1
+
+        # Adaptive regions of interest, for fixed cameras. A heatmap of where
+        # objects were found is learnt, and frames are only scanned in its
+        # hot regions - fully every N frames, or after as many scans of the
+        # hot regions in a row found nothing. 0 to always scan fully.
+        self.full_scan_every = 0
+        self.full_scan_after_misses = 15
+        self.heatmap_cell = 32          # Heatmap resolution, in pixels
+        self.heatmap_decay = 0.999      # Heat kept per frame - a half-life of ~700 frames
+        self.hot_heat = 0.5             # Heat of a hot cell. An object adds 1 to the cells it covers
+        self.hot_margin_cells = 2       # Margin around the hot cells, in cells
+
+        # Scans done
+        self.full_scans = 0
+        self.region_scans = 0
+
+        self._heat = None  # type: ndarray
+        self._scans_count = 0
+        self._misses = 0
+
+        # Reusable grayscale buffers, and levels of the image pyramid, by shape
+        self._gray_buffers = {}  # type: Dict[tuple, ndarray]
+        self._level_buffers = {}  # type: Dict[tuple, ndarray]
+
         # Load the classifier
+        self._cascade_file = cascade_file
         self._watch_cascade = cv2.CascadeClassifier(cascade_file)
 
+    def __getstate__(self) -> Dict[str, Any]:
+        # The classifier can't be pickled, it is re-loaded from the file
+        state = super().__getstate__()
+        state.pop('_watch_cascade', None)
+        state['_gray_buffers'] = {}
+        state['_level_buffers'] = {}
+
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        super().__setstate__(state)
+        self._watch_cascade = cv2.CascadeClassifier(self._cascade_file)
+
     def _crop_image(self, image, rect):
         x, y, w, h = self._compute_safe_region(image.shape, rect)
 
@@ -75,48 +141,601 @@ class ObjectFinder(Worker):
 
         return [left, top, right - left, bottom - top]
 
-    def _get_object_crop(self, original_image: ndarray) -> Tuple[ndarray, ndarray]:
-        orig_y, orig_x, _ = original_image.shape
+    def _gray(self, image: ndarray, gray: ndarray = None) -> ndarray:
+        """
+        Description
+        --
+        Converts the image to grayscale, into `gray` if given, otherwise
+        into a reusable buffer.
+        """
+
+        if gray is None:
+            shape = image.shape[:2]
+            gray = self._gray_buffers.get(shape)
+
+            if gray is None:
+                gray = self._gray_buffers[shape] = np.empty(shape, dtype=np.uint8)
+
+        if image.ndim == 2:
+            np.copyto(gray, image)
+        else:
+            cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray)
+
+        return gray
+
+    @staticmethod
+    def _stride(height: int) -> int:
+        # Images stacked in one start on even rows, as OpenCV scans every
+        # other row below the scale 2 - every image is scanned at the same rows
+        return height + height % 2
+
+    def _level(self, gray: ndarray, count: int, height: int, factor: np.float32) -> Tuple[ndarray, int, int]:
+        """
+        Description
+        --
+        Scales every image stacked in `gray` on its own, into a reusable
+        buffer, as OpenCV scales a level of its pyramid.
+
+        Returns
+        --
+        Tuple of the stacked scaled images, their height and the rows from
+        one to the next.
+        """
+
+        width = gray.shape[1]
+        level_w = int(np.rint(np.float32(width) / factor))
+        level_h = int(np.rint(np.float32(height) / factor))
+        stride = self._stride(height) if count > 1 else height
+
+        if factor == 1:
+            return (gray, height, stride)
+
+        level_stride = self._stride(level_h) if count > 1 else level_h
+        shape = (count * level_stride, level_w)
+        level = self._level_buffers.get(shape)
+        if level is None:
+            level = self._level_buffers[shape] = np.empty(shape, dtype=np.uint8)
+
+        for i in range(count):
+            cv2.resize(gray[i * stride: i * stride + height], (level_w, level_h), dst=level[i * level_stride: i * level_stride + level_h],
+                       interpolation=cv2.INTER_LINEAR_EXACT)
+
+        return (level, level_h, level_stride)
+
+    def _group(self, images: ndarray, rectangles: ndarray, scores: ndarray) -> Tuple[ndarray, ndarray, ndarray]:
+        """
+        Description
+        --
+        Groups the candidate detections of each image, as
+        `cv2.groupRectangles` does with `min_neighbors` - similar
+        rectangles are averaged, groups of `min_neighbors` rectangles or
+        less are dropped, and so are groups within a larger one. A group
+        scores as its best rectangle.
+        """
+
+        eps = 0.2
+        grouped = ([], [], [])
+
+        for image in np.unique(images):
+            r = rectangles[images == image]
+            s = scores[images == image]
+            x, y, w, h = r[:, 0], r[:, 1], r[:, 2], r[:, 3]
+
+            # Similar rectangles, then the groups of them
+            delta = eps * (np.minimum.outer(w, w) + np.minimum.outer(h, h)) * 0.5
+            similar = \
+                (np.abs(np.subtract.outer(x, x)) <= delta) & \
+                (np.abs(np.subtract.outer(y, y)) <= delta) & \
+                (np.abs(np.subtract.outer(x + w, x + w)) <= delta) & \
+                (np.abs(np.subtract.outer(y + h, y + h)) <= delta)
+
+            labels = np.arange(len(r))
+            while True:
+                new_labels = np.where(similar, labels, len(r)).min(axis=1)
+                new_labels = new_labels[new_labels]
+                if np.array_equal(new_labels, labels):
+                    break
+                labels = new_labels
+
+            _, labels = np.unique(labels, return_inverse=True)
+            counts = np.bincount(labels)
+            sums = np.zeros((len(counts), 4), dtype=np.int64)
+            np.add.at(sums, labels, r)
+            group_r = np.rint(sums.astype(np.float32) * (np.float32(1) / counts.astype(np.float32))[:, None]).astype(np.int32)
+            group_s = np.full(len(counts), -np.inf, dtype=np.float32)
+            np.maximum.at(group_s, labels, s)
+
+            enough = counts > self.min_neighbors
+            group_r, group_s, counts = group_r[enough], group_s[enough], counts[enough]
+
+            # Groups within a larger one, of more rectangles
+            gx, gy, gw, gh = group_r[:, 0], group_r[:, 1], group_r[:, 2], group_r[:, 3]
+            dx = np.rint(gw * eps).astype(np.int32)
+            dy = np.rint(gh * eps).astype(np.int32)
+            within = \
+                (gx[:, None] >= gx - dx) & (gy[:, None] >= gy - dy) & \
+                (gx[:, None] + gw[:, None] <= gx + gw + dx) & (gy[:, None] + gh[:, None] <= gy + gh + dy) & \
+                ((counts > np.maximum(3, counts[:, None])) | (counts[:, None] < 3))
+            np.fill_diagonal(within, False)
+            kept = ~within.any(axis=1)
+
+            grouped[0].append(np.full(np.count_nonzero(kept), image))
+            grouped[1].append(group_r[kept])
+            grouped[2].append(group_s[kept])
+
+        if not grouped[0]:
+            return (images, rectangles, scores)
+
+        return tuple(np.concatenate(g) for g in grouped)
+
+    def _detect(self, gray: ndarray, height: int = None, max_size: Tuple[int, int] = None, ratio: float = 1) -> Tuple[ndarray, ndarray, ndarray]:
+        """
+        Description
+        --
+        Runs the cascade on a grayscale image, or on images of the same size
+        stacked in it, with one image pyramid for all of them. Objects
+        larger than `max_size` (or `max_object_size`, if smaller) are not
+        searched for.
+
+        The pyramid is built as OpenCV builds it, but every image is scaled
+        on its own and every level of all the images is scanned at once.
+        Windows spanning two images are dropped, and candidates are grouped
+        image by image. Scaling the stacked images as a whole would sample
+        each one differently, depending on its place in the stack. So an
+        image gets the same detections, whichever images it's stacked with.
+
+        Parameters
+        --
+        - gray - the grayscale image, or the images stacked on even rows
+        (see `_stride`).
+        - height - the height of the stacked images, None for one image.
+        - max_size - the maximum object size, in image coordinates.
+        - ratio - the scale of the image to the frame, which
+        `min_object_size` and `max_object_size` are of.
+
+        Returns
+        --
+        Tuple of N indices of the images the objects are in, Nx4 array of
+        X, Y, W, H rectangles, in image coordinates, and N scores (see
+        `min_score`).
+        """
+
+        count = gray.shape[0] // self._stride(height) if height else 1
+        height = height or gray.shape[0]
+        width = gray.shape[1]
+        window = self._watch_cascade.getOriginalWindowSize()
+        min_size = self._scaled_size(self.min_object_size, ratio)
+        max_size = self._max_size(max_size, ratio) or (width, height)
+
+        found = []
+        factor = 1.
+
+        while True:
+            # OpenCV scales by floats
+            level_factor = np.float32(factor)
+            size = (int(round(window[0] * factor)), int(round(window[1] * factor)))
+            factor *= self.scale
+
+            if size[0] > min(max_size[0], width) or size[1] > min(max_size[1], height):
+                break
+
+            if min_size and (size[0] < min_size[0] or size[1] < min_size[1]):
+                continue
+
+            level, level_h, stride = self._level(gray, count, height, level_factor)
+            window_w, window_h = (int(np.rint(np.float32(w) * level_factor)) for w in window)
+
+            # See https://stackoverflow.com/a/20805153/253266
+            # The candidates of this level, with their scores. OpenCV scans
+            # every pixel from the scale 2 on, every other pixel below.
+            for dx, dy in ((0, 0), (1, 0), (0, 1), (1, 1)) if level_factor >= 2 else ((0, 0),):
+                candidates, _, weights = self._watch_cascade.detectMultiScale3(
+                    level[dy:, dx:],
+                    2,
+                    0,
+                    minSize=window,
+                    maxSize=window,
+                    outputRejectLevels=True)
+
+                if len(candidates) == 0:
+                    continue
+
+                candidates = np.asarray(candidates, dtype=np.int32).reshape(-1, 4)
+                x, y = candidates[:, 0] + dx, candidates[:, 1] + dy
+                images = y // stride
+                y -= images * stride
+                within = (y + window[1] <= level_h) & (images < count)
+
+                rectangles = np.empty((np.count_nonzero(within), 4), dtype=np.int32)
+                rectangles[:, 0] = np.rint(x[within] * level_factor)
+                rectangles[:, 1] = np.rint(y[within] * level_factor)
+                rectangles[:, 2:] = (window_w, window_h)
+                found.append((images[within], rectangles, np.asarray(weights, dtype=np.float32).reshape(-1)[within]))
+
+        if not found:
+            return (np.empty(0, dtype=np.int64), np.empty((0, 4), dtype=np.int32), np.empty(0, dtype=np.float32))
+
+        images, rectangles, scores = (np.concatenate(f) for f in zip(*found))
+
+        # In a set order, OpenCV scans in parallel
+        order = np.lexsort((rectangles[:, 3], rectangles[:, 2], rectangles[:, 1], rectangles[:, 0], images))
+        images, rectangles, scores = images[order], rectangles[order], scores[order]
+
+        if self.min_neighbors > 0:
+            images, rectangles, scores = self._group(images, rectangles, scores)
+
+        if self.min_score is not None:
+            sure = scores >= self.min_score
+            images, rectangles, scores = images[sure], rectangles[sure], scores[sure]
+
+        return (images, rectangles, scores)
+
+    @staticmethod
+    def _scaled_size(size: Tuple[int, int], ratio: float) -> Tuple[int, int]:
+        if not size or ratio == 1:
+            return size
+
+        return (max(1, int(round(size[0] * ratio))), max(1, int(round(size[1] * ratio))))
+
+    def _max_size(self, max_size: Tuple[int, int], ratio: float = 1) -> Tuple[int, int]:
+        max_object_size = self._scaled_size(self.max_object_size, ratio)
+
+        if not max_size:
+            return max_object_size
+
+        if not max_object_size:
+            return max_size
+
+        return (min(max_size[0], max_object_size[0]), min(max_size[1], max_object_size[1]))
+
+    def _downscaled_shape(self, height: int, width: int) -> Tuple[int, int]:
+        """
+        Description
+        --
+        The height and width an image is detected at, see `downscale`.
+        """
+
+        if self.downscale == 1:
+            return (height, width)
+
+        return (max(1, int(height * self.downscale)), max(1, int(width * self.downscale)))
+
+    @staticmethod
+    def _upscaled(rectangles: ndarray, fx: float, fy: float) -> ndarray:
+        """
+        Description
+        --
+        Maps rectangles detected on a downscaled image back to the image.
+        """
+
+        if fx == 1 and fy == 1:
+            return rectangles
+
+        return np.rint(rectangles * np.array([fx, fy, fx, fy])).astype(np.int32)
+
+    def detect_batch(self, frames: List[ndarray]) -> ndarray:
+        """
+        Description
+        --
+        Finds objects in several frames at once (e.g. queued frames, or
+        frames of several cameras). Frames of the same size are converted to
+        grayscale into one stacked image, and share one image pyramid (see
+        `_detect`). A frame gets the same detections, whichever frames it's
+        batched with. Downscaled first, see `downscale`.
+
+        Parameters
+        --
+        - frames - the frames.
+
+        Returns
+        --
+        Structured array (see `detection_dtype`) of the detections in all
+        frames, in frame coordinates.
+        """
+
+        # Group the frames by the size of the band we're interested in
+        groups = {}  # type: Dict[tuple, List[int]]
+        for i, frame in enumerate(frames):
+            orig_y = frame.shape[0]
+            y_padding = int(orig_y * self.y_crop_ratio)
+            groups.setdefault((orig_y - 2 * y_padding, frame.shape[1], y_padding), []).append(i)
+
+        batch = []
+
+        for (band_h, band_w, y_padding), indices in groups.items():
+            if band_h <= 0 or band_w <= 0:
+                continue
+
+            # Stack the grayscale (downscaled) bands of the frames on top of
+            # each other
+            tile_h, tile_w = self._downscaled_shape(band_h, band_w)
+            stride = self._stride(tile_h)
+            shape = (stride * len(indices), tile_w)
+            gray = self._gray_buffers.get(shape)
+            if gray is None:
+                gray = self._gray_buffers[shape] = np.empty(shape, dtype=np.uint8)
+
+            for tile, i in enumerate(indices):
+                band = frames[i][y_padding: y_padding + band_h]
+                tile_gray = gray[tile * stride: tile * stride + tile_h]
+
+                if (tile_h, tile_w) == (band_h, band_w):
+                    self._gray(band, tile_gray)
+                else:
+                    cv2.resize(self._gray(band), (tile_w, tile_h), dst=tile_gray, interpolation=cv2.INTER_AREA)
+
+            # Map the detections back to their frames
+            tiles, rectangles, scores = self._detect(gray, tile_h, ratio=tile_w / band_w)
+            rectangles = self._upscaled(rectangles, band_w / tile_w, band_h / tile_h)
+
+            detections = np.empty(len(rectangles), dtype=detection_dtype)
+            detections['frame'] = np.asarray(indices, dtype=np.int32)[tiles]
+            detections['x'] = rectangles[:, 0]
+            detections['y'] = rectangles[:, 1] + y_padding
+            detections['w'] = rectangles[:, 2]
+            detections['h'] = rectangles[:, 3]
+            detections['score'] = scores
+            batch.append(detections)
+
+        if not batch:
+            return np.empty(0, dtype=detection_dtype)
+
+        batch = np.concatenate(batch)
+
+        return batch[np.argsort(batch['frame'], kind='stable')]
+
+    def detect_regions(self, frame: ndarray, regions: ndarray) -> ndarray:
+        """
+        Description
+        --
+        Finds objects only within regions of the frame (e.g. where there
+        is motion).
+
+        Parameters
+        --
+        - frame - the frame.
+        - regions - Nx4 array of X, Y, W, H regions, in frame coordinates.
+
+        Returns
+        --
+        Structured array (see `detection_dtype`) of the detections, in
+        frame coordinates.
+        """
 
-        # Crop the image to particular area we're interested in
+        orig_y, orig_x = frame.shape[:2]
         y_padding = int(orig_y * self.y_crop_ratio)
-        cropped_image = original_image[y_padding: orig_y - y_padding, 0: orig_x]
 
-        # See https://stackoverflow.com/a/20805153/253266
-        detections = self._watch_cascade.detectMultiScale(
-            cropped_image,
-            self.scale,
-            self.min_neighbors,
-            minSize=self.min_object_size,
-            maxSize=self.max_object_size)
+        # Converted once, the regions are views
+        gray = self._gray(frame)
+        batch = []
 
-        if detections is None or len(detections) == 0:
+        for x, y, w, h in np.asarray(regions, dtype=np.int64).reshape(-1, 4):
+            # Clip to the band we're interested in
+            x1, y1 = max(x, 0), max(y, y_padding)
+            x2, y2 = min(x + w, orig_x), min(y + h, orig_y - y_padding)
+
+            if x2 <= x1 or y2 <= y1:
+                continue
+
+            region = gray[y1:y2, x1:x2]
+            region_h, region_w = self._downscaled_shape(y2 - y1, x2 - x1)
+
+            if (region_h, region_w) != region.shape:
+                region = cv2.resize(region, (region_w, region_h), interpolation=cv2.INTER_AREA)
+
+            _, rectangles, scores = self._detect(region, ratio=region_w / (x2 - x1))
+            rectangles = self._upscaled(rectangles, (x2 - x1) / region_w, (y2 - y1) / region_h)
+
+            detections = np.zeros(len(rectangles), dtype=detection_dtype)
+            detections['x'] = rectangles[:, 0] + x1
+            detections['y'] = rectangles[:, 1] + y1
+            detections['w'] = rectangles[:, 2]
+            detections['h'] = rectangles[:, 3]
+            detections['score'] = scores
+            batch.append(detections)
+
+        if not batch:
+            return np.empty(0, dtype=detection_dtype)
+
+        return np.concatenate(batch)
+
+    def _scan_regions(self, shape: tuple) -> ndarray:
+        """
+        Description
+        --
+        The regions of a frame to scan, see `full_scan_every`.
+
+        Parameters
+        --
+        - shape - the shape of the frame.
+
+        Returns
+        --
+        Nx4 array of X, Y, W, H regions. None to scan the full frame.
+        """
+
+        cells = (-(-shape[0] // self.heatmap_cell), -(-shape[1] // self.heatmap_cell))
+
+        if self._heat is None or self._heat.shape != cells:
+            # A new resolution, nothing is known
+            self._heat = np.zeros(cells, dtype=np.float32)
+            self._scans_count = 0
+            self._misses = 0
+
+        self._heat *= self.heatmap_decay
+        self._scans_count += 1
+
+        # The first scan is full
+        if (self._scans_count - 1) % self.full_scan_every == 0 or self._misses >= self.full_scan_after_misses:
+            return None
+
+        hot = (self._heat >= self.hot_heat).astype(np.uint8)
+
+        if not hot.any():
+            return None
+
+        if self.hot_margin_cells:
+            hot = cv2.dilate(hot, np.ones((2 * self.hot_margin_cells + 1,) * 2, dtype=np.uint8))
+
+        # One region per group of hot cells
+        _, _, stats, _ = cv2.connectedComponentsWithStats(hot, connectivity=8)
+
+        return stats[1:, :4] * self.heatmap_cell
+
+    def _learn(self, detections: ndarray, full_scan: bool) -> None:
+        """
+        Description
+        --
+        Heats the cells of the heatmap the detections cover, and counts the
+        scans of the hot regions in a row which found nothing.
+        """
+
+        cell = self.heatmap_cell
+
+        for d in detections:
+            self._heat[d['y'] // cell: (d['y'] + d['h'] - 1) // cell + 1, d['x'] // cell: (d['x'] + d['w'] - 1) // cell + 1] += 1
+
+        if full_scan or len(detections):
+            self._misses = 0
+        else:
+            self._misses += 1
+
+    def _find(self, frame: ndarray) -> ndarray:
+        """
+        Description
+        --
+        Finds objects in a frame, fully or in its hot regions (see
+        `full_scan_every`).
+
+        Returns
+        --
+        Structured array (see `detection_dtype`) of the detections, in
+        frame coordinates.
+        """
+
+        if not self.full_scan_every:
+            return self.detect_batch([frame])
+
+        regions = self._scan_regions(frame.shape)
+
+        if regions is None:
+            self.full_scans += 1
+            detections = self.detect_batch([frame])
+        else:
+            self.region_scans += 1
+            detections = self.detect_regions(frame, regions)
+
+        self._learn(detections, regions is None)
+
+        return detections
+
+    def _get_object_crop(self, original_image: ndarray, detections: ndarray = None) -> Tuple[ndarray, ndarray]:
+        if detections is None:
+            detections = self.detect_batch([original_image])
+
+        if len(detections) == 0:
             # No detection
             return None
 
-        # Widest rectangle first
-        detection = sorted(detections, key=lambda d: d[2])[0]
+        # The widest rectangle
+        return self.crop(original_image, detections[np.argmax(detections['w'])])
 
-        (x, y, w, h) = detection
+    def suppress(self, detections: ndarray) -> ndarray:
+        """
+        Description
+        --
+        Keeps only the highest scoring of the overlapping detections of an
+        object, in each frame (see `nms_threshold`).
+
+        Parameters
+        --
+        - detections - structured array (see `detection_dtype`) of the
+        detections, e.g. of `detect_batch`.
+
+        Returns
+        --
+        The detections kept, by frame, most confident first.
+        """
+
+        kept = []
+
+        for frame in np.unique(detections['frame']):
+            frame_detections = detections[detections['frame'] == frame]
+            boxes = np.stack([frame_detections['x'], frame_detections['y'], frame_detections['w'], frame_detections['h']], axis=1)
+            kept.append(frame_detections[nms(boxes, frame_detections['score'], self.nms_threshold)])
+
+        return np.concatenate(kept) if kept else detections[:0]
+
+    def crop(self, original_image: ndarray, detection: Any) -> Tuple[ndarray, tuple]:
+        """
+        Description
+        --
+        Cuts a detected object out of the image.
+
+        Parameters
+        --
+        - original_image - the image the object was detected on.
+        - detection - the detection (see `detection_dtype`).
+
+        Returns
+        --
+        Tuple of the crop and the highlight (rectangle around the object).
+        """
+
+        (x, y, w, h) = (int(detection['x']), int(detection['y']), int(detection['w']), int(detection['h']))
 
         # Crop the object
-        cropped = self._crop_image(cropped_image, (int(x), int(y), int(w), int(h))).copy()
+        cropped = self._crop_image(original_image, (x, y, w, h)).copy()
 
         # Get the object highlight (rectangle around it)
         crop_rectangle = (
             (
-                int(x),
-                int(y) + y_padding
+                x,
+                y
             ),
             (
-                int((x + w)),
-                int((y + y_padding + h))
+                x + w,
+                y + h
             )
         )
 
         # Found
         return (cropped, crop_rectangle)
 
+    def _results(self, image: ndarray, detections: ndarray) -> Dict[str, Any]:
+        """
+        Description
+        --
+        Builds the results of an image, out of its detections. Of the
+        overlapping detections of an object, only the highest scoring one
+        is kept.
+        """
+
+        if len(detections) == 0:
+            return None
+
+        detections = self.suppress(detections)
+
+        objects = [self.crop(image, detection) for detection in detections]
+        object_crop, crop_rectangle = objects[np.argmax(detections['w'])]
+
+        return {
+            # Rectangle channel - the widest detected object rectangle X, Y, W, H
+            self.channel_object_rectangle: crop_rectangle,
+
+            # Crop channel - cropped image of the widest detected object
+            self.channel_object_crop: object_crop,
+
+            # Rectangles channel - all the detected object rectangles
+            self.channel_object_rectangles: [highlight for _, highlight in objects],
+
+            # Detections channel - all the detections in the image, most confident first
+            self.channel_detections: detections,
+
+            # Crops channel - list of rectangle and crop pairs, of all the detected objects
+            self.channel_object_crops: [(highlight, crop) for crop, highlight in objects]
+        }
+
     def _process_input_job(self, input_job: Any) -> Dict[str, Any]:
         """
         Description
@@ -126,7 +745,8 @@ class ObjectFinder(Worker):
         Parameters
         --
         - input_job - image in which to find the object the
-        classifier has been trained for.
+        classifier has been trained for. Or a tuple of an image and
+        the regions of it to search in.
 
         Returns
         --
@@ -134,16 +754,40 @@ class ObjectFinder(Worker):
         and rectangle. Otherwise None.
         """
 
+        if isinstance(input_job, tuple):
+            frame, regions = input_job
+            return self._results(frame, self.detect_regions(frame, regions))
+
         if input_job is not None:
-            result = self._get_object_crop(input_job)
+            return self._results(input_job, self._find(input_job))
+
+    def _process_input_batch(self, input_jobs: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Description
+        --
+        Finds objects in several images at once, see `detect_batch`.
+
+        Parameters
+        --
+        - input_jobs - images in which to find the object.
+
+        Returns
+        --
+        The results of each image.
+        """
+
+        if self.full_scan_every:
+            # Scheduled frame by frame, mostly in regions
+            return [self._process_input_job(job) for job in input_jobs]
 
-            if result:
-                object_crop, crop_rectangle = result
+        # Whole images are batched, images with regions are searched one by one
+        frames = [job for job in input_jobs if isinstance(job, ndarray)]
+        detections = self.detect_batch(frames)
 
-                return {
-                    # Rectangle channel - detected object rectangle X, Y, W, H
-                    self.channel_object_rectangle: crop_rectangle,
+        # Split the detections by frame
+        bounds = np.searchsorted(detections['frame'], np.arange(len(frames) + 1))
+        frame_results = iter([
+            self._results(frame, detections[bounds[i]: bounds[i + 1]])
+            for i, frame in enumerate(frames)])
 
-                    # Crop channel - cropped image of the detected object
-                    self.channel_object_crop: object_crop
-                }
+        return [next(frame_results) if isinstance(job, ndarray) else self._process_input_job(job) for job in input_jobs]
@@ -0,0 +1,230 @@
+"""
+Description
+--
+Combines the OCR reads of the same plate into a single, confident
+plate number.
+"""
+
+# System imports
+from collections import Counter
+import re
+import time
+from typing import Any, Dict, List
+
+# 3rd party imports
+import numpy as np
+
+# Local imports
+from .geometry import iou
+from .worker import Worker
+
+
+class PlateReads:
+    """
+    The OCR reads of one physical plate.
+    """
+
+    def __init__(self, key: Any, rectangle: tuple = None) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - key - the track ID of the plate, if tracked.
+        - rectangle - the last known rectangle around the plate, if not
+        tracked.
+        """
+
+        self.key = key
+        self.rectangle = rectangle
+        self.texts = []  # type: List[str]
+        self.last_seen = time.monotonic()
+        self.settled = False
+
+    def vote(self):
+        """
+        Description
+        --
+        Votes per character position, among the reads of the most common
+        length.
+
+        Returns
+        --
+        Tuple of the plate number and the confidence (0 - 1) in it.
+        """
+
+        if not self.texts:
+            return ("", 0)
+
+        length, length_votes = Counter(len(t) for t in self.texts).most_common(1)[0]
+        reads = np.array([list(t) for t in self.texts if len(t) == length]).reshape(-1, length)
+
+        plate = []
+        confidence = length_votes / len(self.texts)
+
+        for position in range(length):
+            character, votes = Counter(reads[:, position]).most_common(1)[0]
+            plate.append(character)
+            confidence = min(confidence, votes / len(reads))
+
+        return ("".join(plate), confidence)
+
+
+class PlateConsensus(Worker):
+    channel_plate = "channel_plate"
+    channel_settled = "channel_settled"
+
+    def __init__(self, jobs_limit=0) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - jobs_limit - (see base)
+        """
+
+        super().__init__(jobs_limit=jobs_limit)
+
+        # Reads needed before a plate number can be trusted
+        self.min_reads = 3
+
+        # Share of the reads which have to agree on every character (0 - 1)
+        self.min_confidence = 0.6
+
+        # Plates not read for that long are considered gone
+        self.window_s = 2.0
+
+        # Minimum overlap of the rectangles of untracked reads, to be
+        # considered the same plate
+        self.iou_threshold = 0.3
+
+        # Wake up regularly, to let the gone plates go
+        self._wait_for_job_s = 0.5
+
+        self._plates = {}  # type: Dict[Any, PlateReads]
+        self._next_key = 0
+
+    def _plate_reads(self, key: Any) -> PlateReads:
+        """
+        Description
+        --
+        Gets the reads of the plate a key belongs to - the track ID, or
+        the rectangle around the plate.
+        """
+
+        if not isinstance(key, tuple):
+            # Tracked plate
+            if key not in self._plates:
+                self._plates[key] = PlateReads(key)
+
+            return self._plates[key]
+
+        # Untracked, find the plate read recently at about the same place
+        (x1, y1), (x2, y2) = key
+        rectangle = (x1, y1, x2 - x1, y2 - y1)
+
+        candidates = [p for p in self._plates.values() if p.rectangle is not None]
+        if candidates:
+            overlaps = iou(np.array([rectangle]), np.array([p.rectangle for p in candidates]))[0]
+            best = int(np.argmax(overlaps))
+
+            if overlaps[best] >= self.iou_threshold:
+                candidates[best].rectangle = rectangle
+                return candidates[best]
+
+        self._next_key -= 1
+        plate = self._plates[self._next_key] = PlateReads(self._next_key, rectangle)
+
+        return plate
+
+    def _expire(self) -> List[str]:
+        """
+        Description
+        --
+        Lets the plates which are gone go.
+
+        Returns
+        --
+        The plate numbers of the gone plates, which had enough reads but
+        never settled.
+        """
+
+        now = time.monotonic()
+        plates = []
+
+        for key in [k for k, p in self._plates.items() if now - p.last_seen > self.window_s]:
+            reads = self._plates.pop(key)
+
+            if not reads.settled and len(reads.texts) >= self.min_reads:
+                # Our best guess
+                plates.append(reads.vote()[0])
+
+        return plates
+
+    def _process_input_job(self, input_job: Any) -> Dict[str, Any]:
+        """
+        Description
+        --
+        Votes on the reads of the plates.
+
+        Parameters
+        --
+        - input_job - list of key (track ID or rectangle) and text pairs.
+
+        Returns
+        --
+        The plate numbers, once the reads of a plate agree. The track IDs
+        of the settled plates, so they are not read anymore.
+        """
+
+        plates = self._expire()
+        settled = []
+
+        for key, text in input_job or []:
+            # Only the characters plates have
+            text = re.sub('[^0-9A-Z]', '', text.upper())
+            if not text:
+                continue
+
+            reads = self._plate_reads(key)
+            reads.last_seen = time.monotonic()
+
+            if reads.settled:
+                continue
+
+            reads.texts.append(text)
+
+            if len(reads.texts) >= self.min_reads:
+                plate, confidence = reads.vote()
+
+                if confidence >= self.min_confidence:
+                    self._logger.info("{} ({:.0%} of {} reads)".format(plate, confidence, len(reads.texts)))
+                    reads.settled = True
+                    plates.append(plate)
+
+                    if not isinstance(key, tuple):
+                        settled.append(key)
+
+        if not plates:
+            return
+
+        return {
+            # Plate channel - list of plate numbers, once per plate
+            self.channel_plate: plates,
+
+            # Settled channel - track IDs of the settled plates
+            self.channel_settled: settled or None
+        }
+
+    def _on_starting(self) -> None:
+        """
+        Description
+        --
+        Called before the main loop.
+        """
+
+        self._plates = {}
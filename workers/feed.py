@@ -5,17 +5,25 @@ Provides various frame sources (camera, video, random pictures)
 """
 
 # System imports
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Iterator, Tuple
+import http.client
 import os
-import urllib3
+import queue
+import socket
 import ssl
+import threading
+import time
+from urllib.parse import urlsplit
 
 # 3rd party imports
 import cv2
 import numpy as np
 
 # Local imports
-from .worker import Worker
+from logger import log
+from .job import untag
+from .ring import FrameRing, RingFrame
+from .worker import QueuePolicy, Worker
 
 
 class FrameProvider:
@@ -25,33 +33,294 @@ class FrameProvider:
     def get(self) -> Tuple[bool, Any]:
         return (False, None)
 
+    def get_into(self, frame: np.ndarray) -> Tuple[bool, Any]:
+        """
+        Description
+        --
+        Gets the next frame into a preallocated frame.
+
+        Parameters
+        --
+        - frame - where to put the frame.
+
+        Returns
+        --
+        Whether a frame was grabbed and the frame. It's a different
+        array, if the grabbed frame doesn't fit.
+        """
+
+        grabbed, image = self.get()
+
+        if grabbed and image.shape == frame.shape and image.dtype == frame.dtype:
+            np.copyto(frame, image)
+            return (True, frame)
+
+        return (grabbed, image)
+
+    def interrupt(self) -> None:
+        """
+        Description
+        --
+        Unblocks a `get` waiting for a frame, e.g. of a stream which is
+        reconnecting, so the feed can stop. Thread-safe.
+        """
+
+        pass
+
     def stop(self) -> None:
         pass
 
 
 class IPCameraFrameProvider(FrameProvider):
-    def __init__(self, url: str):
+    """
+    Streams the frames of an IP camera over one persistent HTTP(S)
+    connection - an MJPEG (multipart/x-mixed-replace) stream, or JPEG
+    snapshots requested one after another. JPEGs are received and decoded
+    on background threads, only the latest one is decoded. Reconnects,
+    with backoff, when the connection fails.
+    """
+
+    def __init__(self, url: str, verify_ssl: bool = False, timeout_s: float = 10) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - url - The URL of the stream (or of a snapshot).
+        - verify_ssl - Whether to verify the certificate of the camera.
+        Usually self-signed.
+        - timeout_s - The connection and read timeout.
+        """
+
         if not url:
             raise ValueError("url is required")
 
-        self._url = url
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError("Unsupported URL {}".format(url))
+
+        self._url = parts
+        self._ssl_context = None
+
+        if parts.scheme == 'https':
+            self._ssl_context = ssl.create_default_context()
+
+            if not verify_ssl:
+                self._ssl_context.check_hostname = False
+                self._ssl_context.verify_mode = ssl.CERT_NONE
+
+        self.timeout_s = timeout_s
+
+        # Delay before reconnecting, doubled on every failure up to the max
+        self.reconnect_delay_s = 0.5
+        self.max_reconnect_delay_s = 10
+
+        # JPEGs received, but superseded before they were decoded
+        self.frames_dropped = 0
+
+        self._logger = log.get_module_logger(self.__class__.__name__)
+        self._connection = None  # type: http.client.HTTPConnection
+        self._condition = threading.Condition()
+        self._jpeg = None  # type: bytes
+        self._frame = None  # type: np.ndarray
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self) -> None:
+        self._jpeg = None
+        self._frame = None
+        self._stop_event.clear()
+
+        self._threads = [
+            threading.Thread(target=self._receive_loop, name="IPCameraReceive", daemon=True),
+            threading.Thread(target=self._decode_loop, name="IPCameraDecode", daemon=True)
+        ]
+
+        for thread in self._threads:
+            thread.start()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self._ssl_context:
+            return http.client.HTTPSConnection(self._url.hostname, self._url.port, timeout=self.timeout_s, context=self._ssl_context)
+
+        return http.client.HTTPConnection(self._url.hostname, self._url.port, timeout=self.timeout_s)
+
+    def _receive(self) -> Iterator[bytes]:
+        """
+        Description
+        --
+        Receives the JPEGs, over a new connection.
+        """
+
+        path = (self._url.path or '/') + ('?' + self._url.query if self._url.query else '')
+
+        while not self._stop_event.is_set():
+            self._connection.request('GET', path)
+            response = self._connection.getresponse()
+
+            if response.status != 200:
+                raise ConnectionError("Camera responded with {}".format(response.status))
+
+            content_type = response.getheader('Content-Type', '')
+
+            if content_type.startswith('multipart/'):
+                boundary = content_type.partition('boundary=')[2].split(';')[0].strip().strip('"')
+                if not boundary:
+                    raise ConnectionError("No boundary in {}".format(content_type))
+
+                yield from self._parts(response, boundary.encode('latin-1'))
+
+                raise ConnectionError("Stream ended")
+
+            # A snapshot per request, on the same connection
+            yield response.read()
+
+    def _parts(self, response: http.client.HTTPResponse, boundary: bytes) -> Iterator[bytes]:
+        """
+        Description
+        --
+        Parses the parts of a multipart stream, as they arrive.
+        """
+
+        delimiter = boundary if boundary.startswith(b'--') else b'--' + boundary
+        at_part = False  # Whether the delimiter has been read already
+
+        while not self._stop_event.is_set():
+            if not at_part:
+                line = response.readline()
+                if not line:
+                    return
+
+                if not line.startswith(delimiter):
+                    # Preamble, or the rest of the previous part
+                    continue
+
+            # Part headers
+            length = None
+            while True:
+                line = response.readline()
+                if not line:
+                    return
+
+                if not line.strip():
+                    break
+
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value)
+
+            if length is not None:
+                data = response.read(length)
+                if len(data) < length:
+                    return
+
+                at_part = False
+            else:
+                # Up to the next delimiter
+                data = b''
+                while True:
+                    line = response.readline()
+                    if not line:
+                        return
+
+                    if line.startswith(delimiter):
+                        break
+
+                    data += line
+
+                at_part = True
+
+            yield data
+
+    def _receive_loop(self) -> None:
+        delay_s = self.reconnect_delay_s
+
+        while not self._stop_event.is_set():
+            try:
+                self._connection = self._connect()
+
+                for jpeg in self._receive():
+                    delay_s = self.reconnect_delay_s
 
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
+                    with self._condition:
+                        if self._jpeg is not None:
+                            self.frames_dropped += 1
+
+                        self._jpeg = jpeg
+                        self._condition.notify_all()
+            except Exception as e:
+                if not self._stop_event.is_set():
+                    self._logger.warning("Stream of {} failed, reconnecting in {}s: {}".format(self._url.geturl(), delay_s, e))
+            finally:
+                self._connection.close()
+
+            if self._stop_event.wait(delay_s):
+                break
+
+            delay_s = min(2 * delay_s, self.max_reconnect_delay_s)
+
+    def _decode_loop(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._jpeg is not None or self._stop_event.is_set())
+
+                if self._stop_event.is_set():
+                    return
+
+                jpeg, self._jpeg = self._jpeg, None
+
+            frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+            if frame is None:
+                # Corrupt
+                continue
+
+            with self._condition:
+                self._frame = frame
+                self._condition.notify_all()
 
     def get(self) -> Tuple[bool, Any]:
-        try:
-            img_resp = urllib3.urlopen(self._url)
-            img_np = np.array(bytearray(img_resp.read()), dtype=np.uint8)
+        """
+        Description
+        --
+        Waits for the next frame. Not grabbed only once interrupted, or
+        stopped.
+        """
 
-            return (True, cv2.imdecode(img_np, -1))
-        except Exception:
-            return (False, None)
+        with self._condition:
+            self._condition.wait_for(lambda: self._frame is not None or self._stop_event.is_set())
+
+            frame, self._frame = self._frame, None
+
+        return (frame is not None, frame)
+
+    def interrupt(self) -> None:
+        self._stop_event.set()
+
+        with self._condition:
+            self._condition.notify_all()
+
+        connection = self._connection
+        if connection is not None and connection.sock is not None:
+            try:
+                # Unblocks the receiving thread
+                connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def stop(self) -> None:
+        self.interrupt()
+
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
 
 
 class CameraFrameProvider(FrameProvider):
-    def __init__(self, camera_index: int = 0) -> None:
+    def __init__(self, camera_index: int = 0, api_preference: int = cv2.CAP_ANY, hardware_acceleration: bool = False) -> None:
         """
         Description
         --
@@ -60,25 +329,89 @@ class CameraFrameProvider(FrameProvider):
         Parameters
         --
         - source - The camera index.
+        - api_preference - The capture backend, e.g. `cv2.CAP_FFMPEG`,
+        `cv2.CAP_GSTREAMER`. Any available by default.
+        - hardware_acceleration - Whether to decode on the hardware decoder,
+        if the backend has one.
         """
 
         self._source = camera_index
         self._stream = None
+        self._api_preference = api_preference
+        self._hardware_acceleration = hardware_acceleration
+
+        # Capture properties set when started, e.g.
+        # {cv2.CAP_PROP_BUFFERSIZE: 1, cv2.CAP_PROP_FRAME_WIDTH: 1280}
+        self.capture_properties = {}  # type: Dict[int, float]
 
     def start(self):
         # Get a handle on the stream
-        self._stream = cv2.VideoCapture(self._source)
+        params = []
+        if self._hardware_acceleration:
+            params = [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+
+        self._stream = cv2.VideoCapture(self._source, self._api_preference, params)
+
+        for prop, value in self.capture_properties.items():
+            self._stream.set(prop, value)
 
     def get(self) -> Tuple[bool, Any]:
         return self._stream.read()
 
+    def get_into(self, frame: np.ndarray) -> Tuple[bool, Any]:
+        # Decoded straight into the frame, if it fits
+        return self._stream.read(frame)
+
+    def grab(self) -> bool:
+        """
+        Description
+        --
+        Grabs the next frame, without decoding it (see `retrieve`).
+
+        Returns
+        --
+        Whether a frame was grabbed.
+        """
+
+        return self._stream.grab()
+
+    def retrieve(self, frame: np.ndarray = None) -> Tuple[bool, Any]:
+        """
+        Description
+        --
+        Decodes the grabbed frame, into the frame if it fits.
+        """
+
+        return self._stream.retrieve(frame)
+
+    @property
+    def backend(self) -> str:
+        return self._stream.getBackendName()
+
+    @property
+    def buffer_size(self) -> int:
+        return int(self._stream.get(cv2.CAP_PROP_BUFFERSIZE))
+
+    @property
+    def fourcc(self) -> str:
+        code = int(self._stream.get(cv2.CAP_PROP_FOURCC))
+        return "".join(chr((code >> 8 * i) & 0xFF) for i in range(4))
+
+    @property
+    def resolution(self) -> Tuple[int, int]:
+        return (int(self._stream.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self._stream.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    @property
+    def fps(self) -> float:
+        return self._stream.get(cv2.CAP_PROP_FPS)
+
     def stop(self):
         # Release the stream
         self._stream.release()
 
 
 class VideoFrameProvider(CameraFrameProvider):
-    def __init__(self, video_file_path: str) -> None:
+    def __init__(self, video_file_path: str, api_preference: int = cv2.CAP_ANY, hardware_acceleration: bool = False) -> None:
         """
         Description
         --
@@ -87,6 +420,8 @@ class VideoFrameProvider(CameraFrameProvider):
         Parameters
         --
         - video_file_path - The path to the video file.
+        - api_preference - (see base)
+        - hardware_acceleration - (see base)
         """
 
         if not video_file_path:
@@ -95,8 +430,311 @@ class VideoFrameProvider(CameraFrameProvider):
         if not os.path.isfile(video_file_path):
             raise ValueError("File not found {}".format(video_file_path))
 
+        super().__init__(api_preference=api_preference, hardware_acceleration=hardware_acceleration)
         self._source = video_file_path
-        self._stream = None
+
+        # Videos are played back at their own frame rate. False to read
+        # them as fast as possible, e.g. to process them offline.
+        self.realtime = True
+
+        self._frame_interval_s = 0
+        self._next_frame_at = 0
+
+    def start(self):
+        super().start()
+
+        fps = self.fps if self.realtime else 0
+        self._frame_interval_s = 1 / fps if fps and fps > 0 else 0
+        self._next_frame_at = time.perf_counter()
+
+    def _wait_for_frame(self) -> None:
+        if self._frame_interval_s:
+            # Wait for the frame's turn
+            delay = self._next_frame_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            self._next_frame_at = max(self._next_frame_at, time.perf_counter() - self._frame_interval_s) + self._frame_interval_s
+
+    def get(self) -> Tuple[bool, Any]:
+        self._wait_for_frame()
+
+        return super().get()
+
+    def get_into(self, frame: np.ndarray) -> Tuple[bool, Any]:
+        self._wait_for_frame()
+
+        return super().get_into(frame)
+
+    def grab(self) -> bool:
+        self._wait_for_frame()
+
+        return super().grab()
+
+
+class RtspFrameProvider(CameraFrameProvider):
+    """
+    Streams the frames of an RTSP camera, through FFmpeg. Reconnects,
+    with backoff, when the stream fails. Wrap in `PrefetchFrameProvider`
+    to decode on a dedicated thread.
+
+    OpenCV takes the FFmpeg options (the transport) from a process-wide
+    environment variable only, when a capture is opened. The streams are
+    opened one at a time, each with its own options, which are restored
+    afterwards. Other FFmpeg captures opened meanwhile, outside of this
+    class, may get them too.
+    """
+
+    # Opening streams, see `_open`
+    _open_lock = threading.Lock()
+
+    def __init__(self, url: str, hardware_acceleration: bool = False, transport: str = 'tcp') -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - url - The URL of the stream.
+        - hardware_acceleration - (see base)
+        - transport - The RTSP transport, 'tcp' or 'udp'. UDP has lower
+        latency, but loses packets on busy networks.
+        """
+
+        if not url:
+            raise ValueError("url is required")
+
+        super().__init__(api_preference=cv2.CAP_FFMPEG, hardware_acceleration=hardware_acceleration)
+        self._source = url
+        self._transport = transport
+
+        # Delay before reconnecting, doubled on every failure up to the max
+        self.reconnect_delay_s = 0.5
+        self.max_reconnect_delay_s = 10
+
+        self._logger = log.get_module_logger(self.__class__.__name__)
+        self._stop_event = threading.Event()
+
+    def start(self):
+        self._stop_event.clear()
+        self._open()
+
+    def _open(self) -> None:
+        """
+        Description
+        --
+        Opens the stream, with its transport.
+        """
+
+        with self._open_lock:
+            options = os.environ.get('OPENCV_FFMPEG_CAPTURE_OPTIONS')
+            os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = 'rtsp_transport;{}'.format(self._transport)
+
+            try:
+                super().start()
+            finally:
+                if options is None:
+                    del os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS']
+                else:
+                    os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = options
+
+    def _reconnect(self) -> bool:
+        """
+        Description
+        --
+        Reopens the stream, until it opens or the provider is interrupted.
+
+        Returns
+        --
+        Whether the stream was reopened.
+        """
+
+        delay_s = self.reconnect_delay_s
+
+        while not self._stop_event.is_set():
+            self._logger.warning("Stream of {} failed, reconnecting in {}s".format(self._source, delay_s))
+
+            if self._stop_event.wait(delay_s):
+                break
+
+            self._stream.release()
+            self._open()
+
+            if self._stream.isOpened():
+                return True
+
+            delay_s = min(2 * delay_s, self.max_reconnect_delay_s)
+
+        return False
+
+    def get(self) -> Tuple[bool, Any]:
+        grabbed, frame = super().get()
+
+        while not grabbed and self._reconnect():
+            grabbed, frame = super().get()
+
+        return (grabbed, frame)
+
+    def get_into(self, frame: np.ndarray) -> Tuple[bool, Any]:
+        grabbed, image = super().get_into(frame)
+
+        while not grabbed and self._reconnect():
+            grabbed, image = super().get_into(frame)
+
+        return (grabbed, image)
+
+    def grab(self) -> bool:
+        grabbed = super().grab()
+
+        while not grabbed and self._reconnect():
+            grabbed = super().grab()
+
+        return grabbed
+
+    def interrupt(self) -> None:
+        self._stop_event.set()
+
+
+class PrefetchFrameProvider(FrameProvider):
+    """
+    Decodes the frames of a provider on a dedicated thread, ahead of
+    time, into a small ring of frames - so decoding doesn't add to the
+    latency of the feed.
+    """
+
+    def __init__(self, provider: CameraFrameProvider, slots: int = 2, drop_frames: bool = True) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - provider - The provider to prefetch from.
+        - slots - The number of frames decoded ahead.
+        - drop_frames - Whether to skip the frames when the ring is full,
+        without decoding them (live sources). Otherwise decoding waits
+        for a free slot (offline videos, every frame is wanted).
+        """
+
+        if not provider:
+            raise ValueError("provider is required")
+
+        if slots < 1:
+            raise ValueError("slots must be positive")
+
+        self.provider = provider
+        self.slots = slots
+        self.drop_frames = drop_frames
+
+        # Decode every Nth frame only, the others are skipped
+        self.decode_every = 1
+
+        # Frames skipped, without being decoded
+        self.frames_skipped = 0
+
+        self._free = None  # type: queue.Queue
+        self._decoded = None  # type: queue.Queue
+        self._stop_event = threading.Event()
+        self._thread = None  # type: threading.Thread
+
+    def start(self) -> None:
+        self.provider.start()
+
+        self._free = queue.Queue()
+        self._decoded = queue.Queue()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._decode_loop, name="PrefetchFrameProvider", daemon=True)
+        self._thread.start()
+
+    def _free_slot(self) -> Any:
+        """
+        Description
+        --
+        Waits for a free slot, None if stopped.
+        """
+
+        while not self._stop_event.is_set():
+            try:
+                return self._free.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    def _decode_loop(self) -> None:
+        grabbed_count = 0
+        frames_count = 0
+
+        try:
+            while not self._stop_event.is_set():
+                if not self.provider.grab():
+                    break
+
+                grabbed_count += 1
+                if self.decode_every > 1 and grabbed_count % self.decode_every:
+                    self.frames_skipped += 1
+                    continue
+
+                if frames_count < self.slots:
+                    # The first frames dictate the slot size
+                    retrieved, frame = self.provider.retrieve()
+                    frames_count += 1
+                elif self.drop_frames:
+                    try:
+                        slot = self._free.get_nowait()
+                    except queue.Empty:
+                        # Would be dropped anyway
+                        self.frames_skipped += 1
+                        continue
+
+                    retrieved, frame = self.provider.retrieve(slot)
+                else:
+                    slot = self._free_slot()
+                    if slot is None:
+                        break
+
+                    retrieved, frame = self.provider.retrieve(slot)
+
+                if not retrieved:
+                    break
+
+                self._decoded.put(frame)
+        finally:
+            # End of the stream
+            self._decoded.put(None)
+
+    def get(self) -> Tuple[bool, Any]:
+        return self.get_into(None)
+
+    def get_into(self, frame: np.ndarray) -> Tuple[bool, Any]:
+        decoded = self._decoded.get()
+
+        if decoded is None:
+            # Later calls get the end of the stream too
+            self._decoded.put(None)
+            return (False, None)
+
+        if frame is not None and frame.shape == decoded.shape and frame.dtype == decoded.dtype:
+            np.copyto(frame, decoded)
+        else:
+            frame = decoded.copy()
+
+        self._free.put(decoded)
+
+        return (True, frame)
+
+    def interrupt(self) -> None:
+        self.provider.interrupt()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.provider.interrupt()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        self.provider.stop()
 
 
 class FrameFeed(Worker):
@@ -124,14 +762,128 @@ class FrameFeed(Worker):
         # For how many frames should a rectangle be cached
         self.cache_highlight_for = 0  # 0 for no caching
 
+        # Number of preallocated frames, recycled once all subscribers are
+        # done with them. 0 to allocate every frame, 'auto' for as many as
+        # the subscribers can hold (see `_ring_size`). When they are all in
+        # use, frames are allocated.
+        self.ring_slots = 0
+
         # We don't want the feed source to wait for a job
-        # in the queue.
+        # in the queue. The frame provider paces the feed.
         self._wait_for_job_s = 0
 
         self._frame_provider = frame_provider
         self._stream = None
         self._cached_highlight = None
         self._cached_highlights_count = 0
+        self._ring = None  # type: FrameRing
+        self._ring_exhausted = False
+
+    def _ring_size(self) -> int:
+        """
+        Description
+        --
+        The number of slots of the ring. With 'auto', a slot for every job
+        the subscribers of the frames can queue and for the one each is
+        processing, plus the raw and overlay frames being produced. 0 if a
+        subscriber's queue is unbounded, or unknown.
+        """
+
+        if self.ring_slots != 'auto':
+            return self.ring_slots
+
+        slots = 2
+
+        for channel in (self.channel_raw, self.channel_processed):
+            for recipient, policy in self._recipients.get(channel, []):
+                queued = 1 if policy == QueuePolicy.latest_only else getattr(getattr(recipient, 'queue', None), 'maxsize', 0)
+
+                if not queued:
+                    return 0
+
+                slots += queued + 1
+
+        return slots
+
+    def _acquire_slot(self) -> RingFrame:
+        """
+        Description
+        --
+        Acquires a free slot of the ring. Warns the first time they are
+        all in use.
+
+        Returns
+        --
+        The slot, None if there is no ring or no free slot.
+        """
+
+        slot = self._ring.acquire() if self._ring else None
+
+        if slot is None and self._ring and not self._ring_exhausted:
+            self._ring_exhausted = True
+            self._logger.warning("All the {} frames of the ring are in use, allocating frames".format(self._ring.slots))
+
+        return slot
+
+    def _grab_frame(self) -> Tuple[bool, Any]:
+        """
+        Description
+        --
+        Grabs the next frame from the provider, into a slot of the ring,
+        if there is a free one.
+        """
+
+        slot = self._acquire_slot()
+
+        if slot is None:
+            # No ring (yet) or all slots are in use
+            grabbed, frame = self._frame_provider.get()
+
+            slots = self._ring_size() if grabbed and self.ring_slots and not self._ring else 0
+
+            if slots:
+                # The first frame dictates the slot size
+                self._ring = FrameRing(slots, frame.shape, frame.dtype)
+
+            return (grabbed, frame)
+
+        grabbed, frame = self._frame_provider.get_into(slot)
+
+        if frame is not slot:
+            slot.release()
+
+            if grabbed:
+                # Didn't fit the slot, the frame size has changed
+                self._ring = None
+
+        return (grabbed, frame)
+
+    def _overlay_frame(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Description
+        --
+        Gets a copy of the frame to draw an overlay on.
+        """
+
+        overlay_frame = self._acquire_slot() if self._ring and self._ring.fits(frame) else None
+
+        if overlay_frame is None:
+            return frame.copy()
+
+        np.copyto(overlay_frame, frame)
+
+        return overlay_frame
+
+    def _publish_results(self, results: Dict[str, Any]) -> None:
+        try:
+            super()._publish_results(results)
+        finally:
+            if results:
+                # Subscribers hold their own references now, release ours
+                frames = [untag(r)[0] for r in results.values()]
+
+                for frame in {id(f): f for f in frames if isinstance(f, RingFrame)}.values():
+                    frame.release()
 
     def _process_input_job(self, input_job: Any) -> Dict[str, Any]:
         """
@@ -142,14 +894,15 @@ class FrameFeed(Worker):
 
         Parameters
         --
-        - input_job - information to overlay, if any.
+        - input_job - information to overlay, if any - a highlight (two
+        corner points of a rectangle), or a list of them.
 
         Returns
         --
         Raw image (without an overlay) and an image with an overlay.
         """
 
-        grabbed, frame = self._frame_provider.get()
+        grabbed, frame = self._grab_frame()
 
         if grabbed:
             # If caching is enabled ...
@@ -172,19 +925,44 @@ class FrameFeed(Worker):
             overlay_frame = frame
 
             if input_job:
-                # Overlay a rectangle
-                a, b = input_job
-                overlay_frame = frame.copy()
-                cv2.rectangle(overlay_frame, a, b, self.rectangle_border_color, self.rectangle_border_width)
+                # Overlay the rectangles
+                overlay_frame = self._overlay_frame(frame)
+
+                for a, b in input_job if isinstance(input_job, list) else [input_job]:
+                    cv2.rectangle(overlay_frame, a, b, self.rectangle_border_color, self.rectangle_border_width)
+
+            # Subscribers only read the frames
+            frame.flags.writeable = False
+            overlay_frame.flags.writeable = False
 
             return {
                 self.channel_raw: frame,
                 self.channel_processed: overlay_frame
             }
         else:
+            if isinstance(frame, RingFrame):
+                frame.release()
+
             # End of the stream
             self.stop()
 
+    def stop(self) -> Worker:
+        """
+        Description
+        --
+        Stops the service. The provider is interrupted, in case it's
+        waiting for a frame.
+
+        Returns
+        --
+        Self, for fluent API.
+        """
+
+        super().stop()
+        self._frame_provider.interrupt()
+
+        return self
+
     def _on_starting(self) -> None:
         """
         Description
@@ -192,6 +970,7 @@ class FrameFeed(Worker):
         Called before the main loop.
         """
 
+        self._ring = None
         self._frame_provider.start()
 
     def _on_stopped(self) -> None:
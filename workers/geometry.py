@@ -0,0 +1,66 @@
+"""
+Description
+--
+Vectorized rectangle geometry.
+"""
+
+# 3rd party imports
+import numpy as np
+from numpy import ndarray
+
+
+def iou(boxes_a: ndarray, boxes_b: ndarray) -> ndarray:
+    """
+    Description
+    --
+    Intersection over union of every pair of rectangles.
+
+    Parameters
+    --
+    - boxes_a - Nx4 array of X, Y, W, H rectangles.
+    - boxes_b - Mx4 array of X, Y, W, H rectangles.
+
+    Returns
+    --
+    NxM array of the IoU of each pair.
+    """
+
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)[:, None, :]
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)[None, :, :]
+
+    w = np.clip(np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    h = np.clip(np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = w * h
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - intersection
+
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0)
+
+
+def nms(boxes: ndarray, scores: ndarray, threshold: float) -> ndarray:
+    """
+    Description
+    --
+    Greedy non-maximum suppression - of rectangles overlapping more than
+    `threshold`, only the highest scoring one is kept.
+
+    Parameters
+    --
+    - boxes - Nx4 array of X, Y, W, H rectangles.
+    - scores - N scores.
+    - threshold - the IoU above which rectangles are the same object.
+
+    Returns
+    --
+    Indices of the kept rectangles, highest score first.
+    """
+
+    order = np.argsort(np.asarray(scores).reshape(-1), kind='stable')[::-1]
+    overlaps = iou(boxes, boxes)
+    keep = []
+
+    while len(order):
+        best = order[0]
+        keep.append(best)
+        order = order[1:][overlaps[best, order[1:]] <= threshold]
+
+    return np.asarray(keep, dtype=np.int64)
@@ -0,0 +1,320 @@
+"""
+Description
+--
+Pipelines described as a graph of workers and the links between them,
+in a YAML or JSON file:
+
+>>> workers:
+>>>   feed:
+>>>     class: FrameFeed
+>>>     args:
+>>>       frame_provider: {class: CameraFrameProvider}
+>>>       jobs_limit: 60
+>>>     settings:
+>>>       ring_slots: 16
+>>>   finder:
+>>>     class: ObjectFinder
+>>>     args: {cascade_file: classifiers/mn_license_plates.xml, jobs_limit: 1}
+>>>     settings: {scale: 1.4, min_neighbors: 5}
+>>> links:
+>>>   - {from: feed, channel: channel_raw, to: finder, policy: latest_only}
+>>>   - {from: finder, channel: channel_object_rectangles, to: feed, policy: latest_only}
+>>> metrics: {port: 9100, log_every_s: 60}
+
+- class - a worker of this package by its name (e.g. `ObjectFinder`), or
+any class by its full name (e.g. `mypackage.module.MyWorker`).
+- args - the constructor arguments. An argument with a `class` is an
+object built the same way (e.g. a frame provider, an OCR engine).
+- settings - the attributes set after construction.
+- pool - the number of workers sharing the load, if more than one (see
+`WorkerPool`).
+
+- metrics - optional, enables the metrics of the workers (see
+`workers.metrics.enable`).
+
+Links are checked when loaded - unknown workers, channels the sender
+doesn't have, unknown queue policies and unknown settings are errors.
+"""
+
+from __future__ import annotations
+
+# System imports
+from collections import OrderedDict
+import importlib
+import json
+import time
+from typing import Any, Dict, List
+
+# 3rd party imports
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Local imports
+from logger import log
+from .multicam import WorkerPool
+from .worker import QueuePolicy
+from . import metrics
+
+# Module of the classes known by their name
+known_classes = {
+    'FrameFeed': 'workers.feed',
+    'CameraFrameProvider': 'workers.feed',
+    'VideoFrameProvider': 'workers.feed',
+    'IPCameraFrameProvider': 'workers.feed',
+    'RtspFrameProvider': 'workers.feed',
+    'PrefetchFrameProvider': 'workers.feed',
+    'MotionDetector': 'workers.motion',
+    'ObjectFinder': 'workers.classifier',
+    'ObjectTracker': 'workers.tracker',
+    'Ocr': 'workers.ocr',
+    'PytesseractEngine': 'workers.ocr',
+    'TesserocrEngine': 'workers.ocr',
+    'KnnEngine': 'workers.ocr',
+    'PlateConsensus': 'workers.consensus',
+    'PlateLookup': 'workers.platelookup',
+    'Cv2UserInterface': 'workers.interface'
+}
+
+
+def load_config(file_path: str) -> Dict[str, Any]:
+    """
+    Description
+    --
+    Loads a pipeline configuration, YAML or JSON by the file extension.
+    """
+
+    with open(file_path) as f:
+        if file_path.lower().endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ImportError("PyYAML is required to load {}".format(file_path))
+
+            return yaml.safe_load(f)
+
+        return json.load(f)
+
+
+def _class_of(name: str) -> type:
+    if name in known_classes:
+        module_name = known_classes[name]
+    else:
+        module_name, _, name = name.rpartition('.')
+
+        if not module_name:
+            raise ValueError("Unknown class {}".format(name))
+
+    return getattr(importlib.import_module(module_name), name)
+
+
+def _channels_of(cls: type) -> List[str]:
+    return [getattr(cls, attribute) for attribute in dir(cls) if attribute.startswith('channel_')]
+
+
+class PipelineGraph:
+    """
+    Builds the workers of a pipeline graph and links them. Starts them
+    recipients first, and stops them all at once.
+    """
+
+    def __init__(self, config: Any) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - config - the configuration, or the path of its YAML/JSON file.
+        """
+
+        if isinstance(config, str):
+            config = load_config(config)
+
+        self._logger = log.get_module_logger(self.__class__.__name__)
+
+        specs = config.get('workers') or {}
+        links = config.get('links') or []
+
+        if not specs:
+            raise ValueError("workers are required")
+
+        # All the errors at once
+        errors = []
+        classes = OrderedDict()
+
+        for name, spec in specs.items():
+            try:
+                classes[name] = _class_of(spec['class'])
+            except (KeyError, ValueError, ImportError, AttributeError) as e:
+                errors.append("Worker '{}': no class {}".format(name, e))
+
+        for i, link in enumerate(links):
+            sender, recipient = link.get('from'), link.get('to')
+            channel = link.get('channel')
+
+            for end in (sender, recipient):
+                if end not in specs:
+                    errors.append("Link {}: unknown worker '{}'".format(i, end))
+
+            if sender in classes and channel not in _channels_of(classes[sender]):
+                errors.append("Link {}: '{}' has no channel '{}', only {}".format(i, sender, channel, sorted(_channels_of(classes[sender]))))
+
+            if link.get('policy', QueuePolicy.drop_newest) not in QueuePolicy.all:
+                errors.append("Link {}: unknown policy '{}'".format(i, link['policy']))
+
+        if errors:
+            raise ValueError("Invalid pipeline:\n" + "\n".join(errors))
+
+        if config.get('metrics') is not None:
+            # Before the workers are created
+            metrics.enable(**config['metrics'])
+
+        self.workers = OrderedDict()  # type: OrderedDict[str, Any]
+
+        for name, spec in specs.items():
+            try:
+                self.workers[name] = self._build_worker(spec)
+            except (TypeError, ValueError, AttributeError) as e:
+                errors.append("Worker '{}': {}".format(name, e))
+
+        if errors:
+            raise ValueError("Invalid pipeline:\n" + "\n".join(errors))
+
+        # Recipients of each worker
+        self._recipients = {name: [] for name in self.workers}  # type: Dict[str, List[str]]
+
+        for link in links:
+            self.workers[link['from']].link_to(self.workers[link['to']], link['channel'], link.get('policy', QueuePolicy.drop_newest))
+            self._recipients[link['from']].append(link['to'])
+
+        self.start_order = self._start_order()
+
+    def _build(self, spec: Any) -> Any:
+        """
+        Description
+        --
+        Builds an object out of its spec - the class, constructor
+        arguments and settings. Anything else is a plain value.
+        """
+
+        if not isinstance(spec, dict) or 'class' not in spec:
+            return spec
+
+        args = {name: self._build(value) for name, value in (spec.get('args') or {}).items()}
+        instance = _class_of(spec['class'])(**args)
+
+        for name, value in (spec.get('settings') or {}).items():
+            if not hasattr(instance, name):
+                # Most likely a typo
+                raise AttributeError("{} has no setting '{}'".format(spec['class'], name))
+
+            setattr(instance, name, self._build(value))
+
+        return instance
+
+    def _build_worker(self, spec: Dict[str, Any]) -> Any:
+        size = spec.get('pool', 1)
+
+        if size > 1:
+            jobs_limit = (spec.get('args') or {}).get('jobs_limit', 0)
+            return WorkerPool(lambda: self._build(spec), size, jobs_limit)
+
+        return self._build(spec)
+
+    def _start_order(self) -> List[str]:
+        """
+        Description
+        --
+        The workers, each after its recipients - so no job is sent to a
+        worker which is not started yet. In a cycle (e.g. a highlight sent
+        back to the feed), the worker listed last starts last.
+        """
+
+        order = []
+        visited = set()
+
+        def visit(name):
+            if name in visited:
+                return
+
+            visited.add(name)
+
+            for recipient in self._recipients[name]:
+                visit(recipient)
+
+            order.append(name)
+
+        for name in reversed(self.workers):
+            visit(name)
+
+        return order
+
+    def start(self) -> PipelineGraph:
+        """
+        Description
+        --
+        Starts the workers, recipients first.
+
+        Returns
+        --
+        Self, for fluent API.
+        """
+
+        self._logger.info("Starting {}".format(", ".join(self.start_order)))
+
+        for name in self.start_order:
+            self.workers[name].start()
+
+        return self
+
+    def stop(self, timeout_s: float = 5) -> bool:
+        """
+        Description
+        --
+        Stops the workers, all at once - each one wakes up immediately
+        (see `Worker.stop`), and they are waited for together.
+
+        Parameters
+        --
+        - timeout_s - for how long to wait for the workers.
+
+        Returns
+        --
+        Whether all the workers stopped.
+        """
+
+        start = time.perf_counter()
+
+        # Sources first, so the others get no more jobs
+        for name in reversed(self.start_order):
+            self.workers[name].stop()
+
+        deadline = start + timeout_s
+        stopped = [name for name in self.start_order if self.workers[name].join(max(0, deadline - time.perf_counter()))]
+
+        if len(stopped) < len(self.workers):
+            self._logger.warning("Not stopped: {}".format(", ".join(n for n in self.start_order if n not in stopped)))
+        else:
+            self._logger.info("Stopped in {:.0f}ms".format(1000 * (time.perf_counter() - start)))
+
+        return len(stopped) == len(self.workers)
+
+    def run(self) -> None:
+        """
+        Description
+        --
+        Starts the workers and runs until one of them stops (e.g. the end
+        of a video, the interface closed) or until interrupted. Then
+        stops them all.
+        """
+
+        self.start()
+
+        try:
+            while all(not worker.join(0.1) for worker in self.workers.values()):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
@@ -37,8 +37,9 @@ class Cv2UserInterface(Worker):
 
         self._full_screen = full_screen
 
-        # We sleep with waitKey()
-        self.main_loop_sleep_s = 0
+        # Don't block on the queue for too long, waitKey() has to keep
+        # pumping the window events.
+        self._wait_for_job_s = 0.1
 
     def _process_input_job(self, input_job: Any) -> Dict[str, Any]:
         """
@@ -0,0 +1,102 @@
+"""
+Description
+--
+Jobs tagged with the source they come from (e.g. a camera), so workers
+shared by several sources can take turns between them and the results
+can be routed back to each source. With metrics enabled (see
+`workers.metrics`), jobs carry their timing too.
+"""
+
+# System imports
+from typing import Any, Tuple
+
+
+class TaggedJob:
+    """
+    A job, and the ID of its source. A worker processes the job itself,
+    and tags its results with the same source - and the same creation
+    time, so the latency of a frame can be followed down the pipeline.
+    """
+
+    __slots__ = ('job', 'source_id', 'created_at', 'queued_at')
+
+    def __init__(self, job: Any, source_id: Any, created_at: float = None, queued_at: float = None) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - job - the job.
+        - source_id - the ID of the source of the job, None for none.
+        - created_at - when the job (or the frame it derives from) was
+        created, `time.monotonic()`.
+        - queued_at - when the job was queued, `time.monotonic()`.
+        """
+
+        self.job = job
+        self.source_id = source_id
+        self.created_at = created_at
+        self.queued_at = queued_at
+
+    def __repr__(self) -> str:
+        return "TaggedJob({!r})".format(self.source_id)
+
+
+def untag(job: Any) -> Tuple[Any, Any]:
+    """
+    Description
+    --
+    Splits a job from its tag.
+
+    Parameters
+    --
+    - job - the job, tagged or not.
+
+    Returns
+    --
+    Tuple of the job and the ID of its source, None if not tagged.
+    """
+
+    if isinstance(job, TaggedJob):
+        return (job.job, job.source_id)
+
+    return (job, None)
+
+
+def tag(job: Any, source_id: Any, created_at: float = None) -> Any:
+    """
+    Description
+    --
+    Tags a job with its source and creation time, if any.
+
+    Parameters
+    --
+    - job - the job.
+    - source_id - the ID of the source, None for none.
+    - created_at - the creation time, None for none.
+
+    Returns
+    --
+    The tagged job, or the job as is.
+    """
+
+    if job is None or (source_id is None and created_at is None):
+        return job
+
+    return TaggedJob(job, source_id, created_at)
+
+
+def created_at_of(job: Any) -> float:
+    """
+    Description
+    --
+    Gets when a job (or the frame it derives from) was created.
+
+    Returns
+    --
+    The creation time, None if unknown.
+    """
+
+    return job.created_at if isinstance(job, TaggedJob) else None
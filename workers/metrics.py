@@ -0,0 +1,305 @@
+"""
+Description
+--
+Metrics of the workers - jobs in, out and dropped, queue depth, and
+histograms of the queue wait, the processing time and the latency of
+the frames (from the feed to the worker). Exposed in the Prometheus
+text format over HTTP, on localhost, and summarized in the log.
+
+Disabled by default, then the workers don't measure anything. Enable
+before creating the workers:
+
+>>> from workers import metrics
+>>> metrics.enable(port=9100, log_every_s=60)
+"""
+
+# System imports
+import bisect
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+from typing import Any, Dict, List, Tuple
+import weakref
+
+# Local imports
+from logger import log
+
+# Whether the workers created from now on are measured
+enabled = False
+
+# Upper bounds of the histogram buckets, in seconds
+buckets_s = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_registry = []  # type: List[WorkerMetrics]
+_registry_lock = threading.Lock()
+_server = None  # type: ThreadingHTTPServer
+_summary_stop = threading.Event()
+
+
+class Histogram:
+    """
+    Counts of observed durations, by bucket.
+    """
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(buckets_s) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value_s: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(buckets_s, value_s)] += 1
+            self.sum += value_s
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Description
+        --
+        Estimates a quantile, as the upper bound of the bucket it falls in.
+
+        Parameters
+        --
+        - q - the quantile (0 - 1).
+
+        Returns
+        --
+        The quantile in seconds, inf if over the last bucket, None if
+        nothing was observed.
+        """
+
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        total = 0
+
+        for bound, count in zip(buckets_s + (float('inf'),), self.counts):
+            total += count
+            if total >= rank:
+                return bound
+
+        return float('inf')
+
+
+class WorkerMetrics:
+    """
+    The metrics of a worker.
+    """
+
+    def __init__(self, worker: Any, name: str) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - worker - the measured worker.
+        - name - the unique name of the worker, in the metrics.
+        """
+
+        self.name = name
+        self.jobs_in = 0
+        self.jobs_out = 0
+
+        self.queue_wait_s = Histogram()
+        self.processing_s = Histogram()
+        self.latency_s = Histogram()  # Since the job (its frame) was created
+
+        self._worker = weakref.ref(worker)
+
+    @property
+    def worker(self) -> Any:
+        return self._worker()
+
+
+def register(worker: Any) -> WorkerMetrics:
+    """
+    Description
+    --
+    Creates the metrics of a worker, if enabled.
+
+    Returns
+    --
+    The metrics, None if disabled.
+    """
+
+    if not enabled:
+        return None
+
+    with _registry_lock:
+        # Unique names - Ocr, Ocr-2, ...
+        name = worker.__class__.__name__
+        taken = {m.name for m in _registry if m.worker is not None}
+        number = 1
+        while (name if number == 1 else "{}-{}".format(name, number)) in taken:
+            number += 1
+
+        metrics = WorkerMetrics(worker, name if number == 1 else "{}-{}".format(name, number))
+        _registry[:] = [m for m in _registry if m.worker is not None] + [metrics]
+
+    return metrics
+
+
+def _measured() -> List[Tuple[WorkerMetrics, Any]]:
+    # Each worker is resolved once, and held while its metrics are read
+    with _registry_lock:
+        return [(m, w) for m in _registry for w in (m.worker,) if w is not None]
+
+
+def render() -> str:
+    """
+    Description
+    --
+    Renders the metrics of all the workers, in the Prometheus text format.
+    """
+
+    lines = []
+    measured = _measured()
+
+    def family(name: str, kind: str, help_text: str) -> None:
+        lines.append("# HELP anpr_{} {}".format(name, help_text))
+        lines.append("# TYPE anpr_{} {}".format(name, kind))
+
+    counters = (
+        ('jobs_in_total', "Jobs received.", lambda m, w: m.jobs_in),
+        ('jobs_out_total', "Results published.", lambda m, w: m.jobs_out),
+        ('jobs_dropped_total', "Jobs dropped from the queue.", lambda m, w: w.jobs_dropped))
+
+    for name, help_text, value in counters:
+        family(name, 'counter', help_text)
+        lines.extend('anpr_{}{{worker="{}"}} {}'.format(name, m.name, value(m, w)) for m, w in measured)
+
+    family('queue_depth', 'gauge', "Jobs in the queue.")
+    lines.extend('anpr_queue_depth{{worker="{}"}} {}'.format(m.name, w.queue.qsize()) for m, w in measured)
+
+    histograms = (
+        ('queue_wait_seconds', "Time jobs wait in the queue.", 'queue_wait_s'),
+        ('processing_seconds', "Time to process a job.", 'processing_s'),
+        ('latency_seconds', "Time since the frame of a job was fed.", 'latency_s'))
+
+    for name, help_text, attribute in histograms:
+        family(name, 'histogram', help_text)
+
+        for m, _ in measured:
+            histogram = getattr(m, attribute)
+            total = 0
+
+            for bound, count in zip(buckets_s + (float('inf'),), histogram.counts):
+                total += count
+                lines.append('anpr_{}_bucket{{worker="{}",le="{}"}} {}'.format(name, m.name, '+Inf' if bound == float('inf') else bound, total))
+
+            lines.append('anpr_{}_sum{{worker="{}"}} {}'.format(name, m.name, histogram.sum))
+            lines.append('anpr_{}_count{{worker="{}"}} {}'.format(name, m.name, histogram.count))
+
+    return "\n".join(lines) + "\n"
+
+
+def summary() -> List[str]:
+    """
+    Description
+    --
+    Summarizes the metrics of each worker, in a line.
+    """
+
+    def ms(value_s: float) -> str:
+        return "-" if value_s is None else "{:.1f}ms".format(1000 * value_s)
+
+    return [
+        "{}: in {}, out {}, dropped {}, queued {}, wait p95 {}, processing p50 {} p95 {}, latency p95 {}".format(
+            m.name, m.jobs_in, m.jobs_out, w.jobs_dropped, w.queue.qsize(),
+            ms(m.queue_wait_s.quantile(0.95)),
+            ms(m.processing_s.quantile(0.5)), ms(m.processing_s.quantile(0.95)),
+            ms(m.latency_s.quantile(0.95)))
+        for m, w in _measured()]
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        body = render().encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Scrapes are not worth a log line each
+        pass
+
+
+def _log_summary(every_s: float) -> None:
+    logger = log.get_module_logger("Metrics")
+
+    while not _summary_stop.wait(every_s):
+        for line in summary():
+            logger.info(line)
+
+
+def enable(port: int = None, log_every_s: float = None) -> None:
+    """
+    Description
+    --
+    Enables the metrics of the workers created from now on.
+
+    Parameters
+    --
+    - port - the port of the HTTP endpoint on localhost, to scrape the
+    metrics from. None for no endpoint.
+    - log_every_s - how often to log a summary of the metrics. None for
+    never.
+    """
+
+    global enabled, _server
+
+    enabled = True
+
+    if port is not None and _server is None:
+        _server = ThreadingHTTPServer(('127.0.0.1', port), _MetricsHandler)
+        threading.Thread(target=_server.serve_forever, name="Metrics", daemon=True).start()
+
+    if log_every_s:
+        _summary_stop.clear()
+        threading.Thread(target=_log_summary, args=(log_every_s,), name="MetricsSummary", daemon=True).start()
+
+
+def disable() -> None:
+    """
+    Description
+    --
+    Disables the metrics of the workers created from now on, and stops
+    the endpoint and the summary.
+    """
+
+    global enabled, _server
+
+    enabled = False
+    _summary_stop.set()
+
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """
+    Description
+    --
+    The counters of each worker, e.g. for benchmarks.
+    """
+
+    return {
+        m.name: {
+            'jobs_in': m.jobs_in,
+            'jobs_out': m.jobs_out,
+            'jobs_dropped': w.jobs_dropped,
+            'queue_depth': w.queue.qsize(),
+            'queue_wait_p95_s': m.queue_wait_s.quantile(0.95),
+            'processing_p50_s': m.processing_s.quantile(0.5),
+            'processing_p95_s': m.processing_s.quantile(0.95),
+            'latency_p95_s': m.latency_s.quantile(0.95)
+        }
+        for m, w in _measured()}
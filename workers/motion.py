@@ -0,0 +1,171 @@
+"""
+Description
+--
+Finds motion on the frame, so that objects are only searched
+for where something has changed.
+"""
+
+# System imports
+from typing import Any, Dict
+
+# 3rd party imports
+import cv2
+import numpy as np
+from numpy import ndarray
+
+# Local imports
+from .worker import Worker
+
+
+class MotionDetector(Worker):
+    channel_motion_frame = 'channel_motion_frame'
+    channel_motion_regions = 'channel_motion_regions'
+
+    def __init__(self, jobs_limit=0) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - jobs_limit - (see base)
+        """
+
+        super().__init__(jobs_limit=jobs_limit)
+
+        # Motion is looked for on a frame downscaled to this width
+        self.downscale_width = 320
+
+        # How much a pixel has to change (0 - 255) to be considered moving
+        self.threshold = 25
+
+        # Smallest moving area, as a ratio of the frame area
+        self.min_area_ratio = 0.001
+
+        # How fast the background adapts to changes (0 - 1)
+        self.learning_rate = 0.05
+
+        # Padding (in frame pixels) around the moving regions, so objects
+        # on their edge are not cut
+        self.region_padding = 16
+
+        # Forward the whole frame every N frames, even without motion.
+        # 0 to forward only on motion.
+        self.full_frame_every = 0
+
+        self._background = None  # type: ndarray
+        self._buffers = {}  # type: Dict[str, ndarray]
+        self._frames_count = 0
+
+    def _buffer(self, name: str, shape: tuple, dtype=np.uint8) -> ndarray:
+        buffer = self._buffers.get(name)
+
+        if buffer is None or buffer.shape != shape:
+            buffer = self._buffers[name] = np.empty(shape, dtype=dtype)
+
+        return buffer
+
+    def _find_motion(self, frame: ndarray) -> ndarray:
+        """
+        Description
+        --
+        Finds the moving regions of the frame, against the background.
+
+        Parameters
+        --
+        - frame - the frame.
+
+        Returns
+        --
+        Nx4 array of X, Y, W, H regions, in frame coordinates.
+        None until there is a background to compare against.
+        """
+
+        orig_y, orig_x = frame.shape[:2]
+        ratio = min(1, self.downscale_width / orig_x)
+        size = (max(1, int(orig_x * ratio)), max(1, int(orig_y * ratio)))
+
+        # Downscaled, blurred grayscale
+        small = cv2.resize(frame, size, dst=self._buffer('small', (size[1], size[0]) + frame.shape[2:]), interpolation=cv2.INTER_AREA)
+        gray = small if small.ndim == 2 else cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._buffer('gray', (size[1], size[0])))
+        cv2.GaussianBlur(gray, (5, 5), 0, dst=gray)
+
+        if self._background is None or self._background.shape != gray.shape:
+            # First frame, nothing to compare against
+            self._background = gray.astype(np.float32)
+            return None
+
+        # Moving pixels
+        background = cv2.convertScaleAbs(self._background, dst=self._buffer('background', gray.shape))
+        mask = cv2.absdiff(gray, background, dst=self._buffer('mask', gray.shape))
+        cv2.threshold(mask, self.threshold, 255, cv2.THRESH_BINARY, dst=mask)
+        cv2.dilate(mask, None, dst=mask, iterations=2)
+
+        cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+
+        # Moving regions
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        stats = stats[1:]  # Skip the background component
+        stats = stats[stats[:, cv2.CC_STAT_AREA] >= self.min_area_ratio * gray.size]
+
+        # Back to frame coordinates, padded
+        regions = stats[:, :4].astype(np.float32) / ratio
+        regions[:, :2] -= self.region_padding
+        regions[:, 2:] += 2 * self.region_padding
+
+        x1 = np.clip(regions[:, 0], 0, orig_x)
+        y1 = np.clip(regions[:, 1], 0, orig_y)
+        x2 = np.clip(regions[:, 0] + regions[:, 2], 0, orig_x)
+        y2 = np.clip(regions[:, 1] + regions[:, 3], 0, orig_y)
+
+        return np.stack([x1, y1, x2 - x1, y2 - y1], axis=1).astype(np.int32)
+
+    def _process_input_job(self, input_job: Any) -> Dict[str, Any]:
+        """
+        Description
+        --
+        Looks for motion on the frame.
+
+        Parameters
+        --
+        - input_job - the frame.
+
+        Returns
+        --
+        If there is motion, the frame and the moving regions, and the
+        moving regions alone. Otherwise None.
+        """
+
+        if input_job is None:
+            return
+
+        regions = self._find_motion(input_job)
+        self._frames_count += 1
+
+        if self.full_frame_every and self._frames_count % self.full_frame_every == 0:
+            # Look at the whole frame, from time to time
+            regions = np.array([[0, 0, input_job.shape[1], input_job.shape[0]]], dtype=np.int32)
+
+        if regions is None or len(regions) == 0:
+            # Static frame
+            return
+
+        return {
+            # Frame channel - the frame and the moving regions on it
+            self.channel_motion_frame: (input_job, regions),
+
+            # Regions channel - X, Y, W, H of the moving regions
+            self.channel_motion_regions: regions
+        }
+
+    def _on_starting(self) -> None:
+        """
+        Description
+        --
+        Called before the main loop.
+        """
+
+        # Learn the background from scratch
+        self._background = None
+        self._frames_count = 0
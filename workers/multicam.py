@@ -0,0 +1,400 @@
+"""
+Description
+--
+Runs the plate pipeline for many cameras, on shared pools of object
+finders and OCR workers. The jobs of each camera are tagged with its
+ID (see `TaggedJob`), the pools take turns between the cameras and the
+results are routed back to each camera.
+"""
+
+from __future__ import annotations
+
+# System imports
+import itertools
+import json
+import os
+import threading
+from typing import Any, Callable
+
+# Local imports
+from logger import log
+from .classifier import ObjectFinder
+from .consensus import PlateConsensus
+from .feed import CameraFrameProvider, FrameFeed, FrameProvider, IPCameraFrameProvider, PrefetchFrameProvider, RtspFrameProvider, VideoFrameProvider
+from .job import created_at_of, tag, TaggedJob, untag
+from .ocr import Ocr
+from .platelookup import PlateLookup
+from .worker import FairQueue, QueuePolicy, Worker
+from . import ring
+
+
+class WorkerPool:
+    """
+    Workers of the same kind, which share the load. Linked to and from
+    as a single worker. Each job goes to the least busy worker, and the
+    queue of each worker takes turns between the sources of the jobs
+    (see `FairQueue`).
+
+    Jobs received as `QueuePolicy.latest_only` always go to the same
+    worker for the same source, spreading the sources across the
+    workers - only then is the queued job of a source the latest one.
+    """
+
+    def __init__(self, create_worker: Callable[[], Worker], size: int, jobs_limit: int = 0) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - create_worker - creates a worker of the pool.
+        - size - the number of workers.
+        - jobs_limit - the queue limit of each worker, per source.
+        """
+
+        if size < 1:
+            raise ValueError("size must be positive")
+
+        self.workers = [create_worker() for _ in range(size)]
+
+        for worker in self.workers:
+            worker.queue = FairQueue(jobs_limit)
+
+        # Breaks the ties between equally busy workers
+        self._turns = itertools.cycle(range(size))
+
+        # Source ID -> worker, of the latest_only jobs
+        self._pinned = {}
+        self._pinned_lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        # Channels and settings common to the workers
+        return getattr(self.__dict__['workers'][0], name)
+
+    def link_to(self, recipient: Any, channel: str = None, policy: str = QueuePolicy.drop_newest) -> WorkerPool:
+        """
+        Description
+        --
+        Links the channel of every worker of the pool (see `Worker.link_to`).
+
+        Returns
+        --
+        Self, for fluent API.
+        """
+
+        for worker in self.workers:
+            worker.link_to(recipient, channel, policy)
+
+        return self
+
+    def receive(self, job: Any, policy: str = QueuePolicy.drop_newest) -> int:
+        """
+        Description
+        --
+        Receives a job, on the least busy worker (see `Worker.receive`).
+        With `QueuePolicy.latest_only`, on the worker of its source.
+        """
+
+        turn = next(self._turns)
+        workers = self.workers[turn:] + self.workers[:turn]
+
+        if policy != QueuePolicy.latest_only:
+            return min(workers, key=lambda w: w.queue.qsize()).receive(job, policy)
+
+        source_id = untag(job)[1]
+
+        with self._pinned_lock:
+            worker = self._pinned.get(source_id)
+
+            if worker is None:
+                # The worker with the fewest sources
+                pinned = list(self._pinned.values())
+                worker = self._pinned[source_id] = min(workers, key=lambda w: sum(p is w for p in pinned))
+
+        return worker.receive(job, policy)
+
+    def start(self) -> WorkerPool:
+        for worker in self.workers:
+            worker.start()
+
+        return self
+
+    def stop(self) -> WorkerPool:
+        for worker in self.workers:
+            worker.stop()
+
+        return self
+
+    def join(self, timeout: float = None) -> bool:
+        return all([worker.join(timeout) for worker in self.workers])
+
+
+class SourceTag:
+    """
+    The end of a link which tags the jobs sent over it with their
+    source, before passing them on.
+    """
+
+    def __init__(self, recipient: Any, source_id: Any) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - recipient - the worker (or pool) the tagged jobs are passed on to.
+        - source_id - the ID of the source of the jobs.
+        """
+
+        if not recipient:
+            raise ValueError("recipient is required")
+
+        if source_id is None:
+            raise ValueError("source_id is required")
+
+        self.recipient = recipient
+        self.source_id = source_id
+
+    def receive(self, job: Any, policy: str = QueuePolicy.drop_newest) -> int:
+        job, created_at = untag(job)[0], created_at_of(job)
+
+        return self.recipient.receive(TaggedJob(job, self.source_id, created_at), policy)
+
+    def __repr__(self) -> str:
+        return "SourceTag({!r}, {})".format(self.source_id, self.recipient)
+
+
+class SourceRouter:
+    """
+    The end of a link which passes tagged jobs on to the recipients of
+    their source, untagged.
+    """
+
+    def __init__(self) -> None:
+        self._routes = {}  # Recipient and policy pairs, by source ID
+
+    def route(self, source_id: Any, recipient: Any, policy: str = None) -> SourceRouter:
+        """
+        Description
+        --
+        Routes the jobs of a source to a recipient.
+
+        Parameters
+        --
+        - source_id - the ID of the source.
+        - recipient - the worker the jobs are passed on to.
+        - policy - the `QueuePolicy` to apply. If none specified, the one
+        of the link the jobs come over.
+
+        Returns
+        --
+        Self, for fluent API.
+        """
+
+        if policy is not None and policy not in QueuePolicy.all:
+            raise ValueError("Unknown queue policy {}".format(policy))
+
+        self._routes.setdefault(source_id, []).append((recipient, policy))
+
+        return self
+
+    def receive(self, job: Any, policy: str = QueuePolicy.drop_newest) -> int:
+        created_at = created_at_of(job)
+        job, source_id = untag(job)
+        routes = self._routes.get(source_id, [])
+
+        if not routes:
+            # Nobody is interested
+            ring.release(job)
+            return 0
+
+        for _ in routes[1:]:
+            # Every recipient owns a reference
+            ring.retain(job)
+
+        # Still timed, if it was
+        job = tag(job, None, created_at)
+
+        return sum(recipient.receive(job, route_policy or policy) for recipient, route_policy in routes)
+
+    def __repr__(self) -> str:
+        return "SourceRouter({})".format(list(self._routes))
+
+
+def frame_provider(source: Any) -> FrameProvider:
+    """
+    Description
+    --
+    Creates the provider of the frames of a source.
+
+    Parameters
+    --
+    - source - camera index, RTSP or HTTP(S) URL, or video file path.
+    """
+
+    if isinstance(source, int):
+        return PrefetchFrameProvider(CameraFrameProvider(source))
+
+    if source.startswith('rtsp://'):
+        return PrefetchFrameProvider(RtspFrameProvider(source))
+
+    if source.startswith(('http://', 'https://')):
+        return IPCameraFrameProvider(source)
+
+    return PrefetchFrameProvider(VideoFrameProvider(source), drop_frames=False)
+
+
+class MultiCameraPipeline:
+    """
+    The plate pipeline of many cameras. Each camera has its own feed and
+    plate consensus. The object finders and OCR workers are pooled, and
+    the plate lookup is shared.
+
+    Configured with a dictionary (or a JSON file of it):
+
+    >>> {
+    >>>     "classifier": "classifiers/mn_license_plates.xml",
+    >>>     "finders": 2,
+    >>>     "readers": 2,
+    >>>     "cameras": [
+    >>>         {"id": "gate", "source": "rtsp://10.0.0.2/stream"},
+    >>>         {"id": "lobby", "source": 0}
+    >>>     ]
+    >>> }
+
+    The pool sizes default to the number of cameras, up to the number of
+    cores.
+    """
+
+    def __init__(self, config: Any) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - config - the configuration, or the path of its JSON file.
+        """
+
+        if isinstance(config, str):
+            with open(config) as f:
+                config = json.load(f)
+
+        cameras = config.get('cameras')
+        if not cameras:
+            raise ValueError("cameras are required")
+
+        ids = [camera['id'] for camera in cameras]
+        if len(set(ids)) < len(ids):
+            raise ValueError("Camera IDs must be unique")
+
+        cores = os.cpu_count() or 1
+        classifier = config.get('classifier', os.path.join('classifiers', 'mn_license_plates.xml'))
+
+        self._logger = log.get_module_logger(self.__class__.__name__)
+
+        def create_finder():
+            object_finder = ObjectFinder(classifier)
+            object_finder.y_crop_ratio = config.get('y_crop_ratio', 0.25)
+            object_finder.scale = config.get('scale', 1.4)
+            object_finder.min_neighbors = config.get('min_neighbors', 5)
+            object_finder.downscale = config.get('downscale', 1)
+
+            return object_finder
+
+        # A frame per camera is queued, the freshest
+        self.object_finders = WorkerPool(create_finder, config.get('finders', min(len(cameras), cores)), jobs_limit=1)
+        self.ocr = WorkerPool(Ocr, config.get('readers', min(len(cameras), cores)), jobs_limit=5)
+        self.plate_lookup = PlateLookup(
+            jobs_limit=20,
+            registry_url=config.get('registry_url'),
+            cache_file=config.get('cache_file'),
+            hotlist_file=config.get('hotlist_file'))
+
+        # Per camera
+        self.feeds = {}
+        self.consensus = {}
+
+        rectangles = SourceRouter()
+        texts = SourceRouter()
+
+        for camera in cameras:
+            camera_id = camera['id']
+
+            feed = self.feeds[camera_id] = FrameFeed(frame_provider(camera['source']), jobs_limit=60)
+            feed.ring_slots = camera.get('ring_slots', 16)
+            consensus = self.consensus[camera_id] = PlateConsensus(jobs_limit=20)
+
+            # Feed -> Object finders
+            feed.link_to(SourceTag(self.object_finders, camera_id), feed.channel_raw, QueuePolicy.latest_only)
+
+            # Object finders -> Feed (highlight)
+            rectangles.route(camera_id, feed, QueuePolicy.latest_only)
+
+            # OCR -> Consensus -> Plate lookup
+            texts.route(camera_id, consensus)
+            consensus.link_to(SourceTag(self.plate_lookup, camera_id), consensus.channel_plate)
+
+        self.object_finders\
+            .link_to(rectangles, ObjectFinder.channel_object_rectangles)\
+            .link_to(self.ocr, ObjectFinder.channel_object_crops)
+
+        self.ocr.link_to(texts, Ocr.channel_track_text)
+
+        # Plate info, by camera
+        self.plate_infos = SourceRouter()
+        self.plate_lookup.link_to(self.plate_infos, PlateLookup.channel_plate_info)
+
+    def start(self) -> MultiCameraPipeline:
+        """
+        Description
+        --
+        Starts the workers, the recipients first.
+
+        Returns
+        --
+        Self, for fluent API.
+        """
+
+        self._logger.info("Starting {} cameras, {} object finders, {} OCR workers".format(
+            len(self.feeds), len(self.object_finders.workers), len(self.ocr.workers)))
+
+        self.plate_lookup.start()
+
+        for consensus in self.consensus.values():
+            consensus.start()
+
+        self.ocr.start()
+        self.object_finders.start()
+
+        for feed in self.feeds.values():
+            feed.start()
+
+        return self
+
+    def stop(self) -> MultiCameraPipeline:
+        """
+        Description
+        --
+        Stops the workers, the sources first.
+
+        Returns
+        --
+        Self, for fluent API.
+        """
+
+        for feed in self.feeds.values():
+            feed.stop()
+
+        self.object_finders.stop()
+        self.ocr.stop()
+
+        for consensus in self.consensus.values():
+            consensus.stop()
+
+        self.plate_lookup.stop()
+
+        return self
@@ -5,19 +5,359 @@ OCR service.
 """
 
 # System imports
+from collections import Counter, OrderedDict
+import shutil
 import cv2
-import pytesseract
+import numpy as np
 from PIL import Image
-from typing import Any, Dict
+from typing import Any, Dict, List
+
+try:
+    # Optional - can't be installed everywhere (e.g. Termux)
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+try:
+    # Optional - in-process Tesseract API
+    import tesserocr
+except ImportError:
+    tesserocr = None
 
 # Local imports
 from .worker import Worker
 
+# Characters on a license plate
+plate_characters = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+class OcrEngine:
+    """
+    Reads text on pre-processed images.
+    """
+
+    def read(self, image) -> str:
+        """
+        Description
+        --
+        Reads the text on an image.
+
+        Parameters
+        --
+        - image - grayscale image.
+
+        Returns
+        --
+        The text.
+        """
+
+        return ""
+
+    def stop(self) -> None:
+        """
+        Description
+        --
+        Releases the resources of the engine.
+        """
+
+        pass
+
+
+class PytesseractEngine(OcrEngine):
+    """
+    Runs the `tesseract` executable for every image.
+    """
+
+    def __init__(self, language: str = 'eng', whitelist: str = plate_characters) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - language - the Tesseract language.
+        - whitelist - the only characters to recognize.
+        """
+
+        if not pytesseract:
+            raise ValueError("pytesseract is not installed")
+
+        self._config = '--psm 7 -l {} -c tessedit_char_whitelist={}'.format(language, whitelist)
+
+    def read(self, image) -> str:
+        return pytesseract.image_to_string(Image.fromarray(image), config=self._config)
+
+
+class TesserocrEngine(OcrEngine):
+    """
+    Keeps the Tesseract API and its models loaded in the process (see
+    `tesserocr`), instead of running the `tesseract` executable for
+    every image.
+    """
+
+    def __init__(self, language: str = 'eng', whitelist: str = plate_characters) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - language - the Tesseract language.
+        - whitelist - the only characters to recognize.
+        """
+
+        if not tesserocr:
+            raise ValueError("tesserocr is not installed")
+
+        self._language = language
+        self._whitelist = whitelist
+        self._api = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The API stays in its process, it's loaded again where needed
+        state = self.__dict__.copy()
+        state['_api'] = None
+
+        return state
+
+    def read(self, image) -> str:
+        if self._api is None:
+            # Loaded once, on first use
+            self._api = tesserocr.PyTessBaseAPI(lang=self._language, psm=tesserocr.PSM.SINGLE_LINE)
+            self._api.SetVariable('tessedit_char_whitelist', self._whitelist)
+
+        height, width = image.shape[:2]
+        self._api.SetImageBytes(image.tobytes(), width, height, 1, width)
+
+        return self._api.GetUTF8Text()
+
+    def stop(self) -> None:
+        if self._api is not None:
+            self._api.End()
+            self._api = None
+
+
+class KnnEngine(OcrEngine):
+    """
+    Segments the characters with connected components and classifies
+    each one by its k nearest glyphs of a glyph set. Much faster than
+    Tesseract for fixed-font plates, and without dependencies.
+    """
+
+    glyph_size = (20, 30)  # W, H
+
+    def __init__(self, glyphs_file: str = None, k: int = 3, characters: str = plate_characters) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - glyphs_file - `.npz` glyph set, see `save`. If none specified,
+        glyphs are rendered with the built-in fonts.
+        - k - the number of nearest glyphs which vote.
+        - characters - the characters to render, without a glyph set.
+        """
+
+        if k < 1:
+            raise ValueError("k must be positive")
+
+        self.k = k
+
+        # Characters' size relative to the image, to tell them from noise,
+        # frames and bolts. Whatever touches the edges of the image (e.g.
+        # the frame of the plate) is not a character either.
+        self.min_height_ratio = 0.2
+        self.max_height_ratio = 0.95
+        self.max_width_ratio = 0.5
+
+        # Wider than that relative to its height, characters which touch
+        # each other (e.g. 'WW'), split in characters that wide
+        self.max_aspect = 1.1
+        self.split_aspect = 0.9
+
+        if glyphs_file:
+            data = np.load(glyphs_file)
+            self._set_glyphs(data['samples'], data['labels'])
+        else:
+            self._set_glyphs(*self._render_glyphs(characters))
+
+    def _set_glyphs(self, samples, labels) -> None:
+        self._samples = np.asarray(samples, dtype=np.float32).reshape(len(labels), -1)
+        self._labels = np.asarray(labels)
+        self._norms = (self._samples ** 2).sum(axis=1)
+
+    def _normalize(self, glyph) -> np.ndarray:
+        """
+        Description
+        --
+        Scales a glyph (white on black) to the glyph size, as a vector.
+        It's padded to the aspect ratio of the glyph size first, so the
+        glyphs keep theirs (e.g. 'O' is wider than '0').
+        """
+
+        height, width = glyph.shape[:2]
+        glyph_w, glyph_h = self.glyph_size
+
+        padded_w = max(width, int(round(height * glyph_w / glyph_h)))
+        padded_h = max(height, int(round(width * glyph_h / glyph_w)))
+        left = (padded_w - width) // 2
+        top = (padded_h - height) // 2
+        glyph = cv2.copyMakeBorder(glyph, top, padded_h - height - top, left, padded_w - width - left, cv2.BORDER_CONSTANT, value=0)
+
+        return cv2.resize(glyph, self.glyph_size, interpolation=cv2.INTER_AREA).reshape(-1).astype(np.float32) / 255
+
+    def _render_glyphs(self, characters: str):
+        """
+        Description
+        --
+        Renders the characters with the built-in fonts.
+
+        Returns
+        --
+        Tuple of the glyphs and their labels.
+        """
+
+        fonts = (cv2.FONT_HERSHEY_SIMPLEX, cv2.FONT_HERSHEY_DUPLEX, cv2.FONT_HERSHEY_COMPLEX, cv2.FONT_HERSHEY_TRIPLEX)
+        samples = []
+        labels = []
+
+        for font in fonts:
+            for thickness in (1, 2, 3):
+                for character in characters:
+                    canvas = np.zeros((60, 60), dtype=np.uint8)
+                    cv2.putText(canvas, character, (10, 45), font, 1.2, 255, thickness)
+
+                    x, y, w, h = cv2.boundingRect(canvas)
+                    samples.append(self._normalize(canvas[y:y + h, x:x + w]))
+                    labels.append(character)
+
+        return (np.array(samples), np.array(labels))
+
+    def _segment(self, image) -> np.ndarray:
+        """
+        Description
+        --
+        Finds the characters on a pre-processed image (dark on light).
+
+        Returns
+        --
+        The glyphs of the characters, left to right, as a matrix.
+        """
+
+        height, width = image.shape[:2]
+        mask = (image < 128).astype(np.uint8) * 255
+
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        stats = stats[1:]  # Skip the background
+
+        lefts = stats[:, cv2.CC_STAT_LEFT]
+        tops = stats[:, cv2.CC_STAT_TOP]
+        heights = stats[:, cv2.CC_STAT_HEIGHT]
+        widths = stats[:, cv2.CC_STAT_WIDTH]
+        characters = (lefts > 0) & (tops > 0) & (lefts + widths < width) & (tops + heights < height)
+        characters &= (heights >= self.min_height_ratio * height) & (heights <= self.max_height_ratio * height)
+        characters &= widths <= self.max_width_ratio * width
+        stats = stats[characters]
+        stats = stats[np.argsort(stats[:, cv2.CC_STAT_LEFT])]
+
+        glyphs = []
+
+        for x, y, w, h, _ in stats:
+            pieces = max(1, int(round(w / (self.split_aspect * h)))) if w > self.max_aspect * h else 1
+
+            for i in range(pieces):
+                glyphs.append(self._normalize(mask[y:y + h, x + i * w // pieces:x + (i + 1) * w // pieces]))
+
+        return np.array(glyphs, dtype=np.float32).reshape(len(glyphs), self.glyph_size[0] * self.glyph_size[1])
+
+    def read(self, image) -> str:
+        glyphs = self._segment(image)
+
+        if not len(glyphs):
+            return ""
+
+        # Squared distances to every glyph of the set, at once
+        distances = (glyphs ** 2).sum(axis=1)[:, None] + self._norms[None, :] - 2 * glyphs @ self._samples.T
+
+        k = min(self.k, len(self._labels))
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+
+        return "".join(Counter(labels).most_common(1)[0][0] for labels in self._labels[nearest])
+
+    def train(self, images: List[np.ndarray], texts: List[str]) -> int:
+        """
+        Description
+        --
+        Adds the characters of pre-processed plate images to the glyph set.
+        Images where the number of characters found doesn't match the text
+        are skipped.
+
+        Parameters
+        --
+        - images - pre-processed images.
+        - texts - the text on each image.
+
+        Returns
+        --
+        The number of glyphs added.
+        """
+
+        samples = [self._samples]
+        labels = [self._labels]
+
+        for image, text in zip(images, texts):
+            glyphs = self._segment(image)
+
+            if len(glyphs) == len(text):
+                samples.append(glyphs)
+                labels.append(np.array(list(text)))
+
+        added = sum(len(s) for s in samples[1:])
+        self._set_glyphs(np.concatenate(samples), np.concatenate(labels))
+
+        return added
+
+    def save(self, glyphs_file: str) -> None:
+        """
+        Description
+        --
+        Saves the glyph set.
+
+        Parameters
+        --
+        - glyphs_file - the `.npz` file.
+        """
+
+        np.savez_compressed(glyphs_file, samples=self._samples, labels=self._labels)
+
+
+def default_engine() -> OcrEngine:
+    """
+    Description
+    --
+    The in-process Tesseract API if available, otherwise the `tesseract`
+    executable if installed (not only its Python wrapper), otherwise the
+    built-in character classifier.
+    """
+
+    if tesserocr:
+        return TesserocrEngine()
+
+    if pytesseract and shutil.which(pytesseract.pytesseract.tesseract_cmd):
+        return PytesseractEngine()
+
+    return KnnEngine()
+
 
 class Ocr(Worker):
     channel_text = "channel_text"
+    channel_track_text = "channel_track_text"
 
-    def __init__(self, jobs_limit=0):
+    def __init__(self, jobs_limit=0, engine: OcrEngine = None):
         """
         Description
         --
@@ -26,44 +366,197 @@ class Ocr(Worker):
         Parameters
         --
         - jobs_limit - (see base)
+        - engine - the engine which reads the text. If none specified, see
+        `default_engine`.
         """
 
         super().__init__(jobs_limit=jobs_limit)
 
+        self.engine = engine or default_engine()
+
         # Pre-processing settings
+        self.height = 100  # Images are scaled to that height, None to scale 2x
         self.blur = 5
-        self.threshold_block = 11
+        self.threshold_block = 21  # Wider than the strokes, or they come out hollow
         self.threshold_val = 8
 
-    def _pre_process_image(self, img):
+        # Reusable pre-processing buffers, for that many image sizes
+        self.buffers_limit = 16
+        self._buffers = OrderedDict()  # type: OrderedDict[tuple, Dict[str, np.ndarray]]
+
+    def _pre_processing_buffers(self, shape: tuple) -> Dict[str, np.ndarray]:
         """
         Description
         --
-        Pre-processes the image, for better OCR.
+        Gets the reusable buffers for pre-processing a stack of images.
 
         Parameters
         --
-        - img - the image
+        - shape - number, height and width of the (padded) stacked images,
+        then height and width of each once scaled.
+        """
+
+        buffers = self._buffers.pop(shape, None)
+
+        if buffers is None:
+            n, h, w, scaled_h, scaled_w = shape
+            buffers = {
+                'gray': np.empty((n, h, w), dtype=np.uint8),
+                'scaled': np.empty((n * scaled_h, scaled_w), dtype=np.uint8),
+                'blurred': np.empty((n * scaled_h, scaled_w), dtype=np.uint8),
+                'binary': np.empty((n * scaled_h, scaled_w), dtype=np.uint8)
+            }
+
+        # Most recently used last, the least recently used is let go
+        self._buffers[shape] = buffers
+        while len(self._buffers) > self.buffers_limit:
+            self._buffers.popitem(last=False)
+
+        return buffers
+
+    def _pre_process_batch(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Description
+        --
+        Pre-processes same-size images at once, for better OCR. They are
+        converted to grayscale first, then stacked, scaled to `height`,
+        blurred and thresholded as one image, into reusable buffers.
+
+        Parameters
+        --
+        - images - the images, all of the same size.
 
         Returns
         --
-        The processed image.
+        The processed images. They are valid until the next pre-processing
+        of images of that size.
         """
 
-        pre_processed_image = cv2.resize(img, None, fx=2, fy=2, interpolation=cv2.INTER_LINEAR)
+        n = len(images)
+        h, w = images[0].shape[:2]
+
+        # Stacked images are padded with their edge rows, so the filters
+        # don't bleed from one image to another
+        pad = 0 if n == 1 else max(self.blur, self.threshold_block) // 2 + 1
+        tile = h + 2 * pad
+
+        # Scaled to whole pixels per image, so they stay apart
+        scale = self.height / h if self.height else 2
+        scaled_h = int(round(h * scale))
+        scaled_pad = int(round(pad * scale))
+        scaled_tile = scaled_h + 2 * scaled_pad
+        scaled_w = int(round(w * scale))
+
+        buffers = self._pre_processing_buffers((n, tile, w, scaled_tile, scaled_w))
+        gray = buffers['gray']
+
+        for i, image in enumerate(images):
+            if image.ndim == 2:
+                np.copyto(gray[i, pad:pad + h], image)
+            else:
+                cv2.cvtColor(image, cv2.COLOR_RGB2GRAY, dst=gray[i, pad:pad + h])
+
+        if pad:
+            gray[:, :pad] = gray[:, pad:pad + 1]
+            gray[:, pad + h:] = gray[:, pad + h - 1:pad + h]
+
+        pre_processed_image = cv2.resize(
+            gray.reshape(n * tile, w),
+            (scaled_w, n * scaled_tile),
+            dst=buffers['scaled'],
+            interpolation=cv2.INTER_LINEAR)
 
         if self.blur:
-            pre_processed_image = cv2.medianBlur(pre_processed_image, self.blur)
+            pre_processed_image = cv2.medianBlur(pre_processed_image, self.blur, dst=buffers['blurred'])
 
         pre_processed_image = cv2.adaptiveThreshold(
-            cv2.cvtColor(pre_processed_image, cv2.COLOR_RGB2GRAY),
+            pre_processed_image,
             255,
             cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
             cv2.THRESH_BINARY,
             self.threshold_block,
-            self.threshold_val)
+            self.threshold_val,
+            dst=buffers['binary'])
+
+        stacked = pre_processed_image.reshape(n, scaled_tile, scaled_w)
 
-        return pre_processed_image
+        return [stacked[i, scaled_pad:scaled_pad + scaled_h] for i in range(n)]
+
+    def _pre_process_image(self, img):
+        """
+        Description
+        --
+        Pre-processes the image, for better OCR.
+
+        Parameters
+        --
+        - img - the image
+
+        Returns
+        --
+        The processed image. It is valid until the next pre-processing of
+        an image of that size.
+        """
+
+        return self._pre_process_batch([img])[0]
+
+    def read_texts(self, images: List[np.ndarray]) -> List[str]:
+        """
+        Description
+        --
+        Reads the text on images. Same-size images are pre-processed
+        together.
+
+        Parameters
+        --
+        - images - the images.
+
+        Returns
+        --
+        The text on each image.
+        """
+
+        # TODO: The OCR is of very bad quality right now. Improve.
+
+        groups = {}  # type: Dict[tuple, List[int]]
+        for i, image in enumerate(images):
+            groups.setdefault(image.shape, []).append(i)
+
+        texts = [None] * len(images)
+
+        for indices in groups.values():
+            # Pre-processing
+            image_crops = self._pre_process_batch([images[i] for i in indices])
+
+            for i, image_crop in zip(indices, image_crops):
+                # cv2.imshow("ocr", image_crop)
+                # cv2.waitKey(1)
+
+                # Get the text out of the pre-processed plate image
+                texts[i] = self.engine.read(image_crop)
+
+                if texts[i]:
+                    # TODO: Confidence
+                    self._logger.info(texts[i])
+
+        return texts
+
+    def read_text(self, image) -> str:
+        """
+        Description
+        --
+        Reads the text on an image.
+
+        Parameters
+        --
+        - image - the image.
+
+        Returns
+        --
+        The text on the image.
+        """
+
+        return self.read_texts([image])[0]
 
     def _process_input_job(self, input_job: Any) -> Dict[str, Any]:
         """
@@ -73,31 +566,34 @@ class Ocr(Worker):
 
         Parameters
         --
-        - input_job - An image which to OCR.
+        - input_job - An image which to OCR. Or a list of key (track ID
+        or rectangle) and image pairs.
 
         Returns
         --
-        The text on the image.
+        The text on the image. For a list, the key and text pairs.
         """
 
         if input_job is None:
             return
 
-        # TODO: The OCR is of very bad quality right now. Improve.
-
-        # Pre-processing
-        image_crop = self._pre_process_image(input_job)
+        if isinstance(input_job, list):
+            texts = self.read_texts([image for _, image in input_job])
+            texts = [(key, text) for (key, _), text in zip(input_job, texts) if text]
 
-        # cv2.imshow("ocr", image_crop)
-        # cv2.waitKey(1)
+            if texts:
+                return {self.channel_track_text: texts}
+        else:
+            text = self.read_text(input_job)
 
-        # Get the text out of the pre-processed plate image
-        text = pytesseract.image_to_string(
-            Image.fromarray(image_crop),
-            config='--psm 7 -l eng -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+            if text:
+                return {self.channel_text: text}
 
-        if text:
-            # TODO: Confidence
-            self._logger.info(text)
+    def _on_stopped(self) -> None:
+        """
+        Description
+        --
+        Called after the main loop.
+        """
 
-            return {self.channel_text: text}
+        self.engine.stop()
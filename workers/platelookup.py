@@ -5,22 +5,359 @@ License plate lookup.
 """
 
 # System imports
+from concurrent.futures import Future
+import csv
 import functools
-from typing import Any, Dict
+import os
+import re
+import threading
+from typing import Any, Dict, List, Tuple
 
 # Local imports
+from logger import log
+from .cache import SqliteCache, TieredCache, TtlCache
+from .registry import RegistryLookup
 from .worker import Worker
 
 
+def _within_one_edit(a: str, b: str) -> bool:
+    """
+    Description
+    --
+    Whether two strings are at most one insertion, deletion or
+    substitution apart.
+    """
+
+    if abs(len(a) - len(b)) > 1:
+        return False
+
+    if len(a) > len(b):
+        a, b = b, a
+
+    # First difference
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+
+    return a[i:] == b[i + 1:]
+
+
+class _HotlistIndex:
+    """
+    A snapshot of the hotlist. Never modified once published, a reload
+    builds a new one.
+    """
+
+    def __init__(self) -> None:
+        # Plate -> properties
+        self.plates = {}  # type: Dict[str, Dict[str, str]]
+
+        # Canonical plate, and each of its one-deletion variants -> plate,
+        # or tuple of plates if several (most are unique, and a string
+        # costs much less memory than a container)
+        self.variants = {}  # type: Dict[str, Any]
+
+
+class Hotlist:
+    """
+    An in-memory index of the plates of interest (e.g. stolen), loaded
+    from a CSV file. Matches plates exactly, and fuzzily - tolerating
+    the characters OCR confuses (0/O, 1/I, 8/B, ...) and one edit.
+
+    Fuzzy matching is a lookup of precomputed variants (symmetric
+    deletion): every plate is indexed under its canonical form - the
+    confusable characters mapped to one of them - and under each of the
+    forms with one character deleted. A read matches the plates indexed
+    under its own such forms, which are then verified.
+
+    The CSV file has a plate per row, in the first column. If the first
+    row is a header (its first column is "Plate"), the other columns are
+    kept as the properties of the plates.
+    """
+
+    # Characters OCR confuses, mapped to one of them
+    confusions = bytes.maketrans(b'OQDIL|BSZG', b'0001118525')
+
+    def __init__(self, file_path: str) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - file_path - the CSV file of the hotlist.
+        """
+
+        if not file_path:
+            raise ValueError("file_path is required")
+
+        self.file_path = file_path
+
+        # Check the file for changes every N seconds (see `watch`)
+        self.reload_every_s = 60
+
+        self._index = _HotlistIndex()
+        self._modified = None  # Modification time of the loaded file
+        self._logger = log.get_module_logger(self.__class__.__name__)
+        self._reload_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None  # type: threading.Thread
+
+    def __len__(self) -> int:
+        return len(self._index.plates)
+
+    @staticmethod
+    def normalize(plate: str) -> str:
+        """
+        Description
+        --
+        Upper case, plate characters only.
+        """
+
+        return re.sub('[^0-9A-Z]', '', plate.upper())
+
+    @classmethod
+    def canonical(cls, plate: str) -> str:
+        """
+        Description
+        --
+        The plate with the confusable characters mapped to one of them.
+        """
+
+        # Much faster than str.translate
+        return plate.encode('ascii').translate(cls.confusions).decode('ascii')
+
+    @classmethod
+    def _keys(cls, plate: str) -> List[str]:
+        """
+        Description
+        --
+        The canonical form of the plate and its one-deletion variants, each
+        once (deleting either of repeated characters gives the same one).
+        """
+
+        canonical = cls.canonical(plate)
+
+        return list(dict.fromkeys([canonical] + [canonical[:i] + canonical[i + 1:] for i in range(len(canonical))]))
+
+    def _read(self) -> Dict[str, Dict[str, str]]:
+        plates = {}
+
+        with open(self.file_path, newline='') as f:
+            rows = csv.reader(f)
+            names = []
+
+            for number, row in enumerate(rows):
+                if not row:
+                    continue
+
+                if number == 0 and row[0].strip().lower() == 'plate':
+                    names = [n.strip() for n in row[1:]]
+                    continue
+
+                plate = self.normalize(row[0])
+                if plate:
+                    plates[plate] = dict(zip(names, row[1:]))
+
+        return plates
+
+    def load(self) -> bool:
+        """
+        Description
+        --
+        Loads the file if it changed since last loaded. Only the plates
+        added and removed are (re-)indexed, on a copy of the index which
+        is swapped in when done - lookups go on meanwhile, on the
+        previous one.
+
+        Returns
+        --
+        Whether the file was loaded.
+        """
+
+        with self._reload_lock:
+            modified = os.stat(self.file_path).st_mtime_ns
+            if modified == self._modified:
+                return False
+
+            plates = self._read()
+            current = self._index
+
+            added = plates.keys() - current.plates.keys()
+            removed = current.plates.keys() - plates.keys()
+
+            index = _HotlistIndex()
+            index.plates = plates
+
+            if len(added) + len(removed) > len(plates) // 2:
+                # Mostly new, build from scratch
+                current = _HotlistIndex()
+                added = plates.keys()
+                removed = ()
+
+            # The entries are immutable, a shallow copy will do
+            variants = index.variants = dict(current.variants)
+
+            for plate in removed:
+                for key in self._keys(plate):
+                    entry = variants.get(key)
+
+                    if isinstance(entry, str):
+                        if entry == plate:
+                            del variants[key]
+                    elif entry is not None:
+                        entry = tuple(p for p in entry if p != plate)
+
+                        if not entry:
+                            del variants[key]
+                        else:
+                            variants[key] = entry[0] if len(entry) == 1 else entry
+
+            for plate in added:
+                for key in self._keys(plate):
+                    entry = variants.get(key)
+
+                    if entry is None:
+                        variants[key] = plate
+                    elif isinstance(entry, str):
+                        variants[key] = (entry, plate)
+                    else:
+                        variants[key] = entry + (plate,)
+
+            # Atomic
+            self._index = index
+            self._modified = modified
+
+            return True
+
+    def match(self, plate: str) -> Tuple[str, Dict[str, str], bool]:
+        """
+        Description
+        --
+        Looks up a plate.
+
+        Parameters
+        --
+        - plate - the plate number, as read.
+
+        Returns
+        --
+        Tuple of the plate on the hotlist, its properties and whether it
+        matched exactly. None if the plate is not on the hotlist.
+        """
+
+        index = self._index
+        plate = self.normalize(plate)
+
+        properties = index.plates.get(plate)
+        if properties is not None:
+            return (plate, properties, True)
+
+        keys = self._keys(plate)
+        canonical = keys[0]
+        best = None
+
+        for key in keys:
+            entry = index.variants.get(key, ())
+
+            for candidate in (entry,) if isinstance(entry, str) else entry:
+                candidate_canonical = self.canonical(candidate)
+
+                if candidate_canonical == canonical:
+                    # Only confused characters, the best match
+                    return (candidate, index.plates[candidate], False)
+
+                if best is None and _within_one_edit(candidate_canonical, canonical):
+                    best = candidate
+
+        if best is not None:
+            return (best, index.plates[best], False)
+
+    def watch(self) -> None:
+        """
+        Description
+        --
+        Loads the file, and reloads it when it changes, from a background
+        thread.
+        """
+
+        self.load()
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch, name="Hotlist", daemon=True)
+        self._thread.start()
+
+    def _watch(self) -> None:
+        while not self._stop_event.wait(self.reload_every_s):
+            try:
+                if self.load():
+                    self._logger.info("Reloaded {} plates".format(len(self)))
+            except Exception:
+                # The previous hotlist is kept
+                self._logger.error("Reloading failed", exc_info=True)
+
+    def stop(self) -> None:
+        """
+        Description
+        --
+        Stops watching the file.
+        """
+
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
 class PlateLookup(Worker):
     channel_plate_info = "channel_plate_info"
 
-    @functools.lru_cache
+    def __init__(self, jobs_limit=0, registry_url: str = None, cache_file: str = None, hotlist_file: str = None) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - jobs_limit - (see base)
+        - registry_url - the URL of the plate registry (see
+        `RegistryLookup`). If none specified, plates are not looked up
+        remotely.
+        - cache_file - the SQLite file the looked up plates are cached in
+        too, to be kept across restarts and shared by processes (see
+        `SqliteCache`). If none specified, they are cached in memory only.
+        - hotlist_file - the CSV file of the plates of interest (see
+        `Hotlist`). Plates matching it are reported stolen. It's reloaded
+        when it changes.
+        """
+
+        super().__init__(jobs_limit=jobs_limit)
+
+        # Looked up plates, unknown plates included
+        self.cache = TtlCache(size=10000, ttl_s=3600, negative_ttl_s=300)
+
+        if cache_file:
+            self.cache = TieredCache(self.cache, SqliteCache(cache_file))
+
+        # Log the cache hit rate every N lookups
+        self.cache_log_every = 1000
+
+        self._lookups_count = 0
+
+        self._registry = RegistryLookup(registry_url) if registry_url else None
+        self.hotlist = Hotlist(hotlist_file) if hotlist_file else None
+
     def _lookup(self, plate: str) -> Dict[str, Any]:
         """
         Description
         --
-        Cached lookup
+        Local lookup, when there is no registry.
 
         Parameters
         --
@@ -36,26 +373,200 @@ class PlateLookup(Worker):
 
         # TODO: Lookup and populate
         return {
+            "Plate": plate,
             "Stolen": False,
             "VIN": "Whatever VIN",
             "Year": 2005
         }
 
+    def lookup(self, plate: str) -> Dict[str, Any]:
+        """
+        Description
+        --
+        Looks up a plate, as the worker does, but waiting for the registry
+        if the plate is looked up there (it must be started). For direct
+        use, e.g. offline.
+
+        Parameters
+        --
+        - plate - the plate number.
+
+        Returns
+        --
+        The plate info, None if the plate is unknown.
+        """
+
+        if not plate:
+            raise ValueError("plate is required")
+
+        cached, info = self.cache.get(plate)
+
+        if not cached:
+            if self._registry:
+                info = self._registry.lookup(plate).result()
+
+                if info is not None:
+                    info = dict(info, Plate=plate)
+            else:
+                info = self._lookup(plate)
+
+            self.cache.put(plate, info)
+
+        return self._check_hotlist(plate, info)
+
+    def _check_hotlist(self, plate: str, info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Description
+        --
+        Matches the plate against the hotlist. Not cached, as the hotlist
+        changes.
+
+        Parameters
+        --
+        - plate - the plate number.
+        - info - the plate info, None if the plate is unknown.
+
+        Returns
+        --
+        The plate info, marked stolen if the plate is on the hotlist.
+        """
+
+        match = self.hotlist.match(plate) if self.hotlist else None
+
+        if match is None:
+            return info
+
+        hotlist_plate, properties, exact = match
+
+        # The cached info is left as is
+        return dict(info or {"Plate": plate}, Stolen=True, Hotlist=dict(properties, Plate=hotlist_plate, Exact=exact))
+
+    def _on_looked_up(self, plate: str, job: Any, listed: bool, future: Future) -> None:
+        """
+        Description
+        --
+        Called when the registry responds. Caches and publishes the info,
+        tagged as the job it was looked up for (e.g. with its camera), and
+        in a list if the job was a list of plates - as cached infos are.
+
+        Parameters
+        --
+        - plate - the plate number.
+        - job - the job the plate was looked up for, tagged or not.
+        - listed - whether the job was a list of plates.
+        - future - the future of the plate info.
+        """
+
+        try:
+            info = future.result()
+        except Exception:
+            # Not cached, will be looked up again
+            self._logger.error("Looking up {} failed".format(plate), exc_info=True)
+
+            # Still, the hotlist is known
+            info = self._check_hotlist(plate, None)
+            if info is not None:
+                self._publish_results(self._tag_results(job, {self.channel_plate_info: [info] if listed else info}))
+
+            return
+
+        if info is not None:
+            info = dict(info, Plate=plate)
+
+        self.cache.put(plate, info)
+        info = self._check_hotlist(plate, info)
+
+        if info is not None:
+            self._publish_results(self._tag_results(job, {self.channel_plate_info: [info] if listed else info}))
+
     def _process_input_job(self, input_job: Any) -> Dict[str, Any]:
         """
         Description
         --
-        Looks up a plate number.
+        Looks up a plate number. Plates which are not cached and are looked
+        up in the registry are published when the registry responds, one by
+        one - in a list of one if the job is a list.
 
         Parameters
         --
-        - input_job - license plate number to lookup.
+        - input_job - license plate number to lookup, or a list of them.
 
         Returns
         --
-        License plate info.
+        License plate info, or a list of them.
         """
 
-        if input_job:
-            info = self._lookup(input_job)
-            return {self.channel_plate_info: info}
+        if not input_job:
+            return
+
+        infos = []
+
+        for plate in input_job if isinstance(input_job, list) else [input_job]:
+            if not plate:
+                continue
+
+            cached, info = self.cache.get(plate)
+
+            self._lookups_count += 1
+            if self.cache_log_every and self._lookups_count % self.cache_log_every == 0:
+                self._log_cache_stats()
+
+            if not cached:
+                if self._registry:
+                    # Published when looked up
+                    self._registry.lookup(plate).add_done_callback(functools.partial(self._on_looked_up, plate, self._job, isinstance(input_job, list)))
+                    continue
+
+                info = self._lookup(plate)
+                self.cache.put(plate, info)
+
+            info = self._check_hotlist(plate, info)
+
+            if info is not None:
+                infos.append(info)
+
+        if infos:
+            return {self.channel_plate_info: infos if isinstance(input_job, list) else infos[0]}
+
+    def _log_cache_stats(self) -> None:
+        hits, misses = self.cache.hits, self.cache.misses
+        lookups = hits + misses
+
+        if lookups:
+            self._logger.info("Cache hit rate {:.1%} ({} of {} lookups)".format(hits / lookups, hits, lookups))
+
+    def _on_starting(self) -> None:
+        """
+        Description
+        --
+        Called before the main loop.
+        """
+
+        if isinstance(self.cache, TieredCache):
+            # Warm start
+            self._logger.info("Cache has {} plates".format(len(self.cache)))
+
+        if self.hotlist:
+            self.hotlist.watch()
+            self._logger.info("Hotlist has {} plates".format(len(self.hotlist)))
+
+        if self._registry:
+            self._registry.start()
+
+    def _on_stopped(self) -> None:
+        """
+        Description
+        --
+        Called after the main loop.
+        """
+
+        if self._registry:
+            self._registry.stop()
+
+        if self.hotlist:
+            self.hotlist.stop()
+
+        self._log_cache_stats()
+
+        if isinstance(self.cache, TieredCache):
+            self.cache.close()
@@ -0,0 +1,317 @@
+"""
+Description
+--
+Process pool execution backend for workers. Jobs are processed in
+separate processes, to escape the GIL. Images are handed over through
+shared memory, instead of being pickled.
+"""
+
+# System imports
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
+import threading
+import time
+from typing import Any, Dict
+
+# 3rd party imports
+import numpy as np
+
+# Local imports
+from .job import untag
+
+# The worker instance living in a pool process
+_process_worker = None
+
+
+class SharedArray:
+    """
+    Picklable handle of an ndarray which lives in shared memory.
+    """
+
+    def __init__(self, name: str, shape: tuple, dtype: str) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - name - the name of the shared memory block.
+        - shape - the shape of the array.
+        - dtype - the dtype of the array.
+        """
+
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    def attach(self):
+        """
+        Description
+        --
+        Attaches to the shared memory block. Call from the pool process.
+
+        Returns
+        --
+        Tuple of the shared memory block and an ndarray view on it. The
+        block must be closed once the view is no longer used.
+        """
+
+        # Spawned pool processes share the resource tracker of the parent,
+        # which owns the block - attaching doesn't transfer ownership.
+        shm = shared_memory.SharedMemory(name=self.name)
+
+        return (shm, np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf))
+
+
+class SharedMemoryPool:
+    """
+    A pool of reusable shared memory blocks, so a block isn't
+    created and destroyed for every job.
+    """
+
+    def __init__(self) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+        """
+
+        self._lock = threading.Lock()
+        self._free = []  # Shared memory blocks to reuse
+        self._all = []
+
+    def share(self, array: np.ndarray):
+        """
+        Description
+        --
+        Copies the array in a shared memory block.
+
+        Parameters
+        --
+        - array - the array to share.
+
+        Returns
+        --
+        Tuple of the shared memory block and the picklable handle.
+        """
+
+        with self._lock:
+            # The smallest free block which fits
+            fitting = [b for b in self._free if b.size >= array.nbytes]
+            if fitting:
+                shm = min(fitting, key=lambda b: b.size)
+                self._free.remove(shm)
+            else:
+                shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                self._all.append(shm)
+
+        np.copyto(np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf), array)
+
+        return (shm, SharedArray(shm.name, array.shape, array.dtype.str))
+
+    def release(self, shm: shared_memory.SharedMemory) -> None:
+        """
+        Description
+        --
+        Returns a block to the pool.
+
+        Parameters
+        --
+        - shm - the block.
+        """
+
+        with self._lock:
+            self._free.append(shm)
+
+    def close(self) -> None:
+        """
+        Description
+        --
+        Destroys all blocks.
+        """
+
+        with self._lock:
+            for shm in self._all:
+                shm.close()
+                shm.unlink()
+
+            self._all = []
+            self._free = []
+
+
+def _init_process(worker: Any) -> None:
+    """
+    Description
+    --
+    Pool process initializer.
+
+    Parameters
+    --
+    - worker - a copy of the worker whose jobs are processed.
+    """
+
+    global _process_worker
+    _process_worker = worker
+
+
+def _process_in_process(job: Any) -> Dict[str, Any]:
+    """
+    Description
+    --
+    Processes a job in the pool process.
+
+    Parameters
+    --
+    - job - the job. Shared arrays, top-level or in a tuple/list,
+    are attached.
+
+    Returns
+    --
+    Results of the worker. Results never refer to the shared memory.
+    """
+
+    blocks = []
+
+    def attach(item):
+        if isinstance(item, SharedArray):
+            shm, view = item.attach()
+            blocks.append((shm, view))
+            return view
+        return item
+
+    try:
+        if isinstance(job, (tuple, list)):
+            job = type(job)(attach(j) for j in job)
+        else:
+            job = attach(job)
+
+        results = _process_worker._process_input_job(job)
+
+        if results:
+            for channel, result in results.items():
+                if isinstance(result, np.ndarray) and any(np.may_share_memory(result, v) for _, v in blocks):
+                    # Don't leak views of the shared memory
+                    results[channel] = result.copy()
+
+        return results
+    finally:
+        job = None
+        for shm, _ in blocks:
+            shm.close()
+
+
+class ProcessPoolBackend:
+    """
+    Executes the jobs of a worker in a pool of processes.
+    """
+
+    def __init__(self, worker: Any, processes: int) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - worker - the worker whose jobs to process. It has to be
+        picklable.
+        - processes - the number of processes.
+        """
+
+        if processes < 1:
+            raise ValueError("processes must be positive")
+
+        self._worker = worker
+        self._processes = processes
+        self._executor = None  # type: ProcessPoolExecutor
+        self._memory = None  # type: SharedMemoryPool
+
+        # Bounds the number of jobs in flight
+        self._slots = threading.BoundedSemaphore(processes * 2)
+
+    def start(self) -> None:
+        """
+        Description
+        --
+        Starts the processes.
+        """
+
+        self._memory = SharedMemoryPool()
+        # Spawned, not forked - forking a process with running threads is unsafe
+        self._executor = ProcessPoolExecutor(
+            max_workers=self._processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_process,
+            initargs=(self._worker,))
+
+    def submit(self, job: Any) -> None:
+        """
+        Description
+        --
+        Submits a job for processing. Blocks while all processes are busy.
+        Results are published by the worker, as they complete.
+
+        Parameters
+        --
+        - job - the job to process. A `TaggedJob` is processed untagged,
+        its results are tagged.
+        """
+
+        tagged_job, (job, _) = job, untag(job)
+        blocks = []
+
+        def share(item):
+            if isinstance(item, np.ndarray):
+                shm, handle = self._memory.share(item)
+                blocks.append(shm)
+                return handle
+            return item
+
+        if isinstance(job, (tuple, list)):
+            job = type(job)(share(j) for j in job)
+        else:
+            job = share(job)
+
+        self._slots.acquire()
+
+        def done(future: Future) -> None:
+            for shm in blocks:
+                self._memory.release(shm)
+            self._slots.release()
+
+            try:
+                results = future.result()
+
+                if self._worker.metrics:
+                    self._worker._observe([tagged_job], submitted)
+
+                self._worker._publish_results(self._worker._tag_results(tagged_job, results))
+            except Exception:
+                self._worker._logger.error("Fatal error processing a job in the process pool", exc_info=True)
+
+        submitted = time.monotonic()
+
+        try:
+            self._executor.submit(_process_in_process, job).add_done_callback(done)
+        except Exception:
+            for shm in blocks:
+                self._memory.release(shm)
+            self._slots.release()
+            raise
+
+    def stop(self) -> None:
+        """
+        Description
+        --
+        Waits for the jobs in flight and stops the processes.
+        """
+
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        if self._memory:
+            self._memory.close()
+            self._memory = None
@@ -0,0 +1,285 @@
+"""
+Description
+--
+Asynchronous client of a plate registry, over HTTP.
+
+The registry is expected to take a POST of a JSON body
+`{"plates": ["ABC123", ...]}` and to respond with a JSON object of the
+info of each plate, `{"ABC123": {...}, ...}` - null or missing for
+unknown plates.
+"""
+
+# System imports
+import asyncio
+from concurrent.futures import Future
+import json
+import ssl
+import threading
+from typing import Any, Dict, List
+from urllib.parse import urlsplit
+
+
+class HttpConnectionPool:
+    """
+    A pool of keep-alive HTTP/1.1 connections to one host.
+    """
+
+    def __init__(self, url: str, size: int = 4) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - url - the URL requests are sent to.
+        - size - the maximum number of connections.
+        """
+
+        parts = urlsplit(url)
+
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError("Unsupported URL {}".format(url))
+
+        self._host = parts.hostname
+        self._port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self._path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        self._ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+
+        self._idle = []  # type: List[tuple]
+        self._slots = asyncio.Semaphore(size)
+
+    async def _read_response(self, reader: asyncio.StreamReader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed")
+
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if not size:
+                    await reader.readline()
+                    break
+
+                body += await reader.readexactly(size)
+                await reader.readline()
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            headers['connection'] = 'close'
+
+        return (status, headers, body)
+
+    async def post(self, body: bytes) -> bytes:
+        """
+        Description
+        --
+        Sends a POST request, on an idle connection if there is one.
+
+        Parameters
+        --
+        - body - the JSON body.
+
+        Returns
+        --
+        The response body.
+        """
+
+        request = (
+            'POST {} HTTP/1.1\r\n'
+            'Host: {}\r\n'
+            'Content-Type: application/json\r\n'
+            'Content-Length: {}\r\n'
+            'Connection: keep-alive\r\n'
+            '\r\n').format(self._path, self._host, len(body)).encode('latin-1') + body
+
+        async with self._slots:
+            # An idle connection may have been closed by the server, then
+            # a new one is tried
+            for reused in (True, False):
+                if reused and not self._idle:
+                    continue
+
+                reader, writer = self._idle.pop() if reused else await asyncio.open_connection(self._host, self._port, ssl=self._ssl)
+
+                try:
+                    writer.write(request)
+                    await writer.drain()
+                    status, headers, response = await self._read_response(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+
+                    if reused:
+                        continue
+
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+
+                if headers.get('connection', '').lower() == 'close':
+                    writer.close()
+                else:
+                    self._idle.append((reader, writer))
+
+                if status != 200:
+                    raise ConnectionError("Registry responded with {}".format(status))
+
+                return response
+
+    def close(self) -> None:
+        """
+        Description
+        --
+        Closes the idle connections.
+        """
+
+        for _, writer in self._idle:
+            writer.close()
+
+        self._idle = []
+
+
+class RegistryLookup:
+    """
+    Looks up plates in the registry, from an asyncio loop on its own
+    thread. Lookups of a plate already in flight share the request,
+    and plates looked up together are sent in a single request.
+    """
+
+    def __init__(self, url: str, connections: int = 4, batch_size: int = 32, batch_window_s: float = 0.01, timeout_s: float = 5) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - url - the URL of the registry.
+        - connections - the maximum number of connections to the registry.
+        - batch_size - the maximum number of plates per request.
+        - batch_window_s - for how long plates are collected, before a
+        request is sent.
+        - timeout_s - the request timeout.
+        """
+
+        if not url:
+            raise ValueError("url is required")
+
+        self._url = url
+        self._connections = connections
+        self.batch_size = batch_size
+        self.batch_window_s = batch_window_s
+        self.timeout_s = timeout_s
+
+        self._loop = None  # type: asyncio.AbstractEventLoop
+        self._thread = None  # type: threading.Thread
+        self._pool = None  # type: HttpConnectionPool
+        self._in_flight = {}  # type: Dict[str, asyncio.Future]
+        self._pending = []  # type: List[str]
+        self._flush_handle = None  # type: asyncio.TimerHandle
+
+    def start(self) -> None:
+        """
+        Description
+        --
+        Starts the loop.
+        """
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="RegistryLookup", daemon=True)
+        self._thread.start()
+
+        async def create_pool():
+            # Belongs to the loop
+            self._pool = HttpConnectionPool(self._url, self._connections)
+
+        asyncio.run_coroutine_threadsafe(create_pool(), self._loop).result()
+
+    def lookup(self, plate: str) -> Future:
+        """
+        Description
+        --
+        Looks up a plate. Thread-safe.
+
+        Parameters
+        --
+        - plate - the plate number.
+
+        Returns
+        --
+        Future of the plate info, None if the plate is unknown.
+        """
+
+        return asyncio.run_coroutine_threadsafe(self._lookup(plate), self._loop)
+
+    async def _lookup(self, plate: str) -> Dict[str, Any]:
+        future = self._in_flight.get(plate)
+
+        if future is None:
+            # Not in flight, queue it for the next request
+            future = self._in_flight[plate] = self._loop.create_future()
+            self._pending.append(plate)
+
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = self._loop.call_later(self.batch_window_s, self._flush)
+
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        plates, self._pending = self._pending, []
+
+        if plates:
+            self._loop.create_task(self._send(plates))
+
+    async def _send(self, plates: List[str]) -> None:
+        try:
+            body = json.dumps({'plates': plates}).encode('utf-8')
+            response = await asyncio.wait_for(self._pool.post(body), self.timeout_s)
+            infos = json.loads(response)
+
+            for plate in plates:
+                self._in_flight.pop(plate).set_result(infos.get(plate))
+        except Exception as e:
+            for plate in plates:
+                future = self._in_flight.pop(plate, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+
+    def stop(self) -> None:
+        """
+        Description
+        --
+        Stops the loop and closes the connections.
+        """
+
+        if self._loop is None:
+            return
+
+        async def close_pool():
+            self._pool.close()
+
+        asyncio.run_coroutine_threadsafe(close_pool(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
@@ -0,0 +1,193 @@
+"""
+Description
+--
+Preallocated ring of frames, shared between a producer and its
+subscribers without copying.
+"""
+
+# System imports
+from collections import deque
+import threading
+from typing import Any, List
+
+# 3rd party imports
+import numpy as np
+
+# Local imports
+from .job import TaggedJob
+
+
+class RingFrame(np.ndarray):
+    """
+    A frame living in a slot of a `FrameRing`. It is an ndarray, so
+    subscribers use it as any other image. Every holder of the frame
+    owns a reference, which it must release when done with it. The slot
+    is recycled once all references are released.
+
+    Arrays derived from the frame (slices, copies) don't own references.
+    """
+
+    def __array_finalize__(self, obj) -> None:
+        # Sequence number of the frame in the ring
+        self.sequence = getattr(obj, 'sequence', None)
+
+        # Only the frame handed out by the ring owns the slot
+        self._ring = None
+        self._slot = None
+
+    def retain(self) -> None:
+        """
+        Description
+        --
+        Takes a reference to the frame.
+        """
+
+        if self._ring is not None:
+            self._ring._retain(self._slot, self.sequence)
+
+    def release(self) -> None:
+        """
+        Description
+        --
+        Releases a reference to the frame.
+        """
+
+        if self._ring is not None:
+            self._ring._release(self._slot, self.sequence)
+
+
+class FrameRing:
+    """
+    A fixed number of preallocated, reference-counted frame slots.
+    """
+
+    def __init__(self, slots: int, shape: tuple, dtype: np.dtype) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - slots - the number of frames in the ring.
+        - shape - the shape of a frame.
+        - dtype - the dtype of a frame.
+        """
+
+        if slots < 1:
+            raise ValueError("slots must be positive")
+
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+        self._buffer = np.empty((slots,) + self.shape, dtype=self.dtype)
+        self._references = [0] * slots  # Holders of each slot
+        self._sequences = [0] * slots  # Sequence number of the frame in each slot
+        self._free = deque(range(slots))  # Indices of the free slots
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def fits(self, frame: np.ndarray) -> bool:
+        """
+        Description
+        --
+        Checks if a frame fits in the slots of the ring.
+
+        Parameters
+        --
+        - frame - the frame.
+        """
+
+        return frame.shape == self.shape and frame.dtype == self.dtype
+
+    def acquire(self) -> RingFrame:
+        """
+        Description
+        --
+        Takes a free slot. The caller owns the only reference and may
+        write into the frame, before publishing it.
+
+        Returns
+        --
+        The writable frame, or None if all slots are in use.
+        """
+
+        with self._lock:
+            if not self._free:
+                return None
+
+            slot = self._free.popleft()
+            self._references[slot] = 1
+            self._sequence += 1
+            sequence = self._sequence
+            self._sequences[slot] = sequence
+
+        frame = self._buffer[slot].view(RingFrame)
+        frame.sequence = sequence
+        frame._ring = self
+        frame._slot = slot
+
+        return frame
+
+    def _retain(self, slot: int, sequence: int) -> None:
+        with self._lock:
+            if self._sequences[slot] == sequence and self._references[slot]:
+                self._references[slot] += 1
+
+    def _release(self, slot: int, sequence: int) -> None:
+        with self._lock:
+            if self._sequences[slot] != sequence or self._references[slot] <= 0:
+                # Stale frame, the slot has been recycled
+                return
+
+            self._references[slot] -= 1
+
+            if not self._references[slot]:
+                # Recycle the slot
+                self._free.append(slot)
+
+
+def _frames(job: Any) -> List[RingFrame]:
+    if isinstance(job, TaggedJob):
+        job = job.job
+
+    if isinstance(job, RingFrame):
+        return [job]
+
+    if isinstance(job, (tuple, list)):
+        return [j for j in job if isinstance(j, RingFrame)]
+
+    return []
+
+
+def retain(job: Any) -> None:
+    """
+    Description
+    --
+    Takes a reference to the ring frames of a job - the job itself, or
+    the items of a tuple/list job, tagged or not.
+
+    Parameters
+    --
+    - job - the job.
+    """
+
+    for frame in _frames(job):
+        frame.retain()
+
+
+def release(job: Any) -> None:
+    """
+    Description
+    --
+    Releases a reference to the ring frames of a job - the job itself, or
+    the items of a tuple/list job, tagged or not.
+
+    Parameters
+    --
+    - job - the job.
+    """
+
+    for frame in _frames(job):
+        frame.release()
@@ -0,0 +1,325 @@
+"""
+Description
+--
+Tracks objects across frames, so they are detected once and followed,
+instead of re-detected on every frame.
+"""
+
+# System imports
+from typing import Any, Dict, List
+
+# 3rd party imports
+import numpy as np
+from numpy import ndarray
+
+# Local imports
+from .classifier import ObjectFinder
+from .geometry import iou, nms
+from .job import untag
+from .worker import QueuePolicy, Worker
+
+
+class Track:
+    """
+    An object followed across frames.
+    """
+
+    def __init__(self, track_id: int, rectangle: ndarray) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - track_id - the unique ID of the track.
+        - rectangle - X, Y, W, H of the object.
+        """
+
+        self.track_id = track_id
+        self.rectangle = np.asarray(rectangle, dtype=np.float32)
+        self.velocity = np.zeros(2, dtype=np.float32)  # X, Y per frame
+        self.hits = 1       # Frames in which the object was detected
+        self.misses = 0     # Consecutive frames in which the object was not detected
+        self.crops_sent = 0  # Crops sent for OCR
+
+    def predict(self) -> ndarray:
+        """
+        Description
+        --
+        Predicts where the object is on the next frame, assuming constant
+        velocity.
+        """
+
+        predicted = self.rectangle.copy()
+        predicted[:2] += self.velocity
+
+        return predicted
+
+    def update(self, rectangle: ndarray) -> None:
+        """
+        Description
+        --
+        Updates the track with the object detected on the current frame.
+
+        Parameters
+        --
+        - rectangle - X, Y, W, H of the object.
+        """
+
+        rectangle = np.asarray(rectangle, dtype=np.float32)
+
+        # Smoothed velocity
+        self.velocity = 0.5 * self.velocity + 0.5 * (rectangle[:2] - self.rectangle[:2])
+        self.rectangle = rectangle
+        self.hits += 1
+        self.misses = 0
+
+    def highlight(self) -> tuple:
+        """
+        Description
+        --
+        The rectangle around the object, as a pair of corners.
+        """
+
+        x, y, w, h = (int(v) for v in self.rectangle)
+
+        return ((x, y), (x + w, y + h))
+
+
+class ObjectTracker(Worker):
+    channel_tracks = 'channel_tracks'
+    channel_track_crops = 'channel_track_crops'
+    channel_object_rectangle = ObjectFinder.channel_object_rectangle
+    channel_object_rectangles = ObjectFinder.channel_object_rectangles
+
+    def __init__(self, object_finder: ObjectFinder, jobs_limit=0) -> None:
+        """
+        Description
+        --
+        Initializes the instance.
+
+        Parameters
+        --
+        - object_finder - the finder which detects the objects. It is used
+        by the tracker directly, not started as a worker.
+        - jobs_limit - (see base)
+        """
+
+        super().__init__(jobs_limit=jobs_limit)
+
+        if not object_finder:
+            raise ValueError("object_finder is required")
+
+        self._object_finder = object_finder
+
+        # Run a full detection every N frames, or when a track is lost.
+        # In between, tracks are only searched for around where they are
+        # predicted to be.
+        self.detect_every = 10
+
+        # How much larger than the predicted rectangle is the area searched
+        # for a tracked object, as a ratio of its size, on every side.
+        self.search_margin = 0.5
+
+        # Minimum overlap of a detection and a track, to be considered
+        # the same object.
+        self.iou_threshold = 0.3
+
+        # For how many frames a track is kept without being detected
+        self.max_misses = 5
+
+        # How many crops of each track are sent for OCR
+        self.crops_per_track = 3
+
+        self._tracks = []  # type: List[Track]
+        self._settled_track_ids = set()
+        self._next_track_id = 1
+        self._frames_count = 0
+        self._track_lost = False
+
+    def _detect(self, frame: ndarray, regions: ndarray = None) -> ndarray:
+        """
+        Description
+        --
+        Detects the objects on the frame, within the regions if any.
+
+        Returns
+        --
+        Nx4 array of X, Y, W, H rectangles.
+        """
+
+        if regions is None:
+            detections = self._object_finder.detect_batch([frame])
+        else:
+            detections = self._object_finder.detect_regions(frame, regions)
+
+        rectangles = np.stack([detections['x'], detections['y'], detections['w'], detections['h']], axis=1)
+
+        # Search regions may overlap, keep the most confident of the same detections
+        return rectangles[nms(rectangles, detections['score'], 0.5)]
+
+    def _search_regions(self) -> ndarray:
+        """
+        Description
+        --
+        The areas around the predicted positions of the tracks.
+        """
+
+        regions = np.array([t.predict() for t in self._tracks], dtype=np.float32).reshape(-1, 4)
+        margin = regions[:, 2:] * self.search_margin
+        regions[:, :2] -= margin
+        regions[:, 2:] += 2 * margin
+
+        return regions.astype(np.int32)
+
+    def _associate(self, detections: ndarray) -> List[Track]:
+        """
+        Description
+        --
+        Matches the detections to the tracks, greedily by overlap with
+        the predicted positions. Unmatched detections start new tracks.
+
+        Returns
+        --
+        The tracks matched or created on this frame.
+        """
+
+        predicted = np.array([t.predict() for t in self._tracks], dtype=np.float32).reshape(-1, 4)
+        overlaps = iou(predicted, detections)
+
+        matched_tracks = set()
+        matched_detections = set()
+        updated = []
+
+        # Best overlaps first
+        for flat in np.argsort(overlaps, axis=None)[::-1]:
+            t, d = np.unravel_index(flat, overlaps.shape)
+
+            if overlaps[t, d] < self.iou_threshold:
+                break
+
+            if t in matched_tracks or d in matched_detections:
+                continue
+
+            matched_tracks.add(t)
+            matched_detections.add(d)
+            self._tracks[t].update(detections[d])
+            updated.append(self._tracks[t])
+
+        for t, track in enumerate(self._tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+                track.rectangle = track.predict()
+
+        for d, detection in enumerate(detections):
+            if d not in matched_detections:
+                track = Track(self._next_track_id, detection)
+                self._next_track_id += 1
+                self._tracks.append(track)
+                updated.append(track)
+
+        # Forget the lost tracks
+        alive = [t for t in self._tracks if t.misses <= self.max_misses]
+        self._track_lost = len(alive) < len(self._tracks)
+
+        for track in self._tracks:
+            if track.misses > self.max_misses:
+                self._settled_track_ids.discard(track.track_id)
+
+        self._tracks = alive
+
+        return updated
+
+    def _process_input_job(self, input_job: Any) -> Dict[str, Any]:
+        """
+        Description
+        --
+        Tracks the objects on the frame.
+
+        Parameters
+        --
+        - input_job - the frame. Or a tuple of the frame and the regions
+        of it to search in.
+
+        Returns
+        --
+        The tracks (list of ID and rectangle), the crops of the detected
+        tracks which are still due to be OCR-ed (list of ID and crop) and
+        the rectangle of the most recently detected object.
+        """
+
+        if input_job is None:
+            return
+
+        frame, regions = input_job if isinstance(input_job, tuple) else (input_job, None)
+        self._frames_count += 1
+
+        full_detection = not self.detect_every or self._frames_count % self.detect_every == 0 or self._track_lost
+
+        if full_detection:
+            detections = self._detect(frame, regions)
+        elif self._tracks:
+            # Only around the tracked objects
+            detections = self._detect(frame, self._search_regions())
+        else:
+            # Nothing to track until the next full detection
+            return
+
+        updated = self._associate(detections)
+
+        # Crops of the tracks which are not read yet
+        crops = []
+        for track in updated:
+            if track.crops_sent < self.crops_per_track and track.track_id not in self._settled_track_ids:
+                track.crops_sent += 1
+                x, y, w, h = self._object_finder._compute_safe_region(frame.shape, [int(v) for v in track.rectangle])
+                crops.append((track.track_id, frame[y:y + h, x:x + w].copy()))
+
+        return {
+            # Tracks channel - ID and rectangle of every track
+            self.channel_tracks: [(t.track_id, t.highlight()) for t in self._tracks],
+
+            # Track crops channel - ID and crop of tracks to OCR
+            self.channel_track_crops: crops or None,
+
+            # Rectangle channel - the most recently detected object
+            self.channel_object_rectangle: updated[-1].highlight() if updated else None,
+
+            # Rectangles channel - the objects detected on this frame
+            self.channel_object_rectangles: [t.highlight() for t in updated] or None
+        }
+
+    def receive(self, job, policy: str = QueuePolicy.drop_newest) -> int:
+        """
+        Description
+        --
+        Receive input job. A list job is of the IDs of the tracks which
+        have been read with confidence (see `PlateConsensus`), their crops
+        are not sent anymore. It's taken immediately, not queued behind
+        the frames.
+
+        Parameters
+        --
+        - job - the received input job.
+        - policy - (see base)
+        """
+
+        track_ids, _ = untag(job)
+
+        if isinstance(track_ids, list):
+            self._settled_track_ids.update(track_ids)
+            return 0
+
+        return super().receive(job, policy)
+
+    def _on_starting(self) -> None:
+        """
+        Description
+        --
+        Called before the main loop.
+        """
+
+        self._tracks = []
+        self._frames_count = 0
+        self._track_lost = False
@@ -7,13 +7,119 @@ Module providing threading.
 from __future__ import annotations
 
 # System imports
+from collections import deque, OrderedDict
+import functools
 import queue
 import threading
 import time
-from typing import Any, Dict, List
+from typing import Any, Deque, Dict, List
 
 # Local imports
 from logger import log
+from .job import created_at_of, tag, TaggedJob, untag
+from .pool import ProcessPoolBackend
+from . import metrics
+from . import ring
+
+
+class QueuePolicy:
+    """
+    What happens to a job sent over a link, when the queue of the
+    recipient is full.
+    """
+
+    drop_newest = 'drop_newest'  # The sent job is dropped
+    drop_oldest = 'drop_oldest'  # The oldest queued job is dropped
+    latest_only = 'latest_only'  # All queued jobs are dropped, only the sent one is kept
+    block = 'block'  # The sender waits for room in the queue
+
+    all = (drop_newest, drop_oldest, latest_only, block)
+
+
+class FairQueue(queue.Queue):
+    """
+    A queue of the jobs of several sources (see `TaggedJob`), which
+    takes turns between the sources - a busy source doesn't starve the
+    others. The size limit is per source, a source filling its share
+    doesn't block the others.
+    """
+
+    def _init(self, maxsize: int) -> None:
+        self._sources = OrderedDict()  # type: OrderedDict[Any, Deque[Any]]
+        self._count = 0
+
+    def _qsize(self) -> int:
+        return self._count
+
+    def _put(self, item: Any) -> None:
+        _, source_id = untag(item)
+
+        if source_id not in self._sources:
+            self._sources[source_id] = deque()
+
+        self._sources[source_id].append(item)
+        self._count += 1
+
+    def _get(self) -> Any:
+        # The source whose turn it is
+        source_id, items = next(iter(self._sources.items()))
+
+        return self._get_of(source_id, items)
+
+    def _get_of(self, source_id: Any, items: Deque[Any]) -> Any:
+        item = items.popleft()
+        self._count -= 1
+
+        if items:
+            # Its turn is over
+            self._sources.move_to_end(source_id)
+        else:
+            del self._sources[source_id]
+
+        return item
+
+    def put(self, item: Any, block: bool = True, timeout: float = None) -> None:
+        _, source_id = untag(item)
+
+        with self.not_full:
+            if self.maxsize > 0:
+                deadline = None if timeout is None else time.monotonic() + timeout
+
+                while len(self._sources.get(source_id, ())) >= self.maxsize:
+                    if not block:
+                        raise queue.Full
+
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise queue.Full
+
+                    self.not_full.wait(remaining)
+
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def get_source_nowait(self, source_id: Any) -> Any:
+        """
+        Description
+        --
+        Gets the oldest job of a source, without waiting.
+
+        Parameters
+        --
+        - source_id - the ID of the source, None for untagged jobs.
+        """
+
+        with self.mutex:
+            items = self._sources.get(source_id)
+
+            if not items:
+                raise queue.Empty
+
+            item = self._get_of(source_id, items)
+            self.not_full.notify_all()
+
+            return item
 
 
 class Worker:
@@ -35,18 +141,72 @@ class Worker:
 
         # See https://docs.python.org/3/library/queue.html
         self.queue = queue.Queue(jobs_limit)
-        self.main_loop_sleep_s = 0.02  # Give other threads a breather
+
+        # Sleep after every job. 0 for event-driven scheduling - the main loop
+        # blocks on the queue and wakes up as soon as a job arrives.
+        self.main_loop_sleep_s = 0
+
+        # Maximum number of queued jobs to process at once, see
+        # `_process_input_batch`. 1 for no batching.
+        self.batch_size = 1
+
+        # Number of processes in which to process the jobs. 0 to process
+        # them in the worker thread. The worker has to be picklable.
+        self.processes = 0
 
         # Logging
         self._logger = log.get_module_logger(self.__class__.__name__)
 
-        # Connections to other workers
-        self._recipients = {}  # type: Dict[str, List[Any]]
+        # Connections to other workers, with the queue policy of each link
+        self._recipients = {}  # type: Dict[str, list]
+
+        # Counters of dropped jobs
+        self.jobs_dropped = 0  # Jobs dropped from the queue of this worker
+        self.links_jobs_dropped = {}  # type: Dict[Any, int]
+
+        # Latencies and counters, None if metrics are disabled (see `workers.metrics`)
+        self.metrics = metrics.register(self)  # type: metrics.WorkerMetrics
 
         self._wait_for_job_s = 1  # How long to wait for a job. 0 for no waiting.
         self._main_loop_sentry = "##thread circuit breaker##"  # queue circut breaker
         self._main_loop_break_requested = False  # When true, main loop will get sentry
         self._thread = None  # type: threading.Thread
+        self._backend = None  # type: ProcessPoolBackend
+
+        # The job being processed by `_process_input_job`, tagged (see
+        # `TaggedJob`), to tag results published later (see `_tag_results`)
+        self._job = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Description
+        --
+        Gets the state to pickle, when the worker is copied in a pool process.
+        Thread, queue and connections to other workers stay in this process.
+        """
+
+        state = self.__dict__.copy()
+
+        for attribute in ('queue', '_logger', '_recipients', '_thread', '_backend', 'metrics'):
+            state.pop(attribute, None)
+
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """
+        Description
+        --
+        Restores the pickled state, in a pool process.
+        """
+
+        self.__dict__.update(state)
+
+        self.queue = None
+        self._logger = log.get_module_logger(self.__class__.__name__)
+        self._recipients = {}
+        self._thread = None
+        self._backend = None
+        self.metrics = None
 
     def _get_next_job(self) -> Any:
         """
@@ -74,6 +234,50 @@ class Worker:
             # Queue is empty
             pass
 
+    def _get_queued_jobs(self, limit: int) -> List[Any]:
+        """
+        Description
+        --
+        Gets the jobs already in the queue, without waiting.
+
+        Parameters
+        --
+        - limit - the maximum number of jobs to get.
+        """
+
+        jobs = []
+
+        try:
+            while len(jobs) < limit:
+                job = self.queue.get_nowait()
+
+                # The main loop notices the breaker anyway
+                if job is not self._main_loop_sentry:
+                    jobs.append(job)
+        except queue.Empty:
+            pass
+
+        return jobs
+
+    def _process_input_batch(self, input_jobs: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Description
+        --
+        Override.
+        Process several input jobs at once. By default, they are
+        processed one by one.
+
+        Parameters
+        --
+        - input_jobs - the jobs to process.
+
+        Returns
+        --
+        Results of each job, in the order of the jobs.
+        """
+
+        return [self._process_input_job(job) for job in input_jobs]
+
     def _process_input_job(self, input_job: Any) -> Dict[str, Any]:
         """
         Description
@@ -92,6 +296,85 @@ class Worker:
 
         pass
 
+    def _publish_results(self, results: Dict[str, Any]) -> None:
+        """
+        Description
+        --
+        Publishes results to the subscribers of their channels.
+
+        Parameters
+        --
+        - results - results on different channels.
+        """
+
+        if self.metrics and results is not None:
+            self.metrics.jobs_out += 1
+
+        if self._recipients and results is not None:
+            # Publish the non-None result to all recipients
+            for r_channel in results.keys():
+                if r_channel in self._recipients.keys():
+                    for recipient, policy in self._recipients[r_channel]:
+                        result = results[r_channel]
+                        if result is not None:
+                            # The recipient owns a reference
+                            ring.retain(result)
+
+                            dropped = recipient.receive(result, policy)
+
+                            if dropped:
+                                link = (r_channel, recipient)
+                                self.links_jobs_dropped[link] = self.links_jobs_dropped.get(link, 0) + dropped
+
+    def _tag_results(self, job: Any, results: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Description
+        --
+        Tags the results of a job with the source and the creation time
+        of the job, if it's a `TaggedJob`. With metrics enabled, the
+        results of an untimed job (e.g. a frame of a feed) are created now.
+
+        Parameters
+        --
+        - job - the processed job.
+        - results - the results of the job.
+        """
+
+        _, source_id = untag(job)
+        created_at = created_at_of(job)
+
+        if self.metrics and created_at is None:
+            created_at = time.monotonic()
+
+        if (source_id is None and created_at is None) or not results:
+            return results
+
+        return {channel: tag(result, source_id, created_at) for channel, result in results.items()}
+
+    def _observe(self, jobs: List[Any], started: float) -> None:
+        """
+        Description
+        --
+        Measures processed jobs, see `workers.metrics`.
+
+        Parameters
+        --
+        - jobs - the jobs, processed together.
+        - started - when their processing started, `time.monotonic()`.
+        """
+
+        now = time.monotonic()
+
+        for job in jobs:
+            self.metrics.processing_s.observe((now - started) / len(jobs))
+
+            if isinstance(job, TaggedJob):
+                if job.queued_at is not None:
+                    self.metrics.queue_wait_s.observe(started - job.queued_at)
+
+                if job.created_at is not None:
+                    self.metrics.latency_s.observe(now - job.created_at)
+
     def _main_loop(self) -> None:
         """
         Description
@@ -100,45 +383,93 @@ class Worker:
         """
 
         # Clear the queue
-        self.queue = queue.Queue(self.queue.maxsize)
+        self.queue = type(self.queue)(self.queue.maxsize)
 
         # The main loop is about the start
         self._logger.debug("On start")
         self._on_starting()
+
+        if self.processes:
+            self._logger.debug("Starting {} pool processes".format(self.processes))
+            self._backend = ProcessPoolBackend(self, self.processes)
+            self._backend.start()
+
         self._logger.debug("Main loop starting")
 
         try:
             # *** MAIN LOOP ***
             # Encountering `_main_loop_breaker` will break us out and effectively
             # end the thread.
-            for job in iter(self._get_next_job, self._main_loop_sentry):
+            while True:
+                job = self._get_next_job()
+
+                # Identity check - comparing an ndarray job to the sentry with
+                # `==` is ambiguous.
+                if job is self._main_loop_sentry:
+                    break
+
+                jobs = [job]
+
+                if self.batch_size > 1 and job is not None:
+                    # Batch what's already queued
+                    jobs += self._get_queued_jobs(self.batch_size - 1)
+
+                started = time.monotonic() if self.metrics else 0
+                results = None
+
                 try:
-                    # Consume the input job and produce output jobs
-                    results = self._process_input_job(job)
-
-                    # Propagate result to subscribers
-                    if self._recipients and results is not None:
-                        # Publish the non-None result to all recipients
-                        for r_channel in results.keys():
-                            if r_channel in self._recipients.keys():
-                                for recipient in self._recipients[r_channel]:
-                                    result = results[r_channel]
-                                    if result is not None:
-                                        try:
-                                            recipient.receive(result)
-                                        except queue.Full:
-                                            # self._logger.debug("Queue of {} is full, cannot receive job.".format(recipient))
-                                            pass
-
-                    # Sleep before next job, to give other threads a chance
-                    time.sleep(self.main_loop_sleep_s)
+                    if self._backend:
+                        for j in jobs:
+                            if j is not None:
+                                # Processed in a pool process, results are
+                                # published when ready.
+                                self._backend.submit(j)
+                    elif len(jobs) > 1:
+                        # Consume the batch and publish the output of each job
+                        input_jobs = [untag(j)[0] for j in jobs]
+
+                        for j, results in zip(jobs, self._process_input_batch(input_jobs)):
+                            self._publish_results(self._tag_results(j, results))
+                    else:
+                        # Consume the input job and produce output jobs
+                        self._job = job
+                        results = self._process_input_job(untag(job)[0])
+
+                        # Propagate result to subscribers
+                        self._publish_results(self._tag_results(job, results))
+
+                    if self.metrics and not self._backend and (job is not None or results is not None):
+                        # Polls with no job count only if they produce (e.g. a feed)
+                        self._observe(jobs, started)
+
+                    if self.main_loop_sleep_s:
+                        # Throttled - sleep before next job
+                        time.sleep(self.main_loop_sleep_s)
                 except Exception:
                     # Unhandled exception in the main loop
                     self._logger.error("Fatal error in an iteration of the main loop", exc_info=True)
+                finally:
+                    self._job = None
+
+                    for j in jobs:
+                        # Done with the frames
+                        ring.release(j)
         except Exception:
             # Unhandled exception in the main loop
             self._logger.error("Fatal error, which broke us out of the main loop", exc_info=True)
         finally:
+            if self._backend:
+                # Finish the jobs in flight
+                self._backend.stop()
+                self._backend = None
+
+            # Drop what's left in the queue
+            try:
+                while True:
+                    self._drop_job(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+
             # The main loop ended
             self._logger.debug("On stopped")
             self._on_stopped()
@@ -164,7 +495,7 @@ class Worker:
 
         pass
 
-    def link_to(self, recipient: Worker, channel: str = None) -> Worker:
+    def link_to(self, recipient: Worker, channel: str = None, policy: str = QueuePolicy.drop_newest) -> Worker:
         """
         Description
         --
@@ -177,6 +508,8 @@ class Worker:
         - channel - the output channel of this worker, which we link to
         the `recipient`. If none specified, it will be the default,
         main channel.
+        - policy - the `QueuePolicy` of the link, when the queue of the
+        `recipient` is full.
 
         Returns
         --
@@ -189,15 +522,31 @@ class Worker:
         if not channel:
             raise ValueError("channel is required")
 
+        if policy not in QueuePolicy.all:
+            raise ValueError("Unknown queue policy {}".format(policy))
+
         if channel not in self._recipients:
             self._recipients[channel] = []
 
-        self._recipients[channel].append(recipient)
-        self._logger.debug("Subscribed {} on channel '{}'".format(recipient, channel))
+        self._recipients[channel].append((recipient, policy))
+        self._logger.debug("Subscribed {} on channel '{}' ({})".format(recipient, channel, policy))
 
         return self
 
-    def receive(self, job) -> None:
+    def _drop_job(self, job: Any) -> None:
+        """
+        Description
+        --
+        Drops a job which won't be processed.
+
+        Parameters
+        --
+        - job - the dropped job.
+        """
+
+        ring.release(job)
+
+    def receive(self, job, policy: str = QueuePolicy.drop_newest) -> int:
         """
         Description
         --
@@ -206,9 +555,64 @@ class Worker:
         Parameters
         --
         - job - the received input job.
+        - policy - the `QueuePolicy` to apply, if the queue is full.
+
+        Returns
+        --
+        The number of dropped jobs.
         """
 
-        self.queue.put_nowait(job)
+        if self.metrics:
+            self.metrics.jobs_in += 1
+
+            # Stamped with when it's queued
+            inner, source_id = untag(job)
+            job = TaggedJob(inner, source_id, created_at_of(job), time.monotonic())
+
+        dropped = []
+        take = self.queue.get_nowait
+
+        if isinstance(self.queue, FairQueue):
+            # Only the jobs of the same source make room
+            take = functools.partial(self.queue.get_source_nowait, untag(job)[1])
+
+        if policy == QueuePolicy.latest_only:
+            # Nothing queued is of interest anymore
+            try:
+                while True:
+                    dropped.append(take())
+            except queue.Empty:
+                pass
+
+        while True:
+            try:
+                if policy == QueuePolicy.block:
+                    # Wait for room, but don't hang on a stopped worker
+                    self.queue.put(job, timeout=0.1)
+                else:
+                    self.queue.put_nowait(job)
+
+                break
+            except queue.Full:
+                if policy in (QueuePolicy.drop_oldest, QueuePolicy.latest_only):
+                    # Make room
+                    try:
+                        dropped.append(take())
+                    except queue.Empty:
+                        pass
+                elif policy != QueuePolicy.block or self._main_loop_break_requested:
+                    dropped.append(job)
+                    break
+
+        # The loop breaker is not a job, the main loop notices the breaker anyway
+        dropped = [d for d in dropped if d is not self._main_loop_sentry]
+
+        for d in dropped:
+            self._drop_job(d)
+
+        self.jobs_dropped += len(dropped)
+
+        return len(dropped)
 
     def start(self, blocking=False) -> Worker:
         """
@@ -259,4 +663,35 @@ class Worker:
         # Signal breaking the loop
         self._main_loop_break_requested = True
 
+        try:
+            # Wake up the main loop, if it is blocked waiting for a job
+            self.queue.put_nowait(self._main_loop_sentry)
+        except queue.Full:
+            # The main loop has jobs to pick up, it will notice the breaker
+            pass
+
         return self
+
+    def join(self, timeout: float = None) -> bool:
+        """
+        Description
+        --
+        Waits for the service to stop, after `stop`.
+
+        Parameters
+        --
+        - timeout - for how long to wait, in seconds. None for as long as
+        it takes.
+
+        Returns
+        --
+        Whether the service stopped.
+        """
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+            if self._thread.is_alive():
+                return False
+
+        return True